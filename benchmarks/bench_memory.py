@@ -0,0 +1,100 @@
+"""
+加载后的内存占用：对比默认模式和compact模式（以及列式存储）
+
+合成的记录中有大量短命的对象（子弹、弹片、干扰弹），每一行都重复写出Name/Color/Coalition/Pilot
+
+python benchmarks/bench_memory.py --objects 5000
+"""
+import argparse
+import gc
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from pyacmi import Acmi  # noqa: E402
+
+SHORT_LIVED_TYPES = [
+    ('Projectile+Bullet', 'M61A1'),
+    ('Misc+Shrapnel', 'Shrapnel'),
+    ('Misc+Decoy+Flare', 'Flare'),
+]
+
+
+# 生成合成的acmi文件，每个对象存活lifetime个时间帧
+def write_synthetic_file(filepath: str, objects: int, lifetime: int = 10, per_frame: int = 200, seed: int = 0):
+    rnd = random.Random(seed)
+    with open(filepath, 'w', encoding='utf-8') as f:
+        f.write('FileType=text/acmi/tacview\nFileVersion=2.1\n')
+        f.write('0,ReferenceTime=2023-01-01T00:00:00Z\n0,ReferenceLongitude=120\n0,ReferenceLatitude=30\n')
+        alive = []
+        next_id = 0x1000
+        frame = 0
+        while next_id < 0x1000 + objects or alive:
+            f.write('#{:.2f}\n'.format(frame * 0.1))
+            while len(alive) < per_frame and next_id < 0x1000 + objects:
+                type_tags, name = SHORT_LIVED_TYPES[next_id % len(SHORT_LIVED_TYPES)]
+                alive.append([next_id, frame, type_tags, name])
+                next_id += 1
+            remaining = []
+            for item in alive:
+                obj_id, born, type_tags, name = item
+                line = '{:x},T={:.6f}|{:.6f}|{:.1f},Name={},Color=Red,Coalition=Enemies,Pilot=Viper 1'.format(
+                        obj_id, rnd.uniform(-1, 1), rnd.uniform(-1, 1), rnd.uniform(0, 10000), name)
+                if born == frame:
+                    line += ',Type=' + type_tags
+                f.write(line + '\n')
+                if frame - born >= lifetime:
+                    f.write('-{:x}\n'.format(obj_id))
+                else:
+                    remaining.append(item)
+            alive = remaining
+            frame += 1
+
+
+def measure(filepath: str, **kwargs) -> tuple:
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    acmi = Acmi(**kwargs)
+    acmi.load_acmi(filepath)
+    seconds = time.perf_counter() - start
+    gc.collect()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del acmi
+    return current, peak, seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--objects', type=int, default=5000)
+    parser.add_argument('--lifetime', type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        filepath = os.path.join(tmp_dir, 'short_lived.txt.acmi')
+        write_synthetic_file(filepath, args.objects, args.lifetime)
+        size = os.path.getsize(filepath)
+        print(f'{args.objects} objects, {size / 1e6:.1f} MB')
+
+        modes = [
+            ('default', { }),
+            ('compact', { 'compact': True }),
+            ('columnar', { 'columnar': True }),
+            ('columnar+compact', { 'columnar': True, 'compact': True }),
+        ]
+        baseline = None
+        for name, kwargs in modes:
+            current, peak, seconds = measure(filepath, **kwargs)
+            baseline = baseline or current
+            print(f'{name:>18}: retained {current / 1e6:7.1f} MB ({current / baseline:5.1%})  '
+                  f'peak {peak / 1e6:7.1f} MB  load {seconds:.2f}s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+Acmi.split_fields 微基准：对比旧的逐字符实现和当前实现
+
+python benchmarks/bench_split_fields.py --lines 1000000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from pyacmi import Acmi  # noqa: E402
+
+
+# 旧实现（逐字符查找未转义的逗号，不处理转义）
+def legacy_split_fields(line):
+    fields = []
+    i = 1
+    lastfield = 0
+    while i < len(line):
+        if line[i - 1] != '\\' and line[i] == ',':
+            fields.append(line[lastfield:i])
+            lastfield = i + 1
+        i += 1
+
+    fields.append(line[lastfield:i])
+    return fields
+
+
+# 生成合成的acmi对象行，escaped_ratio比例的行带有转义逗号
+def write_synthetic_file(filepath: str, lines: int, escaped_ratio: float = 0.01, seed: int = 0):
+    rnd = random.Random(seed)
+    with open(filepath, 'w', encoding='utf-8') as f:
+        f.write('FileType=text/acmi/tacview\nFileVersion=2.1\n')
+        for i in range(lines):
+            obj_id = '%x' % rnd.randint(0x100, 0x4000)
+            line = '{},T={:.7f}|{:.7f}|{:.2f}|{:.1f}|{:.1f}|{:.1f},IAS={:.2f},Throttle={:.2f}'.format(
+                    obj_id, rnd.uniform(-1, 1), rnd.uniform(-1, 1), rnd.uniform(0, 12000),
+                    rnd.uniform(-180, 180), rnd.uniform(-90, 90), rnd.uniform(0, 360),
+                    rnd.uniform(0, 400), rnd.random())
+            if rnd.random() < escaped_ratio:
+                line += ',Name=Viper\\, flight {}'.format(i)
+            f.write(line + '\n')
+
+
+def bench(func, lines: list, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for line in lines:
+            func(line)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--lines', type=int, default=200000)
+    parser.add_argument('--escaped-ratio', type=float, default=0.01)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        filepath = os.path.join(tmp_dir, 'synthetic.txt.acmi')
+        write_synthetic_file(filepath, args.lines, args.escaped_ratio)
+        size = os.path.getsize(filepath)
+        with open(filepath, 'r', encoding='utf-8') as f:
+            lines = [line.strip() for line in f][2:]
+
+    legacy = bench(legacy_split_fields, lines, args.repeat)
+    current = bench(Acmi.split_fields, lines, args.repeat)
+    print(f'{len(lines)} lines, {size / 1e6:.1f} MB, escaped ratio {args.escaped_ratio}')
+    for name, seconds in (('legacy', legacy), ('split_fields', current)):
+        print(f'{name:>14}: {seconds:.3f}s  {len(lines) / seconds / 1e6:.2f} Mlines/s  {size / seconds / 1e6:.1f} MB/s')
+    print(f'{"speedup":>14}: {legacy / current:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,282 @@
+"""
+基准测试套件：在generator.py生成的确定性录像上测量加载、查询和导出
+
+每个基准在单独的进程中运行，报告耗时（重复repeat次取最小值）、行/秒、MB/秒（按解压后的大小）、进程的峰值RSS，
+查询类基准报告单次调用的延迟（中位数、p99）。结果可以保存为JSON，并与之前某次提交的结果比较。
+
+python benchmarks/bench_suite.py --duration 600 --output HEAD.json
+python benchmarks/bench_suite.py --duration 600 --compare HEAD.json
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from generator import ACMI_GENERATOR_DEFAULTS, generate_recording  # noqa: E402
+from pyacmi import Acmi, iter_acmi  # noqa: E402
+from pyacmi.acmi import AcmiFileReader, open_acmi_streams  # noqa: E402
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# 查询类基准的调用次数
+QUERY_CALLS = 20000
+STATE_CALLS = 200
+QUERY_FIELDS = ['Longitude', 'Latitude', 'Altitude', 'IAS', 'Name', 'Coalition']
+
+
+def _peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux上单位为KB，macOS上为字节
+    return peak / 1e6 if sys.platform == 'darwin' else peak / 1e3
+
+
+def _latencies(samples: list) -> dict:
+    samples = sorted(samples)
+    return {
+        'calls'  : len(samples),
+        'mean_us': sum(samples) / len(samples) * 1e6,
+        'p50_us' : samples[len(samples) // 2] * 1e6,
+        'p99_us' : samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1e6,
+    }
+
+
+def _load(filepath: str, **kwargs):
+    acmi = Acmi(**kwargs)
+    acmi.load_acmi(filepath)
+    return acmi
+
+
+def bench_load(filepath: str, tmp_dir: str) -> dict:
+    start = time.perf_counter()
+    _load(filepath)
+    return { 'seconds': time.perf_counter() - start }
+
+
+def bench_load_columnar(filepath: str, tmp_dir: str) -> dict:
+    start = time.perf_counter()
+    _load(filepath, columnar=True)
+    return { 'seconds': time.perf_counter() - start }
+
+
+def bench_load_compact(filepath: str, tmp_dir: str) -> dict:
+    start = time.perf_counter()
+    _load(filepath, columnar=True, compact=True)
+    return { 'seconds': time.perf_counter() - start }
+
+
+def bench_iter_acmi(filepath: str, tmp_dir: str) -> dict:
+    start = time.perf_counter()
+    for _ in iter_acmi(filepath):
+        pass
+    return { 'seconds': time.perf_counter() - start }
+
+
+# 只读取逻辑行（按块读取、解码、合并续行），不解析
+def bench_read(filepath: str, tmp_dir: str, background: bool = False) -> dict:
+    start = time.perf_counter()
+    for f in open_acmi_streams(filepath, binary=True):
+        for _ in AcmiFileReader(f, background=background):
+            pass
+    return { 'seconds': time.perf_counter() - start }
+
+
+def bench_read_background(filepath: str, tmp_dir: str) -> dict:
+    return bench_read(filepath, tmp_dir, background=True)
+
+
+# 对照：逐行readline的读取方式（TextIOWrapper逐行解码，续行反复strip和拼接）
+def bench_read_readline(filepath: str, tmp_dir: str) -> dict:
+    start = time.perf_counter()
+    for f in open_acmi_streams(filepath):
+        while True:
+            line = f.readline()
+            if not line:
+                break
+            while line.strip().endswith('\\'):
+                line = line.strip()[:-1] + '\n' + f.readline()
+    return { 'seconds': time.perf_counter() - start }
+
+
+# 随机对象、随机属性、随机时刻的get_value
+def bench_get_value(filepath: str, tmp_dir: str) -> dict:
+    acmi = _load(filepath)
+    rnd = random.Random(0)
+    objects = list(acmi.objects.values())
+    end = acmi.timeframes[-1] if acmi.timeframes else 0.0
+    queries = [(rnd.choice(objects), rnd.choice(QUERY_FIELDS), rnd.uniform(0, end)) for _ in range(QUERY_CALLS)]
+    samples = []
+    start = time.perf_counter()
+    for obj, field, t in queries:
+        call_start = time.perf_counter()
+        obj.get_value(field, t)
+        samples.append(time.perf_counter() - call_start)
+    result = { 'seconds': time.perf_counter() - start }
+    result.update(_latencies(samples))
+    return result
+
+
+# 随机时刻的世界快照
+def bench_state_at(filepath: str, tmp_dir: str) -> dict:
+    acmi = _load(filepath, columnar=True)
+    rnd = random.Random(0)
+    end = acmi.timeframes[-1] if acmi.timeframes else 0.0
+    fields = ['Longitude', 'Latitude', 'Altitude']
+    start = time.perf_counter()
+    acmi.build_frame_index(fields)
+    build = time.perf_counter() - start
+    samples = []
+    for _ in range(STATE_CALLS):
+        t = rnd.uniform(0, end)
+        call_start = time.perf_counter()
+        acmi.state_at(t, fields=fields)
+        samples.append(time.perf_counter() - call_start)
+    result = { 'seconds': time.perf_counter() - start, 'build_seconds': build }
+    result.update(_latencies(samples))
+    return result
+
+
+def bench_export_csv(filepath: str, tmp_dir: str) -> dict:
+    acmi = _load(filepath, columnar=True)
+    start = time.perf_counter()
+    acmi.export_csv(os.path.join(tmp_dir, 'export.csv'))
+    return { 'seconds': time.perf_counter() - start }
+
+
+def bench_export_acmi(filepath: str, tmp_dir: str) -> dict:
+    acmi = _load(filepath, columnar=True)
+    start = time.perf_counter()
+    acmi.export_acmi(os.path.join(tmp_dir, 'export.zip.acmi'))
+    return { 'seconds': time.perf_counter() - start }
+
+
+# 名称 -> (函数, 是否按整个文件计算吞吐量)
+BENCHMARKS = {
+    'read'           : (bench_read, True),
+    'read_background': (bench_read_background, True),
+    'read_readline'  : (bench_read_readline, True),
+    'load'           : (bench_load, True),
+    'load_columnar'  : (bench_load_columnar, True),
+    'load_compact'   : (bench_load_compact, True),
+    'iter_acmi'      : (bench_iter_acmi, True),
+    'get_value'      : (bench_get_value, False),
+    'state_at'       : (bench_state_at, False),
+    'export_csv'     : (bench_export_csv, False),
+    'export_acmi'    : (bench_export_acmi, False),
+}
+
+
+def _run_in_process(name: str, filepath: str, tmp_dir: str) -> dict:
+    result = BENCHMARKS[name][0](filepath, tmp_dir)
+    result['peak_rss_mb'] = _peak_rss_mb()
+    return result
+
+
+# 在新的进程中运行一次基准，峰值RSS不受其他基准影响
+def run_benchmark(name: str, filepath: str, tmp_dir: str) -> dict:
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+        return executor.submit(_run_in_process, name, filepath, tmp_dir).result()
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(params: dict, names: list, repeat: int, data_dir: str, compress: bool) -> dict:
+    key = '_'.join('{k}{v}'.format(k=k, v=params[k]) for k in sorted(params))
+    os.makedirs(data_dir, exist_ok=True)
+    filepath = os.path.join(data_dir, 'bench_{k}.{ext}'.format(k=key, ext='zip.acmi' if compress else 'txt.acmi'))
+    stats = generate_recording(filepath, **params)
+    report = {
+        'commit'  : git_commit(),
+        'python'  : platform.python_version(),
+        'platform': platform.platform(),
+        'params'  : dict(params, compress=compress),
+        'file'    : { 'lines': stats.lines, 'bytes': stats.bytes, 'frames': stats.frames,
+                      'objects': stats.objects, 'events': stats.events },
+        'results' : { },
+    }
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for name in names:
+            runs = [run_benchmark(name, filepath, tmp_dir) for _ in range(repeat)]
+            result = min(runs, key=lambda run: run['seconds'])
+            result['peak_rss_mb'] = max(run['peak_rss_mb'] or 0 for run in runs) or None
+            if BENCHMARKS[name][1]:
+                result['lines_per_second'] = stats.lines / result['seconds']
+                result['mb_per_second'] = stats.bytes / 1e6 / result['seconds']
+            report['results'][name] = result
+    return report
+
+
+def print_report(report: dict, baseline: dict = None, threshold: float = 0.1) -> list:
+    file = report['file']
+    print(f"commit {report['commit']}  python {report['python']}  {file['lines']} lines  "
+          f"{file['bytes'] / 1e6:.1f} MB  {file['objects']} objects")
+    regressions = []
+    for name, result in report['results'].items():
+        line = f"{name:>16}: {result['seconds']:8.3f}s"
+        if 'mb_per_second' in result:
+            line += f"  {result['lines_per_second'] / 1e3:8.1f} klines/s  {result['mb_per_second']:6.1f} MB/s"
+        if 'p50_us' in result:
+            line += f"  p50 {result['p50_us']:8.1f}us  p99 {result['p99_us']:8.1f}us"
+        if result.get('peak_rss_mb'):
+            line += f"  rss {result['peak_rss_mb']:7.1f} MB"
+        old = (baseline or { }).get('results', { }).get(name)
+        if old is not None:
+            ratio = result['seconds'] / old['seconds']
+            line += f"  {ratio:5.2f}x vs {baseline['commit']}"
+            if ratio > 1 + threshold:
+                line += '  REGRESSION'
+                regressions.append(name)
+        print(line)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    for name, default in ACMI_GENERATOR_DEFAULTS.items():
+        parser.add_argument('--' + name.replace('_', '-'), type=type(default), default=default)
+    parser.add_argument('--zip', action='store_true', help='benchmark a zip compressed recording')
+    parser.add_argument('--benchmarks', nargs='+', choices=list(BENCHMARKS), default=list(BENCHMARKS))
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--data-dir', default=tempfile.gettempdir())
+    parser.add_argument('--output', help='save the results as JSON')
+    parser.add_argument('--compare', help='results JSON of an earlier run to compare with')
+    parser.add_argument('--threshold', type=float, default=0.1, help='slowdown reported as a regression')
+    args = parser.parse_args()
+
+    params = { name: getattr(args, name) for name in ACMI_GENERATOR_DEFAULTS }
+    report = run_suite(params, args.benchmarks, args.repeat, args.data_dir, args.zip)
+    baseline = None
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('params') != report['params']:
+            print('warning: the baseline was run with different generator parameters')
+    regressions = print_report(report, baseline, args.threshold)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,243 @@
+"""
+确定性的合成acmi录像生成器，用于基准测试
+
+相同的参数和seed总是生成逐字节相同的文件。录像包括：
+- 飞机：9分量的T（没有变化的分量留空），以及速度、油门、油量等数值属性
+- 导弹：飞机周期性发射，6分量的T，Parent/LockedTarget，命中时产生Timeout、Destroyed事件后移除
+- 干扰弹、子弹：3分量的T，短时间存在
+- 带转义逗号的名称、多行（续行）的简报、Message/Bookmark事件
+路径以.zip.acmi或.zip结尾时写成zip压缩的acmi
+
+python benchmarks/generator.py out.zip.acmi --planes 40 --duration 1800
+"""
+import argparse
+import io
+import math
+import os
+import random
+import zipfile
+
+ACMI_GENERATOR_DEFAULTS = {
+    'planes'    : 20,
+    'missiles'  : 100,
+    'flares'    : 1000,
+    'bullets'   : 5000,
+    'frame_rate': 5.0,
+    'duration'  : 600.0,
+    'seed'      : 0,
+}
+
+# 各类对象的存活时间（秒）
+MISSILE_LIFETIME = 30.0
+FLARE_LIFETIME = 8.0
+BULLET_LIFETIME = 3.0
+
+COALITIONS = [('Allies', 'Blue'), ('Enemies', 'Red')]
+PLANE_MODELS = ['F-16C_50', 'F-15C', 'Su-27', 'MiG-29S']
+
+
+class RecordingStats:
+    """Line and byte counts of a generated recording (decompressed)."""
+
+    def __init__(self):
+        self.lines = 0
+        self.bytes = 0
+        self.frames = 0
+        self.objects = 0
+        self.events = 0
+
+
+class _Shortlived:
+    def __init__(self, obj_id: int, born: float, lifetime: float, lon: float, lat: float, alt: float,
+                 heading: float, speed: float):
+        self.obj_id = obj_id
+        self.born = born
+        self.lifetime = lifetime
+        self.lon = lon
+        self.lat = lat
+        self.alt = alt
+        self.heading = heading
+        self.speed = speed
+        self.target = None
+        self.parent = None
+
+
+class _Writer:
+    def __init__(self, f, stats: RecordingStats):
+        self.f = f
+        self.stats = stats
+
+    def line(self, text: str):
+        data = text + '\n'
+        self.f.write(data)
+        self.stats.lines += data.count('\n')
+        self.stats.bytes += len(data.encode('utf-8'))
+
+
+# 每秒生成count个对象时，这一帧应该生成的数量（累积取整，结果确定）
+def _spawn_count(count: int, duration: float, frame: int, frame_rate: float) -> int:
+    rate = count / duration / frame_rate
+    return int((frame + 1) * rate) - int(frame * rate)
+
+
+# 生成录像，返回RecordingStats
+# planes: 同时存在的飞机数量
+# missiles/flares/bullets: 整个录像中发射的导弹、干扰弹、子弹总数
+# frame_rate: 每秒的时间帧数
+# duration: 录像时长（秒）
+def generate_recording(filepath: str, planes: int = 20, missiles: int = 100, flares: int = 1000,
+                       bullets: int = 5000, frame_rate: float = 5.0, duration: float = 600.0,
+                       seed: int = 0) -> RecordingStats:
+    stats = RecordingStats()
+    if filepath.endswith('.zip.acmi') or filepath.endswith('.zip'):
+        member = os.path.basename(filepath)
+        member = member[:-len('.zip.acmi')] if member.endswith('.zip.acmi') else member[:-len('.zip')]
+        with zipfile.ZipFile(filepath, 'w', compression=zipfile.ZIP_DEFLATED) as my_zip:
+            with my_zip.open(member + '.txt.acmi', 'w') as raw:
+                with io.TextIOWrapper(raw, encoding='utf-8', newline='\n') as f:
+                    _generate(_Writer(f, stats), planes, missiles, flares, bullets, frame_rate, duration, seed)
+    else:
+        with open(filepath, 'w', encoding='utf-8', newline='\n') as f:
+            _generate(_Writer(f, stats), planes, missiles, flares, bullets, frame_rate, duration, seed)
+    return stats
+
+
+def _generate(w: _Writer, planes: int, missiles: int, flares: int, bullets: int, frame_rate: float,
+              duration: float, seed: int):
+    rnd = random.Random(seed)
+    w.f.write('\ufeff')
+    w.stats.bytes += 3
+    w.line('FileType=text/acmi/tacview')
+    w.line('FileVersion=2.1')
+    w.line('0,ReferenceTime=2024-03-01T08:00:00Z')
+    w.line('0,RecordingTime=2024-03-01T10:00:00Z')
+    w.line('0,Title=Synthetic benchmark\\, seed {s}'.format(s=seed))
+    w.line('0,Category=Air-to-Air')
+    w.line('0,Author=pyacmi')
+    w.line('0,Briefing=Line one of the briefing.\\')
+    w.line('Line two\\, with a comma.\\')
+    w.line('Line three.')
+    w.line('0,ReferenceLongitude=120')
+    w.line('0,ReferenceLatitude=30')
+
+    # 飞机：[obj_id, 经度, 纬度, 高度, 航向, 速度]
+    aircraft = []
+    for i in range(planes):
+        obj_id = 0x100 + i
+        coalition, color = COALITIONS[i % 2]
+        aircraft.append([obj_id, rnd.uniform(-0.5, 0.5), rnd.uniform(-0.5, 0.5), rnd.uniform(3000, 9000),
+                         rnd.uniform(0, 360), rnd.uniform(180, 300)])
+        w.line('{i:x},T={lon:.7f}|{lat:.7f}|{alt:.2f}|0|0|{hdg:.1f},Type=Air+FixedWing,Name={name},'
+               'Pilot=Viper {n}\\, Lead,Coalition={coalition},Color={color},Country=us,Group=Flight {g}'.format(
+                i=obj_id, lon=aircraft[-1][1], lat=aircraft[-1][2], alt=aircraft[-1][3], hdg=aircraft[-1][4],
+                name=PLANE_MODELS[i % len(PLANE_MODELS)], n=i + 1, coalition=coalition, color=color, g=i // 4))
+        w.stats.objects += 1
+
+    next_id = 0x10000
+    alive = []
+    frames = int(duration * frame_rate)
+    dt = 1.0 / frame_rate
+    for frame in range(frames):
+        time = frame * dt
+        w.line('#{t:.2f}'.format(t=time))
+        w.stats.frames += 1
+
+        for plane in aircraft:
+            obj_id, lon, lat, alt, heading, speed = plane
+            heading = (heading + rnd.uniform(-3, 3)) % 360
+            distance = speed * dt / 111000.0
+            plane[1] = lon = lon + distance * math.sin(math.radians(heading))
+            plane[2] = lat = lat + distance * math.cos(math.radians(heading))
+            plane[3] = alt = max(100.0, alt + rnd.uniform(-20, 20))
+            plane[4] = heading
+            roll = rnd.uniform(-60, 60)
+            pitch = rnd.uniform(-10, 10)
+            # 偶尔省略没有变化的分量
+            components = ['{:.7f}'.format(lon), '{:.7f}'.format(lat), '{:.2f}'.format(alt),
+                          '{:.1f}'.format(roll), '{:.1f}'.format(pitch), '{:.1f}'.format(heading),
+                          '{:.2f}'.format(lon * 111000), '{:.2f}'.format(lat * 111000), '{:.1f}'.format(heading)]
+            if rnd.random() < 0.3:
+                components[3] = components[4] = ''
+            line = '{i:x},T={t},IAS={ias:.1f},Mach={mach:.3f},Throttle={thr:.2f}'.format(
+                    i=obj_id, t='|'.join(components), ias=speed * 0.9, mach=speed / 340.0, thr=rnd.random())
+            if frame % max(1, int(frame_rate)) == 0:
+                line += ',FuelWeight={f:.0f}'.format(f=max(0.0, 5000 - time * 2))
+            w.line(line)
+
+        spawns = []
+        for _ in range(_spawn_count(missiles, duration, frame, frame_rate)):
+            shooter, target = rnd.sample(aircraft, 2) if len(aircraft) > 1 else (aircraft[0], aircraft[0])
+            obj = _Shortlived(next_id, time, MISSILE_LIFETIME, shooter[1], shooter[2], shooter[3], shooter[4], 800)
+            obj.parent = shooter[0]
+            obj.target = target[0]
+            spawns.append((obj, 'Weapon+Missile', 'AIM-120C'))
+            next_id += 1
+        for _ in range(_spawn_count(flares, duration, frame, frame_rate)):
+            source = rnd.choice(aircraft)
+            spawns.append((_Shortlived(next_id, time, FLARE_LIFETIME, source[1], source[2], source[3],
+                                       rnd.uniform(0, 360), 30), 'Misc+Decoy+Flare', 'Flare'))
+            next_id += 1
+        for _ in range(_spawn_count(bullets, duration, frame, frame_rate)):
+            source = rnd.choice(aircraft)
+            spawns.append((_Shortlived(next_id, time, BULLET_LIFETIME, source[1], source[2], source[3], source[4],
+                                       1000), 'Projectile+Bullet', 'M61A1'))
+            next_id += 1
+        for obj, type_tags, name in spawns:
+            line = '{i:x},T={lon:.7f}|{lat:.7f}|{alt:.2f},Type={type},Name={name}'.format(
+                    i=obj.obj_id, lon=obj.lon, lat=obj.lat, alt=obj.alt, type=type_tags, name=name)
+            if obj.parent is not None:
+                line += ',Parent={p:x},LockedTarget={t:x}'.format(p=obj.parent, t=obj.target)
+            w.line(line)
+            alive.append(obj)
+            w.stats.objects += 1
+
+        remaining = []
+        for obj in alive:
+            if obj.born == time:
+                remaining.append(obj)
+                continue
+            distance = obj.speed * dt / 111000.0
+            obj.lon += distance * math.sin(math.radians(obj.heading))
+            obj.lat += distance * math.cos(math.radians(obj.heading))
+            obj.alt = max(0.0, obj.alt - rnd.uniform(0, 30))
+            if obj.parent is not None:
+                w.line('{i:x},T={lon:.7f}|{lat:.7f}|{alt:.2f}|0|{pitch:.1f}|{hdg:.1f}'.format(
+                        i=obj.obj_id, lon=obj.lon, lat=obj.lat, alt=obj.alt, pitch=rnd.uniform(-5, 5),
+                        hdg=obj.heading))
+            else:
+                w.line('{i:x},T={lon:.7f}|{lat:.7f}|{alt:.2f}'.format(i=obj.obj_id, lon=obj.lon, lat=obj.lat,
+                                                                     alt=obj.alt))
+            if time - obj.born < obj.lifetime:
+                remaining.append(obj)
+                continue
+            if obj.parent is not None:
+                outcome = 'Kill' if rnd.random() < 0.3 else 'Miss'
+                w.line('0,Event=Timeout|SourceId:{s:x}|AmmoType:FOX3|TargetId:{t:x}|Outcome:{o}'.format(
+                        s=obj.parent, t=obj.target, o=outcome))
+                w.line('0,Event=Destroyed|{i:x}|'.format(i=obj.obj_id))
+                w.stats.events += 2
+            w.line('-{i:x}'.format(i=obj.obj_id))
+        alive = remaining
+
+        if frame % max(1, int(60 * frame_rate)) == 0:
+            w.line('0,Event=Bookmark|Minute {m}'.format(m=int(time // 60)))
+            w.line('0,Event=Message|{i:x}|Check in\\, {m} minutes'.format(i=aircraft[0][0] if aircraft else 0,
+                                                                           m=int(time // 60)))
+            w.stats.events += 2
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('filepath')
+    for name, default in ACMI_GENERATOR_DEFAULTS.items():
+        parser.add_argument('--' + name.replace('_', '-'), type=type(default), default=default)
+    args = parser.parse_args()
+    stats = generate_recording(args.filepath, planes=args.planes, missiles=args.missiles, flares=args.flares,
+                               bullets=args.bullets, frame_rate=args.frame_rate, duration=args.duration,
+                               seed=args.seed)
+    print(f'{args.filepath}: {stats.lines} lines, {stats.bytes / 1e6:.1f} MB, {stats.frames} frames, '
+          f'{stats.objects} objects, {stats.events} events')
+
+
+if __name__ == '__main__':
+    main()
@@ -1 +1,3 @@
 from .acmi import *
+from .stream import *
+from .writer import *
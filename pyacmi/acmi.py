@@ -8,11 +8,19 @@ import sortedcontainers
 import bisect
 import json
 import io
+import re
+import codecs
+import queue
+import threading
 from constantly import ValueConstant
-import csv
-from typing import Union, Optional
-from tqdm import tqdm
+from typing import Union, Optional, Callable
 import shutil
+import sys
+import warnings
+import numpy as np
+from .columnar import AcmiColumn, AcmiTimelineBuilder, ACMI_COLUMNAR_TIMELINES, as_column
+from .events import AcmiEventLog
+from .stats import AcmiLoadStats, instrument_acmi, uninstrument_acmi, stream_bytes
 
 ACMI_FILE_ENCODING = 'utf-8-sig'
 
@@ -97,12 +105,30 @@ ACMI_TEXT_PROPERTIES = {
     'LockedTarget7', 'LockedTarget8', 'LockedTarget9',
 }
 
+# 值为对象ID的属性
+ACMI_OBJECT_ID_PROPERTIES = {
+    'Parent',
+    'FocusTarget',
+    'LockedTarget', 'LockedTarget2', 'LockedTarget3', 'LockedTarget4', 'LockedTarget5', 'LockedTarget6',
+    'LockedTarget7', 'LockedTarget8', 'LockedTarget9',
+}
+
+# 角度属性及其取值区间的下界，插值时按360度周期处理（例如航向359度到1度应该经过0度，而不是180度）
+ACMI_ANGLE_PROPERTIES = {
+    'Longitude': -180.0,
+    'Roll'     : -180.0,
+    'Yaw'      : 0.0,
+    'Heading'  : 0.0,
+    'HDG'      : 0.0,
+    'HDM'      : 0.0,
+}
+
 # acmi导出csv的header
 ACMI_EXPORT_CSV_HEADERS = [
     'ReferenceTime',
     'Category',
     'ID',
-    'Name'
+    'Name',
     'Tags',
     'Type',
     'Time',
@@ -182,6 +208,56 @@ ACMI_EXPORT_CSV_HEADERS = [
 ]
 
 
+# T(Transform)各种写法对应的属性，按分量个数区分
+# T = Longitude | Latitude | Altitude
+# T = Longitude | Latitude | Altitude | U | V
+# T = Longitude | Latitude | Altitude | Roll | Pitch | Yaw
+# T = Longitude | Latitude | Altitude | Roll | Pitch | Yaw | U | V | Heading
+ACMI_TRANSFORM_FIELDS = {
+    3: ('Longitude', 'Latitude', 'Altitude'),
+    5: ('Longitude', 'Latitude', 'Altitude', 'U', 'V'),
+    6: ('Longitude', 'Latitude', 'Altitude', 'Roll', 'Pitch', 'Yaw'),
+    9: ('Longitude', 'Latitude', 'Altitude', 'Roll', 'Pitch', 'Yaw', 'U', 'V', 'Heading'),
+}
+
+
+# 解析T属性，返回[(属性名, 值)]，省略的分量（没有变化）不返回
+# 经纬度会加上ReferenceLongitude/ReferenceLatitude
+def parse_transform(val: str, reference_longitude: float = 0, reference_latitude: float = 0) -> list:
+    pos_list = val.split('|')
+    names = ACMI_TRANSFORM_FIELDS.get(len(pos_list), ACMI_TRANSFORM_FIELDS[3])
+    result = []
+    for name, pos in zip(names, pos_list):
+        if not pos:
+            continue
+        if name == 'Longitude':
+            result.append((name, reference_longitude + float(pos)))
+        elif name == 'Latitude':
+            result.append((name, reference_latitude + float(pos)))
+        else:
+            result.append((name, float(pos)))
+    return result
+
+
+# 解析事件 Event = EventType | FirstObjectId | SecondObjectId | ... | EventText
+# 返回 (事件类型, 相关对象ID列表, 事件文本, 参数)
+# Timeout事件的各部分是 key:value 形式，例如 Timeout|SourceId:507|AmmoType:FOX2|TargetId:201|Outcome:Kill
+def parse_event(val: str):
+    parts = val.split('|')
+    event_type = parts[0]
+    if event_type == 'Timeout':
+        params = { }
+        for part in parts[1:]:
+            if ':' in part:
+                key, param = part.split(':', 1)
+                params[key] = param
+        obj_ids = [params[key] for key in ('SourceId', 'TargetId') if params.get(key)]
+        return event_type, obj_ids, '', params
+    if len(parts) == 1:
+        return event_type, [], '', { }
+    return event_type, [obj_id for obj_id in parts[1:-1] if obj_id], parts[-1], { }
+
+
 class AcmiType(ValueConstant):
     Plane = 'Plane'
     Helicopter = 'Helicopter'
@@ -269,69 +345,162 @@ for k in ACMI_TYPE_TAGS:
     tags = ACMI_TYPE_TAGS[k]
     ACMI_TYPE_TAGS[k] = ['+'.join(sorted(tag.split('+'))) for tag in tags]
 
+# 每个AcmiType在类型位掩码中占一位
+ACMI_TYPE_BITS = { _type: 1 << i for i, _type in enumerate(ACMI_TYPE_TAGS) }
+
+
+class AcmiTagRegistry:
+    """Interns each distinct Type tag set once as a bitmask of the AcmiTypes it matches."""
+
+    def __init__(self):
+        # 预处理后的标签组合（按ascii排序后用+连接） -> 类型位掩码
+        self.normalized_masks = { }
+        for _type, tags_list in ACMI_TYPE_TAGS.items():
+            for tags in tags_list:
+                self.normalized_masks[tags] = self.normalized_masks.get(tags, 0) | ACMI_TYPE_BITS[_type]
+        # Type原始值 -> 类型位掩码
+        self.masks = { }
+        # 类型位掩码 -> 类型名称（多个类型用+连接） / 类型列表
+        self.names = { 0: '' }
+        self.types = { 0: () }
+
+    # Type属性的值（例如Air+FixedWing）对应的类型位掩码，标签组合需要和ACMI_TYPE_TAGS中的某一项完全一致
+    def classify(self, tags: str) -> int:
+        mask = self.masks.get(tags)
+        if mask is None:
+            mask = self.masks[tags] = self.normalized_masks.get('+'.join(sorted(tags.split('+'))), 0)
+        return mask
+
+    def types_of(self, mask: int) -> tuple:
+        types = self.types.get(mask)
+        if types is None:
+            types = self.types[mask] = tuple(_type for _type, bit in ACMI_TYPE_BITS.items() if mask & bit)
+        return types
+
+    # 类型位掩码对应的类型名称，多个类型用+连接
+    def name_of(self, mask: int) -> str:
+        name = self.names.get(mask)
+        if name is None:
+            name = self.names[mask] = '+'.join(self.types_of(mask))
+        return name
+
+    # 类型名称（AcmiObject.type）对应的类型位掩码
+    def mask_of(self, name: str) -> int:
+        mask = 0
+        if name:
+            for _type in name.split('+'):
+                mask |= ACMI_TYPE_BITS.get(_type, 0)
+        return mask
+
+
+ACMI_TAG_REGISTRY = AcmiTagRegistry()
+
+
+# 在SortedDict的time写入val时，最后一条数据是否可以去掉：时间晚于最后一条数据，并且值与最后两条相同
+# 这时最后一条数据是一段相同值的结尾，用time的数据代替它，每段相同值只保留第一条和最后一条数据，
+# get_value和linear插值的结果不变
+def is_repeated_sample(timeline: sortedcontainers.SortedDict, time: float, val) -> bool:
+    if len(timeline) < 2:
+        return False
+    last_time, last_val = timeline.peekitem(-1)
+    return time > last_time and last_val == val and timeline.peekitem(-2)[1] == val
+
 
 class AcmiObject:
+    __slots__ = ('id', 'removed_at', 'columnar', 'collapse', 'data', 'tags', 'type', 'type_mask', 'name', 'country')
 
-    def __init__(self, obj_id: str):
+    # columnar: 是否使用列式存储（加载时追加写入，加载结束后统一转换成numpy数组）
+    # collapse: 每段相同值只记录第一条和最后一条数据（get_value和linear插值的结果不变，见is_repeated_sample）
+    def __init__(self, obj_id: str, columnar: bool = False, collapse: bool = False):
         self.id = obj_id
         self.removed_at = None
+        self.columnar = columnar
+        self.collapse = collapse
 
         self.data = { }
 
         self.tags = ''
         self.type = ''  # 多个类型用+连接
+        self.type_mask = 0  # 类型位掩码（见ACMI_TYPE_BITS）
 
         # 对象的名称。用于标识该对象。例如，F-16飞机的名称为“Viper”。
         self.name = None
         # Country：对象所属的国家。用于标识对象所属的国家。例如，F-16飞机所属的国家为“美国”。
         self.country = None
 
+    # 对象第一次出现的时间（所有属性中最早的一条数据）
+    @property
+    def created_at(self) -> Optional[float]:
+        created_at = None
+        for timeline in self.data.values():
+            if isinstance(timeline, ACMI_COLUMNAR_TIMELINES):
+                first = timeline.first_time()
+            else:
+                first = timeline.keys()[0] if len(timeline) else None
+            if first is not None and (created_at is None or first < created_at):
+                created_at = first
+        return created_at
+
+    # 对象在time时刻是否存在（已出现且未被移除）
+    def is_alive(self, time: float) -> bool:
+        created_at = self.created_at
+        return created_at is not None and created_at <= time and (self.removed_at is None or time < self.removed_at)
+
+    # 是否属于某个类型
+    def is_type(self, _type: str) -> bool:
+        return (self.type_mask & ACMI_TYPE_BITS.get(_type, 0)) != 0
+
     # 飞机
     @property
     def is_plane(self):
-        return AcmiType.Plane in self.type
+        return (self.type_mask & ACMI_TYPE_BITS[AcmiType.Plane]) != 0
 
     # 导弹，是一种可以自行控制运动轨迹、并击中目标的武器。
     @property
     def is_missile(self):
-        return AcmiType.Missile in self.type
+        return (self.type_mask & ACMI_TYPE_BITS[AcmiType.Missile]) != 0
 
     # 箭状烟雾弹，是一种烟雾弹的类型，可以用于干扰敌方导弹、火箭炮或飞机系统。
     @property
     def is_flare(self):
-        return AcmiType.Flare in self.type
+        return (self.type_mask & ACMI_TYPE_BITS[AcmiType.Flare]) != 0
 
     # 箔条干扰弹，是一种用于干扰雷达信号的武器，通常由一些金属箔条组成。
     @property
     def is_chaff(self):
-        return AcmiType.Chaff in self.type
+        return (self.type_mask & ACMI_TYPE_BITS[AcmiType.Chaff]) != 0
 
     # 弹片，是爆炸物体爆炸时产生的金属碎片和碎片。
     @property
     def is_shrapnel(self):
-        return AcmiType.Shrapnel in self.type
+        return (self.type_mask & ACMI_TYPE_BITS[AcmiType.Shrapnel]) != 0
 
     # 牛眼: 空战中心点的位置，用来方便飞行员报告目标位置和距离
     @property
     def is_bullseye(self):
-        return AcmiType.Bullseye in self.type
+        return (self.type_mask & ACMI_TYPE_BITS[AcmiType.Bullseye]) != 0
 
     def set_value(self, field: str, timeframe: float, val: Union[int, float, str]):
         def do_set_value(do_field, do_val):
-            if do_field not in self.data:
-                self.data[do_field] = sortedcontainers.SortedDict()
-            self.data[do_field][timeframe] = do_val
+            timeline = self.data.get(do_field)
+            if timeline is None:
+                timeline = AcmiTimelineBuilder(self.collapse) if self.columnar else sortedcontainers.SortedDict()
+                self.data[do_field] = timeline
+            elif type(timeline) is AcmiColumn:
+                # 已经转换成列的属性追加数据时，重新转换成可追加的builder
+                timeline = self.data[do_field] = timeline.builder(self.collapse)
+            elif self.collapse and type(timeline) is sortedcontainers.SortedDict and \
+                    is_repeated_sample(timeline, timeframe, do_val):
+                # AcmiTimelineBuilder在写入时自己判断
+                timeline.popitem(-1)
+            timeline[timeframe] = do_val
 
         if field == 'Type':
-            match_tags = '+'.join(sorted(val.split('+')))
-            match_types = []
             self.tags = val
             do_set_value('Tags', self.type)
             if not self.type:
-                for _type in ACMI_TYPE_TAGS:
-                    if match_tags in ACMI_TYPE_TAGS[_type]:
-                        match_types.append(_type)
-                self.type = '+'.join(match_types)
+                self.type_mask = ACMI_TAG_REGISTRY.classify(val)
+                self.type = ACMI_TAG_REGISTRY.name_of(self.type_mask)
                 do_set_value('Type', self.type)
             return
         elif field == 'Name':
@@ -349,6 +518,8 @@ class AcmiObject:
         if field not in self.data:
             return None
         data = self.data[field]
+        if isinstance(data, ACMI_COLUMNAR_TIMELINES):
+            return data.get_value(time)
         timeframe_keys = data.keys()
         if len(timeframe_keys) == 0:
             return None
@@ -363,6 +534,40 @@ class AcmiObject:
                 return data[timeframe_keys[pos - 1]]
         return data[timeframe_keys[-1]]
 
+    # 属性的取值区间 [(值, 开始时间, 结束时间)]，相邻的相同值合并成一个区间，最后一个区间结束于removed_at（未移除时为None）
+    # value: 只返回取值为value的区间，例如 obj.intervals('Coalition', 'Enemies')
+    def intervals(self, field: str, value=None) -> list:
+        timeline = self.data.get(field)
+        if timeline is None:
+            return []
+        intervals = as_column(timeline).intervals(end=self.removed_at)
+        if value is not None:
+            intervals = [interval for interval in intervals if interval[0] == value]
+        return intervals
+
+    # 批量采样多个属性，返回形状为(len(times), len(fields))的二维数组
+    # method: 'previous' 与get_value语义相同；'linear' 对数值属性线性插值（角度属性按360度周期插值），文本属性仍取前值
+    # 全部是数值属性时返回float64数组，否则返回object数组；不存在的属性填充NaN
+    def sample(self, fields: list[str], times, method: str = 'previous') -> np.ndarray:
+        times = np.asarray(times, dtype=np.float64)
+        columns = []
+        for field in fields:
+            timeline = self.data.get(field)
+            if timeline is None:
+                columns.append(np.full(times.shape, np.nan))
+                continue
+            if not isinstance(timeline, ACMI_COLUMNAR_TIMELINES):
+                timeline = AcmiColumn.from_samples(list(timeline.keys()), list(timeline.values()))
+            columns.append(timeline.sample(times, method=method, angle_low=ACMI_ANGLE_PROPERTIES.get(field)))
+
+        if all(col.dtype == np.float64 for col in columns):
+            result = np.empty((len(times), len(fields)), dtype=np.float64)
+        else:
+            result = np.empty((len(times), len(fields)), dtype=object)
+        for i, col in enumerate(columns):
+            result[:, i] = col
+        return result
+
     def u(self, time: Optional[float] = None):
         return self.get_value("U", time)
 
@@ -558,6 +763,12 @@ class AcmiObject:
     def drag_chute(self, time: Optional[float] = None):
         return self.get_value('DragChute', time)
 
+    # 将所有属性的时间序列转换成列式存储
+    def to_columnar(self):
+        for field, timeline in self.data.items():
+            self.data[field] = as_column(timeline)
+        self.columnar = True
+
     def json(self, time: Optional[float] = None):
         json_data = {
             'ID'     : self.id,
@@ -575,30 +786,262 @@ class AcmiObject:
         return json.dumps(self.json(), ensure_ascii=False, indent=2)
 
 
-class AcmiFileReader:
-    """Stream reading class that correctly line escaped acmi files."""
+# 对象ID的文本形式，compact模式下的整数ID还原成十六进制
+def format_obj_id(obj_id: Union[str, int]) -> str:
+    if type(obj_id) is int:
+        return '%x' % obj_id
+    return str(obj_id)
+
+
+# 每次读取的数据块大小（字节或字符）
+ACMI_READ_BLOCK_SIZE = 1 << 20
+# 后台线程预先读取的数据块数
+ACMI_READ_QUEUE_BLOCKS = 4
+# 数据块中是否有续行：反斜杠之后只有行尾的空白
+ACMI_CONTINUATION_PATTERN = re.compile(r'\\[ \t\r]*\n')
+
+
+# 行是否以未转义的反斜杠结尾（续行，与下一行合并），行尾的空白不算，\\是转义的反斜杠
+def is_continued_line(line: str) -> bool:
+    line = line.rstrip()
+    return (len(line) - len(line.rstrip('\\'))) % 2 == 1
+
+
+# 合并续行：以未转义的反斜杠结尾的行去掉反斜杠后与下一行用换行连接
+# 返回 (逻辑行列表, 最后还在等待下一行的原始行列表)，final为True时等待中的行也合并输出
+def join_continued_lines(lines: list, final: bool = False) -> tuple:
+    result = []
+    parts = []
+    run_start = 0
+    for i, line in enumerate(lines):
+        if is_continued_line(line):
+            if not parts:
+                run_start = i
+            parts.append(line.rstrip()[:-1])
+            continue
+        if parts:
+            parts.append(line)
+            line = '\n'.join(parts)
+            parts = []
+        result.append(line)
+    if not parts:
+        return result, []
+    if final:
+        result.append('\n'.join(parts))
+        return result, []
+    return result, lines[run_start:]
+
 
-    def __init__(self, fh):
-        self.fh = fh
+class AcmiFileReader:
+    """Block-oriented reader that yields logical acmi lines, joining escaped line continuations."""
+
+    # source: 文本流、二进制流（文件、zip中的文件）或者内存中的bytes，二进制数据按utf-8（可以带BOM）解码
+    # stats: 累计读取行数的AcmiLoadStats
+    # background: 在后台线程中读取（解压）和解码数据块，与解析并行；None表示多核时对zip中的文件自动启用
+    # 产出的行不包括行尾的换行符
+    def __init__(self, source, stats: Optional[AcmiLoadStats] = None, background: Optional[bool] = None,
+                 block_size: int = ACMI_READ_BLOCK_SIZE):
+        self.source = source
+        self.stats = stats
+        self.block_size = block_size
+        if background is None:
+            background = isinstance(source, zipfile.ZipExtFile) and (os.cpu_count() or 1) > 1
+        self.background = background
+        self._stop = None
+        self._thread = None
+        self._lines = self._iter_lines()
 
     def __iter__(self):
-        return self
+        return self._lines
 
     def __next__(self):
-        line = self.fh.readline()
-        # line = rl.decode(AcmiFileReader._codec)
-        if len(line) == 0:
-            raise StopIteration
+        return next(self._lines)
+
+    # 停止读取（后台线程随之退出）
+    def close(self):
+        self._lines.close()
+
+    # 解码后的文本块
+    def _blocks(self):
+        source = self.source
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            yield bytes(source).decode(ACMI_FILE_ENCODING)
+            return
+        first = source.read(self.block_size)
+        if isinstance(first, str):
+            block = first
+            while block:
+                yield block
+                block = source.read(self.block_size)
+            return
+        decoder = codecs.getincrementaldecoder(ACMI_FILE_ENCODING)()
+        block = first
+        while block:
+            text = decoder.decode(block)
+            if text:
+                yield text
+            block = source.read(self.block_size)
+        text = decoder.decode(b'', final=True)
+        if text:
+            yield text
+
+    # 在后台线程中产出_blocks，队列满时等待，消费者停止后线程退出
+    def _background_blocks(self):
+        blocks = queue.Queue(maxsize=ACMI_READ_QUEUE_BLOCKS)
+        stop = self._stop = threading.Event()
+
+        def put(item) -> bool:
+            while not stop.is_set():
+                try:
+                    blocks.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def produce():
+            try:
+                for block in self._blocks():
+                    if not put(block):
+                        return
+            except BaseException as e:
+                put(e)
+                return
+            put(None)
+
+        self._thread = threading.Thread(target=produce, name='pyacmi-reader', daemon=True)
+        self._thread.start()
+        try:
+            while True:
+                block = blocks.get()
+                if block is None:
+                    return
+                if isinstance(block, BaseException):
+                    raise block
+                yield block
+        finally:
+            stop.set()
+            self._thread.join()
+
+    def _iter_lines(self):
+        stats = self.stats
+        pending = ''
+        for block in (self._background_blocks() if self.background else self._blocks()):
+            text = pending + block if pending else block
+            lines = text.split('\n')
+            pending = lines.pop()
+            if ACMI_CONTINUATION_PATTERN.search(text) is not None:
+                lines, waiting = join_continued_lines(lines)
+                if waiting:
+                    # 续行跨越了数据块，留到下一块一起处理
+                    pending = '\n'.join(waiting) + '\n' + pending
+            if stats is not None:
+                stats.lines += len(lines)
+            yield from lines
+        if pending:
+            lines, _ = join_continued_lines(pending.split('\n'), final=True)
+            if stats is not None:
+                stats.lines += len(lines)
+            yield from lines
+
+
+ACMI_ESCAPE_PATTERN = re.compile(r'\\([,\\])|,')
+
+
+# 处理带转义字符的行：按未转义的逗号切分，并去掉转义用的反斜杠
+def split_escaped_fields(line: str) -> list:
+    fields = []
+    parts = []
+    last = 0
+    for m in ACMI_ESCAPE_PATTERN.finditer(line):
+        parts.append(line[last:m.start()])
+        escaped = m.group(1)
+        if escaped is None:
+            fields.append(''.join(parts))
+            parts = []
+        else:
+            parts.append(escaped)
+        last = m.end()
+    parts.append(line[last:])
+    fields.append(''.join(parts))
+    return fields
 
-        while line.strip().endswith('\\'):
-            line = line.strip()[:-1] + '\n' + self.fh.readline()
 
-        return line
+# 依次打开acmi文件（zip压缩的acmi会打开其中的每个文件），返回文本流
+# binary: 返回二进制流，交给AcmiFileReader按块读取和解码
+def open_acmi_streams(filepath: str, binary: bool = False):
+    if zipfile.is_zipfile(filepath):
+        with zipfile.ZipFile(file=filepath) as my_zip:
+            for name in my_zip.namelist():
+                with my_zip.open(name) as f:
+                    yield f if binary else io.TextIOWrapper(f, encoding=ACMI_FILE_ENCODING)
+    elif binary:
+        with open(filepath, 'rb') as f:
+            yield f
+    else:
+        with open(filepath, 'r', encoding=ACMI_FILE_ENCODING) as f:
+            yield f
+
+
+class AcmiLoadFilter:
+    """Load-time projection and filtering state, including the per-object include/exclude decisions."""
+
+    # fields: 只加载这些属性（T表示T中的全部分量），Type总是加载
+    # types: 只加载这些类型（AcmiType）的对象，对象的类型由它的第一个Type决定
+    # object_ids: 只加载这些ID的对象，与解析后的对象ID比较（compact模式为整数）
+    # time_range: (t0, t1)，只加载这段时间内的时间帧，t0之前的数据折算到t0（保留t0时刻的状态），t1之后停止读取
+    def __init__(self, fields: Optional[list] = None, types: Optional[list] = None,
+                 object_ids: Optional[list] = None, time_range: Optional[tuple] = None):
+        self.fields = None
+        if fields is not None:
+            self.fields = set(fields)
+            if 'T' in self.fields:
+                self.fields.update(ACMI_TRANSFORM_FIELDS[9])
+        self.type_mask = None
+        if types is not None:
+            self.type_mask = 0
+            for _type in types:
+                self.type_mask |= ACMI_TYPE_BITS[_type]
+        self.object_ids = set(object_ids) if object_ids is not None else None
+        self.start, self.end = time_range if time_range is not None else (None, None)
+        if self.start is None:
+            self.start = -float('inf')
+        if self.end is None:
+            self.end = float('inf')
+        # obj_id -> 是否加载
+        self.decisions = { }
+        # 还没有出现Type、无法判断类型的对象的数据 obj_id -> [(时间, fields)]
+        self.pending = { }
+        # 是否已经跳过了t0之前的时间帧
+        self.before_start = False
+
+    # 判断是否加载对象，还不能判断（需要等待Type）时返回None
+    def decide(self, obj_id, fields: list) -> Optional[bool]:
+        if self.object_ids is not None and obj_id not in self.object_ids:
+            return False
+        if self.type_mask is None:
+            return True
+        for field in fields[1:]:
+            if field.startswith('Type='):
+                return (ACMI_TAG_REGISTRY.classify(field[5:]) & self.type_mask) != 0
+        return None
 
 
 class Acmi:
-
-    def __init__(self):
+    # 解析时创建对象使用的类
+    object_class = AcmiObject
+
+    # columnar: 使用numpy列式存储对象属性，适合大文件（见AcmiColumn）
+    # compact: 节省内存的模式，对象ID解析成整数（输出时还原成十六进制，见format_obj_id），
+    #          文本属性值没有变化时不记录，重复的文本共用同一个字符串
+    # strict: 保留每一条原始数据。默认每段相同值只记录第一条和最后一条数据（get_value和linear插值的结果不变，
+    #         但按数据时间点导出的行只包括保留的数据）
+    def __init__(self, columnar: bool = False, compact: bool = False, strict: bool = False):
+        self.columnar = columnar
+        self.compact = compact
+        self.strict = strict
+        if compact:
+            self.parse_obj_id = self.parse_int_obj_id
         self.filepath: Optional[str] = None
         self.file_version: Optional[str] = None
         self.file_type: Optional[str] = None
@@ -630,16 +1073,35 @@ class Acmi:
 
         self.objects: dict[str, AcmiObject] = { }
         self.timeframes: list[float] = []
+        # 全局的Event行（见AcmiEventLog）
+        self.events = AcmiEventLog()
+        # 最近一次加载的统计（见AcmiLoadStats）
+        self.stats = AcmiLoadStats()
 
         # 加载
         # 解析到的object_keys
         self.object_fields: set[str] = { 'ID', 'Name', 'Type', 'Tags' }
 
+        # 按时间查询全体对象状态的帧索引（state_at第一次调用时构建）
+        self._frame_index = None
+        # 空间查询索引（neighbors/pairs_within第一次调用时构建）
+        self._spatial_index = None
+        # AcmiType -> 该类型的对象列表（objects_of_type第一次调用时构建）
+        self._type_index = None
+        # 加载时的筛选条件（见load_acmi）
+        self._load_filter: Optional[AcmiLoadFilter] = None
+        # 跟随正在写入的文件（见follow）
+        self._follower = None
+
     @staticmethod
     def parse_obj_id(val: str) -> str:
-        # return int(val, 16)
         return val
 
+    # compact模式下的对象ID
+    @staticmethod
+    def parse_int_obj_id(val: str) -> int:
+        return int(val, 16)
+
     @staticmethod
     def strptime(val: str):
         if len(val) < 22:
@@ -647,22 +1109,16 @@ class Acmi:
         else:
             return datetime.datetime.strptime(val, "%Y-%m-%dT%H:%M:%S.%fZ")
 
+    # 按未转义的逗号切分一行，并还原转义字符（\, -> , 以及 \\ -> \）
+    # 绝大多数行没有反斜杠，直接用str.split
     @staticmethod
     def split_fields(line):
-        fields = []
-        i = 1
-        lastfield = 0
-        while i < len(line):
-            if line[i - 1] != '\\' and line[i] == ',':
-                fields.append(line[lastfield:i])
-                lastfield = i + 1
-            i += 1
-
-        fields.append(line[lastfield:i])
-        return fields
+        if '\\' not in line:
+            return line.split(',')
+        return split_escaped_fields(line)
 
     # 解析Global Property
-    def _parse_global_property(self, fields: list):
+    def _parse_global_property(self, fields: list, timeframe: float = 0.0):
         for field in fields[1:]:  # skip objid (0)
             (prop, val) = field.split('=', 1)
             if prop == "ReferenceTime":
@@ -689,161 +1145,334 @@ class Acmi:
                 self.debriefing = val
             elif prop == "Comments":
                 self.comments = val
+            elif prop == 'Event':
+                self._parse_event(timeframe, val)
             elif prop == 'AuthenticationKey':
                 # TODO: 需要整明白这是个啥
-                return
+                continue
             elif prop == 'PlaybackDelay':
                 # 指定了回放文件的延迟时间。在这个例子中，PlaybackDelay的值为600.000000，这意味着回放文件将在600秒后开始播放。
                 self.playback_delay = float(val)
-                # TODO: 需要整明白这是个啥
-                return
             elif prop == 'PlaybackKey':
                 # 回放文件的密钥
                 # TODO: 需要整明白这是个啥
-                return
+                continue
             else:
-                print("Unknown global property: " + prop)
+                # 加载结束后汇总成一条警告（见_warn_unknown_properties）
+                unknown = self.stats.unknown_global_properties
+                unknown[prop] = unknown.get(prop, 0) + 1
                 # raise RuntimeError("Unknown global property: " + prop)
 
+    # 解析事件，time_range之前的事件不加载
+    def _parse_event(self, timeframe: float, val: str):
+        if self._load_filter is not None and timeframe < self._load_filter.start:
+            return
+        name, obj_ids, text, params = parse_event(val)
+        self.events.append(timeframe, name, [self.parse_obj_id(obj_id) for obj_id in obj_ids], text, params)
+
     # 解析Object Property
     def _parse_object_property(self, obj_id: str, timeframe: float, fields):
         if obj_id not in self.objects:
-            self.objects[obj_id] = AcmiObject(obj_id)
+            self.objects[obj_id] = self.object_class(obj_id, columnar=self.columnar, collapse=not self.strict)
 
         obj = self.objects[obj_id]
+        keep_fields = self._load_filter.fields if self._load_filter is not None else None
         for field in fields[1:]:
             (prop, val) = field.split('=', 1)
 
             if prop == "T":
-                pos_list = val.split('|')
-                if not pos_list:
-                    continue
-                if pos_list[0]:
-                    obj.set_value("Longitude", timeframe, self.reference_longitude + float(pos_list[0]))
-                    self.object_fields.add('Longitude')
-                if pos_list[1]:
-                    obj.set_value("Latitude", timeframe, self.reference_latitude + float(pos_list[1]))
-                    self.object_fields.add('Latitude')
-                if pos_list[2]:
-                    obj.set_value("Altitude", timeframe, float(pos_list[2]))
-                    self.object_fields.add('Altitude')
-
-                if len(pos_list) == 5:
-                    if pos_list[3]:
-                        obj.set_value("U", timeframe, float(pos_list[3]))
-                        self.object_fields.add('U')
-                    if pos_list[4]:
-                        obj.set_value("V", timeframe, float(pos_list[4]))
-                        self.object_fields.add('V')
-                if len(pos_list) == 6:
-                    if pos_list[3]:
-                        obj.set_value("Roll", timeframe, float(pos_list[3]))
-                        self.object_fields.add('Roll')
-                    if pos_list[4]:
-                        obj.set_value("Pitch", timeframe, float(pos_list[4]))
-                        self.object_fields.add('Pitch')
-                    if pos_list[5]:
-                        obj.set_value("Yaw", timeframe, float(pos_list[5]))
-                        self.object_fields.add('Yaw')
-                if len(pos_list) == 9:
-                    if pos_list[3]:
-                        obj.set_value("Roll", timeframe, float(pos_list[3]))
-                        self.object_fields.add('Roll')
-                    if pos_list[4]:
-                        obj.set_value("Pitch", timeframe, float(pos_list[4]))
-                        self.object_fields.add('Pitch')
-                    if pos_list[5]:
-                        obj.set_value("Yaw", timeframe, float(pos_list[5]))
-                        self.object_fields.add('Yaw')
-                    if pos_list[6]:
-                        obj.set_value("U", timeframe, float(pos_list[6]))
-                        self.object_fields.add('U')
-                    if pos_list[7]:
-                        obj.set_value("V", timeframe, float(pos_list[7]))
-                        self.object_fields.add('V')
-                    if pos_list[8]:
-                        obj.set_value("Heading", timeframe, float(pos_list[8]))
-                        self.object_fields.add('Heading')
-
+                for t_field, t_val in parse_transform(val, self.reference_longitude, self.reference_latitude):
+                    if keep_fields is not None and t_field not in keep_fields:
+                        continue
+                    obj.set_value(t_field, timeframe, t_val)
+                    self.object_fields.add(t_field)
+                continue
+            elif keep_fields is not None and prop not in keep_fields and prop != "Type":
                 continue
             elif prop == "Name":
                 obj.set_value(prop, timeframe, val)
-            elif prop == "Parent" or prop == "FocusTarget" or prop.startswith('LockedTarget'):
+            elif prop in ACMI_OBJECT_ID_PROPERTIES:
                 obj.set_value(prop, timeframe, self.parse_obj_id(val))
             elif prop == "Type":
                 obj.set_value(prop, timeframe, val)
             elif prop in ACMI_TEXT_PROPERTIES:
+                if self.compact:
+                    # 文本没有变化时不记录（strict时保留每一条数据），重复的文本共用同一个字符串
+                    if not self.strict and prop in obj.data and obj.get_value(prop) == val:
+                        self.object_fields.add(prop)
+                        continue
+                    val = sys.intern(val)
                 obj.set_value(prop, timeframe, val)
             elif prop in ACMI_NUMERIC_PROPERTIES:
                 obj.set_value(prop, timeframe, float(val))
             else:
-                obj.set_value(prop, timeframe, val)
-                print("Unknown Object property:", prop)
+                obj.set_value(prop, timeframe, sys.intern(val) if self.compact else val)
+                unknown = self.stats.unknown_object_properties
+                unknown[prop] = unknown.get(prop, 0) + 1
 
             self.object_fields.add(prop)
 
-    def load_acmi(self, filepath: str):
+    # 加载acmi文件
+    # workers: 大于1时按时间帧把文件切分成多段，使用多进程并行解析（见load_acmi_parallel）
+    # cache: 是否使用缓存文件（<filepath>.acmicache，compact和strict模式分别使用单独的缓存文件，见cache_path_for），缓存比acmi文件新时直接读取缓存，否则解析后写入缓存
+    # mmap: 与cache一起使用，以只读的内存映射模式打开缓存（见load_cache）
+    # fields/types/object_ids/time_range: 加载时的筛选条件（见AcmiLoadFilter），被排除的对象的行不做切分和转换，
+    #     指定了筛选条件时总是串行解析，不能和cache、workers一起使用
+    # index: 与time_range一起使用，通过帧偏移索引（<filepath>.acmiindex，不存在或过期时自动建立）从t0之前最近的检查点开始解析
+    # profile: 把解析细分为read/tokenize/convert阶段计时，并按属性名计数（见AcmiLoadStats），会让加载变慢
+    # progress: 每读取ACMI_PROGRESS_LINES行以及加载结束时调用progress(stats)
+    # 加载的统计保存在self.stats，出现未知属性时在加载结束后发出一条汇总的警告
+    def load_acmi(self, filepath: str, workers: Optional[int] = None, cache: bool = False, mmap: bool = False,
+                  fields: Optional[list[str]] = None, types: Optional[list] = None,
+                  object_ids: Optional[list] = None, time_range: Optional[tuple] = None, index: bool = False,
+                  profile: bool = False, progress: Optional[Callable] = None):
         self.filepath = filepath
+        self._invalidate_indexes()
+        self.stats = stats = AcmiLoadStats()
+        if profile or progress is not None:
+            instrument_acmi(self, profile=profile, progress=progress)
+        try:
+            with stats.timer('total'):
+                self._load_acmi(filepath, workers, cache, mmap, fields, types, object_ids, time_range, index)
+        finally:
+            uninstrument_acmi(self)
+        stats.seconds = stats.timers.pop('total')
+        stats.frames = len(self.timeframes)
+        stats.objects = len(self.objects)
+        stats.events = len(self.events)
+        stats.current_time = self.timeframes[-1] if self.timeframes else 0.0
+        if progress is not None:
+            progress(stats)
+        self._warn_unknown_properties()
+
+    def _load_acmi(self, filepath: str, workers: Optional[int], cache: bool, mmap: bool, fields: Optional[list[str]],
+                   types: Optional[list], object_ids: Optional[list], time_range: Optional[tuple], index: bool):
+        stats = self.stats
+        if mmap and not cache:
+            raise RuntimeError("mmap can only be used with cache.")
+        if index and time_range is None:
+            raise RuntimeError("index can only be used with time_range.")
+        if fields is not None or types is not None or object_ids is not None or time_range is not None:
+            if cache:
+                raise RuntimeError("Load filters can't be combined with cache.")
+            if workers is not None and workers > 1:
+                raise RuntimeError("Load filters can't be combined with workers.")
+            if object_ids is not None:
+                # 十六进制字符串和整数都可以，转换成与self.objects的键相同的形式（compact模式为整数）
+                object_ids = [self.parse_obj_id(format_obj_id(obj_id)) for obj_id in object_ids]
+            self._load_filter = AcmiLoadFilter(fields=fields, types=types, object_ids=object_ids,
+                                               time_range=time_range)
+            try:
+                with stats.timer('parse'):
+                    if index and time_range is not None:
+                        from .seek import open_seek_index
+                        open_seek_index(filepath).load_window(self)
+                    else:
+                        for f in open_acmi_streams(filepath, binary=True):
+                            self._parse_stream(f)
+                if self._load_filter.before_start and self.objects:
+                    # 文件在t0之前结束，保留t0时刻的状态
+                    self.timeframes.append(self._load_filter.start)
+            finally:
+                self._load_filter = None
+            if self.columnar:
+                with stats.timer('store'):
+                    self.to_columnar()
+            return
 
-        def do_parse(f):
-            ar = AcmiFileReader(f)
-            rawline = next(ar)
-            if rawline.startswith('FileType='):
-                self.file_type = rawline[len('FileType='):].strip()
-            else:
-                raise RuntimeError("ACMI file doesn't start with FileType.")
+        if cache:
+            from .cache import cache_path_for, is_cache_fresh
+            cache_path = cache_path_for(filepath, compact=self.compact, strict=self.strict)
+            if is_cache_fresh(filepath, cache_path):
+                with stats.timer('cache'):
+                    self.load_cache(cache_path, mmap=mmap)
+                self.filepath = filepath
+                return
 
-            rawline = next(ar)
-            if rawline.startswith('FileVersion='):
-                self.file_version = float(rawline[len('FileVersion='):].strip())
-                if self.file_version < 2.1:
-                    raise RuntimeError("Unsupported file version: {v}".format(v=self.file_version))
+        with stats.timer('parse'):
+            if workers is not None and workers > 1:
+                from .parallel import load_acmi_parallel
+                load_acmi_parallel(self, filepath, workers=workers)
             else:
-                raise RuntimeError("ACMI file missing FileVersion.")
-
-            cur_reftime = 0.0
-            linenr = 2
-            for rawline in ar:
-                linenr += 1
-                line = rawline.strip()  # type: str
-                if not line or line.startswith('//'):
-                    continue  # ignore comments
-
-                if line.startswith('#'):
-                    try:
-                        cur_reftime = float(line[1:])
-                    except Exception as e:
-                        continue
-                    self.timeframes.append(cur_reftime)
+                for f in open_acmi_streams(filepath, binary=True):
+                    self._parse_stream(f)
+
+        with stats.timer('store'):
+            if self.columnar:
+                self.to_columnar()
+            if cache:
+                self.save_cache(cache_path)
+        if cache and mmap:
+            with stats.timer('cache'):
+                self.load_cache(cache_path, mmap=True)
+
+    # 对本次加载中新出现的未知属性发出一条汇总的警告
+    def _warn_unknown_properties(self):
+        unknown = self.stats.new_unknown_properties()
+        if not unknown:
+            return
+        props = ', '.join('{g}{p} ({n})'.format(g='global ' if is_global else '', p=prop, n=count)
+                          for prop, count, is_global in unknown)
+        warnings.warn('Unknown properties in {f}: {p}'.format(f=self.filepath, p=props), stacklevel=3)
+
+    # 跟随正在写入的acmi文件（不支持zip压缩），解析已经写入的完整数据，之后调用refresh只解析新追加的数据
+    # callback: 有变化时调用callback(acmi, AcmiRefresh)
+    # 返回AcmiRefresh，包括新的时间帧、有新数据的对象和被移除的对象
+    def follow(self, filepath: str, callback: Optional[Callable] = None):
+        from .follow import AcmiFollower
+        self.filepath = filepath
+        self.stats = AcmiLoadStats()
+        self._follower = AcmiFollower(self, filepath, callback=callback)
+        return self._follower.refresh()
+
+    # 解析follow的文件中新追加的数据，返回AcmiRefresh
+    def refresh(self):
+        if self._follower is None:
+            raise RuntimeError("Call follow() before refresh().")
+        return self._follower.refresh()
+
+    # 保存解析结果到二进制缓存文件
+    def save_cache(self, path: str):
+        from .cache import save_cache
+        save_cache(self, path)
+
+    # 从二进制缓存文件加载
+    # mmap: 只读的内存映射模式，objects[id].get_value/sample直接读取映射的缓冲区，不拷贝数据；
+    #       对象在第一次访问时才创建，打开文件几乎没有开销，多个进程可以共享同一份页缓存
+    def load_cache(self, path: str, mmap: bool = False):
+        from .cache import load_cache
+        self._invalidate_indexes()
+        load_cache(self, path, mmap=mmap)
+
+    # 解析一个文本流或二进制流（见AcmiFileReader）
+    def _parse_stream(self, f):
+        ar = AcmiFileReader(f, self.stats)
+        try:
+            self._parse_header(ar)
+            self._parse_lines(ar)
+        finally:
+            ar.close()
+        self.stats.bytes += stream_bytes(f)
+
+    # 解析文件头的FileType和FileVersion
+    def _parse_header(self, ar: AcmiFileReader):
+        rawline = next(ar)
+        if rawline.startswith('FileType='):
+            self.file_type = rawline[len('FileType='):].strip()
+        else:
+            raise RuntimeError("ACMI file doesn't start with FileType.")
+
+        rawline = next(ar)
+        if rawline.startswith('FileVersion='):
+            self.file_version = float(rawline[len('FileVersion='):].strip())
+            if self.file_version < 2.1:
+                raise RuntimeError("Unsupported file version: {v}".format(v=self.file_version))
+        else:
+            raise RuntimeError("ACMI file missing FileVersion.")
+
+    # 解析文件头之后的行，cur_reftime是起始时间帧，返回最后所在的时间帧
+    def _parse_lines(self, lines, cur_reftime: float = 0.0) -> float:
+        if self._load_filter is not None:
+            return self._parse_filtered_lines(lines, cur_reftime)
+        for rawline in lines:
+            line = rawline.strip()  # type: str
+            if not line or line.startswith('//'):
+                continue  # ignore comments
+
+            if line.startswith('#'):
+                try:
+                    cur_reftime = float(line[1:])
+                except Exception as e:
                     continue
+                self.timeframes.append(cur_reftime)
+                continue
+
+            if line.startswith('-'):
+                self._remove_object(self.parse_obj_id(line[1:]), cur_reftime)
+            else:
+                fields = self.split_fields(line)
+                obj_id = self.parse_obj_id(fields[0])
 
-                if line.startswith('-'):
-                    obj_id = self.parse_obj_id(line[1:])
-                    self.objects[obj_id].removed_at = cur_reftime
+                # print(obj_id, fields)
+                if obj_id == '0' or obj_id == 0:
+                    self._parse_global_property(fields, cur_reftime)
                 else:
-                    fields = self.split_fields(line)
-                    obj_id = self.parse_obj_id(fields[0])
+                    self._parse_object_property(obj_id, cur_reftime, fields)
+        return cur_reftime
+
+    # 带筛选条件的_parse_lines，读到t1之后的时间帧时停止
+    def _parse_filtered_lines(self, lines, cur_reftime: float = 0.0) -> float:
+        load_filter = self._load_filter
+        start = load_filter.start
+        decisions = load_filter.decisions
+        for rawline in lines:
+            line = rawline.strip()
+            if not line or line.startswith('//'):
+                continue
+
+            if line.startswith('#'):
+                try:
+                    frame = float(line[1:])
+                except Exception:
+                    continue
+                if frame > load_filter.end:
+                    break
+                cur_reftime = frame
+                if frame < start:
+                    load_filter.before_start = True
+                    continue
+                if load_filter.before_start:
+                    # t0之前的数据折算到了t0
+                    load_filter.before_start = False
+                    if frame != start:
+                        self.timeframes.append(start)
+                self.timeframes.append(frame)
+                continue
 
-                    # print(obj_id, fields)
-                    if obj_id == '0' or obj_id == 0:
-                        self._parse_global_property(fields)
+            # t0之前的数据记在t0，后写入的覆盖先写入的
+            timeframe = cur_reftime if cur_reftime >= start else start
+            if line.startswith('-'):
+                obj_id = self.parse_obj_id(line[1:])
+                load_filter.pending.pop(obj_id, None)
+                if decisions.pop(obj_id, None) and obj_id in self.objects:
+                    if cur_reftime < start:
+                        del self.objects[obj_id]
                     else:
-                        self._parse_object_property(obj_id, cur_reftime, fields)
-
-        # if zipfile.is_zipfile(filepath):
-        #     raise RuntimeError("这是一个zip文件，请先将其解压（如果后缀是acmi，将acmi改成zip即可）: " + filepath)
-        # 打开zip文件
-        if zipfile.is_zipfile(filepath):
-            with zipfile.ZipFile(file=filepath) as my_zip:
-                # 打印zip文件中的文件列表
-
-                # 读取zip文件中的一个文件
-                for name in my_zip.namelist():
-                    with my_zip.open(name) as f:
-                        do_parse(io.TextIOWrapper(f, encoding=ACMI_FILE_ENCODING))
-        else:
-            with open(filepath, 'r', encoding=ACMI_FILE_ENCODING) as f:
-                do_parse(f)
+                        self._remove_object(obj_id, cur_reftime)
+                continue
+
+            comma = line.find(',')
+            obj_id = self.parse_obj_id(line if comma == -1 else line[:comma])
+            if obj_id == '0' or obj_id == 0:
+                self._parse_global_property(self.split_fields(line), cur_reftime)
+                continue
+            decision = decisions.get(obj_id)
+            if decision is False:
+                continue
+
+            fields = self.split_fields(line)
+            if decision is None:
+                decision = load_filter.decide(obj_id, fields)
+                if decision is None:
+                    load_filter.pending.setdefault(obj_id, []).append((timeframe, fields))
+                    continue
+                decisions[obj_id] = decision
+                pending = load_filter.pending.pop(obj_id, ())
+                if not decision:
+                    continue
+                for pending_timeframe, pending_fields in pending:
+                    self._parse_object_property(obj_id, pending_timeframe, pending_fields)
+            self._parse_object_property(obj_id, timeframe, fields)
+        return cur_reftime
+
+    def _remove_object(self, obj_id: str, timeframe: float):
+        self.objects[obj_id].removed_at = timeframe
+
+    # 将所有对象转换成列式存储
+    def to_columnar(self):
+        self.columnar = True
+        for obj in self.objects.values():
+            obj.to_columnar()
 
     def object_ids(self):
         return self.objects.keys()
@@ -854,14 +1483,72 @@ class Acmi:
     def removed_objects(self):
         return [self.objects[objkey] for objkey in self.objects if self.objects[objkey].removed_at is not None]
 
+    # 对象数据变化后，丢弃按旧数据构建的索引
+    def _invalidate_indexes(self):
+        self._frame_index = None
+        self._spatial_index = None
+        self._type_index = None
+
+    # 某个类型（AcmiType）的所有对象，按对象出现的顺序
+    def objects_of_type(self, _type: str) -> list:
+        if self._type_index is None:
+            self._type_index = { _type: [] for _type in ACMI_TYPE_BITS }
+            for obj in self.objects.values():
+                for obj_type in ACMI_TAG_REGISTRY.types_of(obj.type_mask):
+                    self._type_index[obj_type].append(obj)
+        return list(self._type_index.get(_type, ()))
+
+    # 构建帧索引，fields为需要索引的属性（默认为全部属性），cache_size为最近查询结果的LRU缓存大小
+    # 对象数据变化后需要重新构建
+    def build_frame_index(self, fields: Optional[list[str]] = None, cache_size: int = 128):
+        from .snapshot import AcmiFrameIndex
+        self._frame_index = AcmiFrameIndex(self, fields=fields, cache_size=cache_size)
+        return self._frame_index
+
+    # time时刻所有存活对象（已出现且未被移除）的状态
+    # 返回结构化数组，第一列为ID，其余每列为一个属性（数值属性为float64，缺失为NaN）；as_dataframe为True时返回pandas.DataFrame
+    def state_at(self, time: float, fields: Optional[list[str]] = None, as_dataframe: bool = False):
+        if self._frame_index is None:
+            self.build_frame_index()
+        state = self._frame_index.state_at(time, fields)
+        if as_dataframe:
+            import pandas as pd
+            return pd.DataFrame(state)
+        return state
+
+    # 构建空间查询索引（见pyacmi.spatial.AcmiSpatialIndex），对象数据变化后需要重新构建
+    def build_spatial_index(self, cache_size: int = 32):
+        from .spatial import AcmiSpatialIndex
+        self._spatial_index = AcmiSpatialIndex(self, cache_size=cache_size)
+        return self._spatial_index
+
+    # time时刻距离obj_id不超过radius（米）的存活对象，返回按距离排序的[(obj_id, 距离)]
+    def neighbors(self, obj_id: str, time: float, radius: float) -> list:
+        if self._spatial_index is None:
+            self.build_spatial_index()
+        return self._spatial_index.neighbors(obj_id, time, radius)
+
+    # time时刻距离不超过radius（米）的所有存活对象对，返回按距离排序的[(obj_id, obj_id, 距离)]
+    # filter: filter(AcmiObject) -> bool，只考虑返回True的对象，例如 lambda obj: obj.is_plane
+    def pairs_within(self, time: float, radius: float, filter=None) -> list:
+        if self._spatial_index is None:
+            self.build_spatial_index()
+        return self._spatial_index.pairs_within(time, radius, filter=filter)
+
+    # 两个对象的最近接近点，返回 (时刻, 距离（米）)，没有共同存在的时间时返回None
+    def closest_approach(self, obj_id: str, other_id: str, start: Optional[float] = None,
+                         end: Optional[float] = None):
+        from .spatial import closest_approach
+        return closest_approach(self.objects[obj_id], self.objects[other_id], start=start, end=end)
+
     def global_json(self):
         return {
             "FileType"          : self.file_type,
             "FileVersion"       : self.file_version,
             "DataSource"        : self.data_source,
             "DataRecorder"      : self.data_recorder,
-            "ReferenceTime"     : self.reference_time.isoformat(),
-            "RecordingTime"     : self.recording_time.isoformat(),
+            "ReferenceTime"     : self.reference_time.isoformat() if self.reference_time else None,
+            "RecordingTime"     : self.recording_time.isoformat() if self.recording_time else None,
             "Author"            : self.author,
             "Title"             : self.title,
             "Category"          : self.category,
@@ -881,64 +1568,43 @@ class Acmi:
     #     with open(export_filepath, 'w', encoding='utf-8') as f:
     #         json.dump(self.global_json(), f, ensure_ascii=False)
 
-    # 导出CSV
+    # 导出CSV，每个对象只导出其存活期间的时间帧，行按对象、时间排序（见pyacmi.export.export_csv）
     # remove_empty: 是否移除空列，默认移除
     # export_obj_ids: 选择导出的object ID None表示导出全部ID
-    def export_csv(self, filepath: str, remove_empty=True, export_obj_ids: Optional[list[str]] = None):
-        # 如果目录不存在，则创建目录
-        dirname = os.path.dirname(filepath)
-        if dirname and not os.path.exists(dirname):
-            os.makedirs(dirname)
-
-        headers = []
-        if remove_empty:
-            for field in ACMI_EXPORT_CSV_HEADERS:
-                if field == 'ReferenceTime':
-                    if not self.reference_time:
-                        continue
-                elif field == 'Category':
-                    if not self.category:
-                        continue
-                elif field == 'Time' or field == 'ID' or field == 'Name':
-                    headers.append(field)
-                    continue
-                else:
-                    if field not in self.object_fields:
-                        continue
-                headers.append(field)
-        else:
-            headers = ACMI_EXPORT_CSV_HEADERS
-        with open(filepath, 'w', newline='') as f:
-            writer = csv.writer(f)
-            # 写入表头
-            writer.writerow(headers)
-            lines = []
-            for t in tqdm(self.timeframes, desc=f'Exporting {self.title} to {filepath}'):
-                for obj_id in self.objects:
-                    if export_obj_ids is not None and obj_id not in export_obj_ids:
-                        continue
-
-                    obj = self.objects[obj_id]
-                    line = []
-
-                    for field in headers:
-                        if field == 'ReferenceTime':
-                            line.append(self.reference_time)
-                        elif field == 'Category':
-                            line.append(self.category)
-                        elif field == 'Time':
-                            line.append(t)
-                        else:
-                            line.append(obj.get_value(field=field, time=t))
-                    lines.append(line)
-                    if len(lines) > 1000:
-                        writer.writerows(lines)
-                        lines = []
-            writer.writerows(lines)
-
-    # 导出acmi
-    def export_acmi(self, filepath: str):
-        pass
+    # workers: 大于1时按对象分组，使用多进程生成CSV
+    def export_csv(self, filepath: str, remove_empty=True, export_obj_ids: Optional[list[str]] = None,
+                   workers: Optional[int] = None):
+        from .export import export_csv
+        export_csv(self, filepath, remove_empty=remove_empty, export_obj_ids=export_obj_ids, workers=workers)
+
+    # 转换成长格式的pyarrow.Table（见pyacmi.export.to_arrow），需要安装pyarrow
+    # fields: 导出的属性，None表示全部属性
+    # obj_ids: 对象ID列表，types: AcmiType列表，None表示不筛选
+    def to_arrow(self, fields: Optional[list[str]] = None, obj_ids: Optional[list[str]] = None,
+                 types: Optional[list] = None):
+        from .export import to_arrow
+        return to_arrow(self, fields=fields, obj_ids=obj_ids, types=types)
+
+    # 转换成pandas.DataFrame（见pyacmi.export.to_dataframe），需要安装pandas
+    # layout: 'long' 每个对象的每个时间点为一行，'wide' 以时间为索引，列为 (属性, 对象ID)
+    # freq: None表示原始数据的时间点，'timeframes'表示所有时间帧，数值表示间隔为freq秒的规则时间网格（前向填充）
+    def to_dataframe(self, layout: str = 'long', fields: Optional[list[str]] = None,
+                     obj_ids: Optional[list[str]] = None, types: Optional[list] = None, freq=None):
+        from .export import to_dataframe
+        return to_dataframe(self, layout=layout, fields=fields, obj_ids=obj_ids, types=types, freq=freq)
+
+    # 导出parquet，partition_by指定分区列（例如['Type']或['Coalition']）时path为目录
+    def export_parquet(self, path: str, fields: Optional[list[str]] = None, obj_ids: Optional[list[str]] = None,
+                       types: Optional[list] = None, partition_by: Optional[list[str]] = None,
+                       compression: str = 'zstd'):
+        from .export import export_parquet
+        export_parquet(self, path, fields=fields, obj_ids=obj_ids, types=types, partition_by=partition_by,
+                       compression=compression)
+
+    # 导出acmi（见pyacmi.writer.write_acmi），只写出变化的属性，以.zip.acmi结尾时写入zip压缩文件
+    def export_acmi(self, filepath: str, compress: Optional[bool] = None):
+        from .writer import write_acmi
+        write_acmi(self, filepath, compress=compress)
 
 
 # 解压缩acmi到指定目录，如果该acmi不是压缩文件，则复制到指定目录里
@@ -0,0 +1,372 @@
+"""
+解析结果的二进制缓存
+
+文件格式（小端）:
+    8字节  魔数 ACMI_CACHE_MAGIC
+    8字节  header长度(uint64)
+    8字节  源acmi文件的大小(int64，未知时为-1)
+    header  utf-8 JSON：全局属性、对象元数据、属性名和字符串表，以及各数组在数据区中的位置
+    数据区  按64字节对齐的数组：timeframes / times / numbers / codes，以及描述每个属性的属性表 field_*
+
+每个属性的时间序列是times中的一段，数值属性的值是numbers中等长的一段，文本属性的值是codes中等长的一段（下标指向字符串表）。
+数据区可以直接mmap，不需要拷贝。
+"""
+import datetime
+import gc
+import json
+import mmap as mmap_module
+import os
+import struct
+from collections.abc import Mapping
+from typing import Optional
+
+import numpy as np
+
+from .acmi import Acmi, ACMI_TAG_REGISTRY
+from .columnar import AcmiColumn, as_column
+from .events import AcmiEventLog
+
+ACMI_CACHE_MAGIC = b'PYACMI\x00\x01'
+ACMI_CACHE_VERSION = 4
+ACMI_CACHE_SUFFIX = '.acmicache'
+ACMI_CACHE_ALIGN = 64
+# 魔数 + header长度 + 源文件大小
+ACMI_CACHE_PREAMBLE = struct.Struct('<8sQq')
+
+# 需要缓存的全局属性 (属性名, 是否为datetime)
+ACMI_CACHE_GLOBALS = [
+    ('filepath', False),
+    ('file_version', False),
+    ('file_type', False),
+    ('data_source', False),
+    ('data_recorder', False),
+    ('reference_time', True),
+    ('recording_time', True),
+    ('author', False),
+    ('title', False),
+    ('category', False),
+    ('briefing', False),
+    ('debriefing', False),
+    ('comments', False),
+    ('reference_longitude', False),
+    ('reference_latitude', False),
+    ('playback_delay', False),
+]
+
+
+# 默认的缓存文件路径（与acmi文件放在一起）
+# compact模式的对象ID是整数，strict模式保留了重复的数据，分别使用单独的缓存文件
+def cache_path_for(filepath: str, compact: bool = False, strict: bool = False) -> str:
+    suffix = ACMI_CACHE_SUFFIX
+    if strict:
+        suffix = '.strict' + suffix
+    if compact:
+        suffix = '.compact' + suffix
+    return filepath + suffix
+
+
+# 缓存是否可用：缓存文件存在，比acmi文件新，记录的源文件大小一致，并且是当前版本的缓存
+def is_cache_fresh(filepath: str, cache_path: Optional[str] = None) -> bool:
+    cache_path = cache_path or cache_path_for(filepath)
+    if not os.path.exists(cache_path) or os.path.getmtime(cache_path) < os.path.getmtime(filepath):
+        return False
+    with open(cache_path, 'rb') as f:
+        preamble = f.read(ACMI_CACHE_PREAMBLE.size)
+    if len(preamble) < ACMI_CACHE_PREAMBLE.size:
+        return False
+    magic, _, source_size = ACMI_CACHE_PREAMBLE.unpack(preamble)
+    if magic != ACMI_CACHE_MAGIC or source_size != os.path.getsize(filepath):
+        return False
+    try:
+        read_cache_header(cache_path)
+    except RuntimeError:
+        return False
+    return True
+
+
+def _align(offset: int) -> int:
+    return (offset + ACMI_CACHE_ALIGN - 1) // ACMI_CACHE_ALIGN * ACMI_CACHE_ALIGN
+
+
+# 属性类型：数值 / 文本（字典编码） / 其他（值直接保存在header中）
+ACMI_CACHE_KIND_NUMBER = 0
+ACMI_CACHE_KIND_TEXT = 1
+ACMI_CACHE_KIND_OBJECT = 2
+
+
+def save_cache(acmi: Acmi, path: str):
+    globals_json = { }
+    for name, is_datetime in ACMI_CACHE_GLOBALS:
+        val = getattr(acmi, name)
+        globals_json[name] = val.isoformat() if is_datetime and val is not None else val
+
+    objects = { 'id': [], 'removed_at': [], 'tags': [], 'type': [], 'name': [], 'country': [] }
+    # 属性表：每一行描述一个对象的一个属性
+    table = { 'object': [], 'name': [], 'kind': [], 'start': [], 'length': [], 'values': [], 'categories': [] }
+    field_names = { }
+    categories = { }
+    object_values = { }
+    times = []
+    numbers = []
+    codes = []
+    n_times = n_numbers = n_codes = 0
+    for obj_index, obj in enumerate(acmi.objects.values()):
+        objects['id'].append(obj.id)
+        objects['removed_at'].append(obj.removed_at)
+        objects['tags'].append(obj.tags)
+        objects['type'].append(obj.type)
+        objects['name'].append(obj.name)
+        objects['country'].append(obj.country)
+        for field, timeline in obj.data.items():
+            column = as_column(timeline)
+            n = len(column)
+            table['object'].append(obj_index)
+            table['name'].append(field_names.setdefault(field, len(field_names)))
+            table['start'].append(n_times)
+            table['length'].append(n)
+            times.append(column.times)
+            n_times += n
+            if column.categories is not None:
+                table['kind'].append(ACMI_CACHE_KIND_TEXT)
+                table['values'].append(n_codes)
+                table['categories'].append(categories.setdefault(tuple(column.categories), len(categories)))
+                codes.append(column.values)
+                n_codes += n
+            elif column.values.dtype == np.float64:
+                table['kind'].append(ACMI_CACHE_KIND_NUMBER)
+                table['values'].append(n_numbers)
+                table['categories'].append(-1)
+                numbers.append(column.values)
+                n_numbers += n
+            else:
+                table['kind'].append(ACMI_CACHE_KIND_OBJECT)
+                table['values'].append(-1)
+                table['categories'].append(-1)
+                object_values[len(table['kind']) - 1] = column.values.tolist()
+
+    arrays = [
+        ('timeframes', np.asarray(acmi.timeframes, dtype=np.float64)),
+        ('times', np.concatenate(times) if times else np.empty(0, dtype=np.float64)),
+        ('numbers', np.concatenate(numbers) if numbers else np.empty(0, dtype=np.float64)),
+        ('codes', np.concatenate(codes).astype(np.int32) if codes else np.empty(0, dtype=np.int32)),
+        ('field_object', np.asarray(table['object'], dtype=np.int32)),
+        ('field_name', np.asarray(table['name'], dtype=np.int32)),
+        ('field_kind', np.asarray(table['kind'], dtype=np.int8)),
+        ('field_start', np.asarray(table['start'], dtype=np.int64)),
+        ('field_length', np.asarray(table['length'], dtype=np.int64)),
+        ('field_values', np.asarray(table['values'], dtype=np.int64)),
+        ('field_categories', np.asarray(table['categories'], dtype=np.int32)),
+    ]
+
+    source_size = -1
+    if acmi.filepath and os.path.exists(acmi.filepath):
+        source_size = os.path.getsize(acmi.filepath)
+
+    header = {
+        'version'      : ACMI_CACHE_VERSION,
+        'globals'      : globals_json,
+        'object_fields': sorted(acmi.object_fields),
+        'events'       : acmi.events.json(),
+        'objects'      : objects,
+        'field_names'  : list(field_names),
+        'categories'   : [list(c) for c in categories],
+        'object_values': object_values,
+        'arrays'       : { name: { 'dtype': arr.dtype.str, 'offset': 0, 'length': len(arr) } for name, arr in arrays },
+    }
+    # 先用占位的偏移计算header长度（为偏移的位数预留空间），再回填实际偏移
+    header_bytes = json.dumps(header, ensure_ascii=False).encode('utf-8')
+    offset = _align(ACMI_CACHE_PREAMBLE.size + len(header_bytes) + len(arrays) * 32)
+    for name, arr in arrays:
+        header['arrays'][name]['offset'] = offset
+        offset = _align(offset + arr.nbytes)
+    header_bytes = json.dumps(header, ensure_ascii=False).encode('utf-8')
+
+    dirname = os.path.dirname(path)
+    if dirname and not os.path.exists(dirname):
+        os.makedirs(dirname)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(ACMI_CACHE_PREAMBLE.pack(ACMI_CACHE_MAGIC, len(header_bytes), source_size))
+        f.write(header_bytes)
+        for name, arr in arrays:
+            f.seek(header['arrays'][name]['offset'])
+            f.write(np.ascontiguousarray(arr).tobytes())
+    os.replace(tmp_path, path)
+
+
+def read_cache_header(path: str):
+    with open(path, 'rb') as f:
+        preamble = f.read(ACMI_CACHE_PREAMBLE.size)
+        if len(preamble) < ACMI_CACHE_PREAMBLE.size or preamble[:len(ACMI_CACHE_MAGIC)] != ACMI_CACHE_MAGIC:
+            raise RuntimeError("Not a pyacmi cache file: " + path)
+        _, header_len, _ = ACMI_CACHE_PREAMBLE.unpack(preamble)
+        header = json.loads(f.read(header_len).decode('utf-8'))
+    if header.get('version') != ACMI_CACHE_VERSION:
+        raise RuntimeError("Unsupported cache version: {v}".format(v=header.get('version')))
+    return header
+
+
+# 从缓存加载到acmi
+# mmap: 只读的内存映射模式，属性直接读取映射的缓冲区（不拷贝），对象和属性在第一次访问时才创建
+def load_cache(acmi: Acmi, path: str, mmap: bool = False):
+    header = read_cache_header(path)
+    if mmap:
+        arrays = map_cache_arrays(path, header)
+        populate_globals(acmi, header, arrays)
+        acmi.columnar = True
+        acmi.objects = AcmiMappedObjects(acmi, header, arrays)
+        return
+
+    arrays = { }
+    with open(path, 'rb') as f:
+        for name, desc in header['arrays'].items():
+            f.seek(desc['offset'])
+            arrays[name] = np.fromfile(f, dtype=np.dtype(desc['dtype']), count=desc['length'])
+    populate_from_cache(acmi, header, arrays)
+
+
+# 将缓存文件的数据区映射成只读的numpy数组，多个进程打开同一个文件时共享同一份页缓存
+def map_cache_arrays(path: str, header: dict) -> dict:
+    with open(path, 'rb') as f:
+        buffer = mmap_module.mmap(f.fileno(), 0, access=mmap_module.ACCESS_READ)
+    arrays = { }
+    for name, desc in header['arrays'].items():
+        dtype = np.dtype(desc['dtype'])
+        if desc['length'] == 0:
+            arrays[name] = np.empty(0, dtype=dtype)
+        else:
+            arrays[name] = np.frombuffer(buffer, dtype=dtype, count=desc['length'], offset=desc['offset'])
+    return arrays
+
+
+def populate_globals(acmi: Acmi, header: dict, arrays: dict):
+    for name, is_datetime in ACMI_CACHE_GLOBALS:
+        val = header['globals'].get(name)
+        if is_datetime and val is not None:
+            val = datetime.datetime.fromisoformat(val)
+        setattr(acmi, name, val)
+    acmi.timeframes = arrays['timeframes'].tolist()
+    acmi.object_fields = set(header['object_fields'])
+    acmi.events = AcmiEventLog()
+    acmi.events.load_json(header['events'])
+
+
+# 创建属性表第row行对应的列，数组是切片视图
+def cache_column(header: dict, arrays: dict, row: int, kind: int, start: int, n: int, values: int,
+                 cat: int) -> AcmiColumn:
+    times = arrays['times'][start:start + n]
+    if kind == ACMI_CACHE_KIND_NUMBER:
+        return AcmiColumn(times, arrays['numbers'][values:values + n])
+    elif kind == ACMI_CACHE_KIND_TEXT:
+        return AcmiColumn(times, arrays['codes'][values:values + n], header['categories'][cat])
+    arr = np.empty(n, dtype=object)
+    arr[:] = header['object_values'][str(row)]
+    return AcmiColumn(times, arr)
+
+
+def _new_cached_object(acmi: Acmi, meta: dict, index: int):
+    obj = acmi.object_class(meta['id'][index], columnar=acmi.columnar, collapse=not acmi.strict)
+    obj.removed_at = meta['removed_at'][index]
+    obj.tags = meta['tags'][index]
+    obj.type = meta['type'][index]
+    obj.type_mask = ACMI_TAG_REGISTRY.mask_of(obj.type)
+    obj.name = meta['name'][index]
+    obj.country = meta['country'][index]
+    return obj
+
+
+# 根据header和数据区数组填充acmi
+def populate_from_cache(acmi: Acmi, header: dict, arrays: dict):
+    # 一次性创建大量小对象时暂停循环垃圾回收，避免反复触发
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        _populate_from_cache(acmi, header, arrays)
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+
+def _populate_from_cache(acmi: Acmi, header: dict, arrays: dict):
+    populate_globals(acmi, header, arrays)
+
+    meta = header['objects']
+    objects = [_new_cached_object(acmi, meta, i) for i in range(len(meta['id']))]
+    acmi.objects = { obj.id: obj for obj in objects }
+
+    field_names = header['field_names']
+    table = zip(arrays['field_object'].tolist(), arrays['field_name'].tolist(), arrays['field_kind'].tolist(),
+                arrays['field_start'].tolist(), arrays['field_length'].tolist(), arrays['field_values'].tolist(),
+                arrays['field_categories'].tolist())
+    for row, (obj_index, name, kind, start, n, values, cat) in enumerate(table):
+        column = cache_column(header, arrays, row, kind, start, n, values, cat)
+        objects[obj_index].data[field_names[name]] = column if acmi.columnar else column.to_sorted_dict()
+
+
+class AcmiMappedFields(Mapping):
+    """Read-only field -> AcmiColumn mapping of one object, backed by the mapped cache buffers."""
+
+    def __init__(self, header: dict, arrays: dict, rows: range):
+        self._header = header
+        self._arrays = arrays
+        self._rows = rows
+        self._columns = None
+
+    def _load(self) -> dict:
+        if self._columns is None:
+            arrays = self._arrays
+            field_names = self._header['field_names']
+            rows = slice(self._rows.start, self._rows.stop)
+            table = zip(arrays['field_name'][rows].tolist(), arrays['field_kind'][rows].tolist(),
+                        arrays['field_start'][rows].tolist(), arrays['field_length'][rows].tolist(),
+                        arrays['field_values'][rows].tolist(), arrays['field_categories'][rows].tolist())
+            self._columns = {
+                field_names[name]: cache_column(self._header, arrays, row, kind, start, n, values, cat)
+                for row, (name, kind, start, n, values, cat) in zip(self._rows, table)
+            }
+        return self._columns
+
+    def __getitem__(self, field: str) -> AcmiColumn:
+        return self._load()[field]
+
+    def __iter__(self):
+        return iter(self._load())
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __setitem__(self, field, value):
+        raise RuntimeError("Memory-mapped ACMI objects are read-only")
+
+
+class AcmiMappedObjects(Mapping):
+    """Read-only obj_id -> AcmiObject mapping; objects are created on first access."""
+
+    def __init__(self, acmi: Acmi, header: dict, arrays: dict):
+        self._acmi = acmi
+        self._header = header
+        self._arrays = arrays
+        self._meta = header['objects']
+        self._index = { obj_id: i for i, obj_id in enumerate(self._meta['id']) }
+        # 属性表按对象顺序保存，第i个对象的属性在[row_bounds[i], row_bounds[i + 1])行
+        self._row_bounds = np.searchsorted(arrays['field_object'], np.arange(len(self._index) + 1)).tolist()
+        self._objects = { }
+
+    def __getitem__(self, obj_id):
+        obj = self._objects.get(obj_id)
+        if obj is None:
+            index = self._index[obj_id]
+            obj = _new_cached_object(self._acmi, self._meta, index)
+            obj.data = AcmiMappedFields(self._header, self._arrays,
+                                        range(self._row_bounds[index], self._row_bounds[index + 1]))
+            self._objects[obj_id] = obj
+        return obj
+
+    def __iter__(self):
+        return iter(self._index)
+
+    def __len__(self):
+        return len(self._index)
+
+    def __contains__(self, obj_id):
+        return obj_id in self._index
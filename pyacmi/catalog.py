@@ -0,0 +1,281 @@
+"""
+批量处理目录中的acmi录像，并把每个录像的摘要写入本地SQLite目录（catalog）
+
+每个文件在进程池中加载（只加载类型和位置），提取全局属性、各类型的对象数、时长和经纬高范围。
+重新运行时跳过大小和修改时间都没有变化的文件；修改时间变了但内容的sha1没有变化时只更新修改时间。
+
+catalog = AcmiCatalog('recordings.sqlite')
+catalog.update('recordings/', workers=8)
+catalog.find(category='Air-to-Air', min_counts={ AcmiType.Missile: 5 })
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Optional, Callable, Iterator
+
+import numpy as np
+from tqdm import tqdm
+
+from .acmi import Acmi, ACMI_TAG_REGISTRY
+from .columnar import as_column
+
+ACMI_CATALOG_SUFFIXES = ('.acmi', '.zip')
+
+ACMI_CATALOG_SCHEMA = """
+CREATE TABLE IF NOT EXISTS recordings (
+    path TEXT PRIMARY KEY,
+    size INTEGER,
+    mtime REAL,
+    sha1 TEXT,
+    indexed_at REAL,
+    error TEXT,
+    title TEXT,
+    category TEXT,
+    author TEXT,
+    data_source TEXT,
+    data_recorder TEXT,
+    reference_time TEXT,
+    recording_time TEXT,
+    reference_longitude REAL,
+    reference_latitude REAL,
+    start_time REAL,
+    end_time REAL,
+    duration REAL,
+    objects INTEGER,
+    timeframes INTEGER,
+    min_longitude REAL,
+    max_longitude REAL,
+    min_latitude REAL,
+    max_latitude REAL,
+    min_altitude REAL,
+    max_altitude REAL,
+    globals TEXT
+);
+CREATE TABLE IF NOT EXISTS object_counts (
+    path TEXT,
+    type TEXT,
+    count INTEGER,
+    PRIMARY KEY (path, type)
+);
+CREATE INDEX IF NOT EXISTS object_counts_type ON object_counts (type, count);
+CREATE INDEX IF NOT EXISTS recordings_category ON recordings (category);
+"""
+
+# 摘要中的经纬高范围 列名前缀 -> 属性
+ACMI_CATALOG_BOUNDS = { 'longitude': 'Longitude', 'latitude': 'Latitude', 'altitude': 'Altitude' }
+
+
+# 目录中所有的acmi文件（.acmi和.zip），按路径排序
+def find_acmi_files(directory: str) -> list:
+    paths = []
+    for root, dirs, files in os.walk(directory):
+        for file in files:
+            if file.endswith(ACMI_CATALOG_SUFFIXES):
+                paths.append(os.path.abspath(os.path.join(root, file)))
+    return sorted(paths)
+
+
+def file_sha1(filepath: str) -> str:
+    sha1 = hashlib.sha1()
+    with open(filepath, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            sha1.update(block)
+    return sha1.hexdigest()
+
+
+# 录像的摘要：全局属性、各类型的对象数、时间范围和经纬高范围
+def summarize_acmi(acmi: Acmi) -> dict:
+    counts = { }
+    bounds = { field: [np.inf, -np.inf] for field in ACMI_CATALOG_BOUNDS.values() }
+    for obj in acmi.objects.values():
+        for _type in ACMI_TAG_REGISTRY.types_of(obj.type_mask):
+            counts[_type] = counts.get(_type, 0) + 1
+        for field, bound in bounds.items():
+            timeline = obj.data.get(field)
+            if timeline is None or not len(timeline):
+                continue
+            values = as_column(timeline).values
+            bound[0] = min(bound[0], np.nanmin(values))
+            bound[1] = max(bound[1], np.nanmax(values))
+
+    summary = {
+        'title'              : acmi.title,
+        'category'           : acmi.category,
+        'author'             : acmi.author,
+        'data_source'        : acmi.data_source,
+        'data_recorder'      : acmi.data_recorder,
+        'reference_time'     : acmi.reference_time.isoformat() if acmi.reference_time else None,
+        'recording_time'     : acmi.recording_time.isoformat() if acmi.recording_time else None,
+        'reference_longitude': acmi.reference_longitude,
+        'reference_latitude' : acmi.reference_latitude,
+        'start_time'         : acmi.timeframes[0] if acmi.timeframes else None,
+        'end_time'           : acmi.timeframes[-1] if acmi.timeframes else None,
+        'duration'           : acmi.timeframes[-1] - acmi.timeframes[0] if acmi.timeframes else 0.0,
+        'objects'            : len(acmi.objects),
+        'timeframes'         : len(acmi.timeframes),
+        'globals'            : json.dumps(acmi.global_json(), ensure_ascii=False),
+        'counts'             : counts,
+    }
+    for prefix, field in ACMI_CATALOG_BOUNDS.items():
+        low, high = bounds[field]
+        summary['min_' + prefix] = float(low) if np.isfinite(low) else None
+        summary['max_' + prefix] = float(high) if np.isfinite(high) else None
+    return summary
+
+
+def _load_summary(filepath: str) -> dict:
+    acmi = Acmi(columnar=True)
+    acmi.load_acmi(filepath, fields=list(ACMI_CATALOG_BOUNDS.values()))
+    return summarize_acmi(acmi)
+
+
+# 在子进程中摘要一个文件；sha1与known_sha1相同时不加载，返回None
+def _catalog_task(filepath: str, known_sha1: Optional[str]) -> tuple:
+    sha1 = file_sha1(filepath)
+    if sha1 == known_sha1:
+        return sha1, None, None
+    try:
+        return sha1, _load_summary(filepath), None
+    except Exception as e:
+        return sha1, None, '{t}: {e}'.format(t=type(e).__name__, e=e)
+
+
+def _map_task(filepath: str, func: Callable, load_kwargs: dict):
+    acmi = Acmi(**load_kwargs.get('acmi', { }))
+    acmi.load_acmi(filepath, **{ key: val for key, val in load_kwargs.items() if key != 'acmi' })
+    return func(acmi)
+
+
+# 在进程池中加载目录中的每个录像并调用func(acmi)，按完成的顺序产出 (文件路径, 返回值)
+# func: 需要能被pickle（模块级的函数），返回值也需要能被pickle
+# load_kwargs: 传给load_acmi的参数，其中'acmi'是传给Acmi构造函数的参数，例如 { 'acmi': { 'columnar': True } }
+# return_exceptions: 为True时加载或处理失败的文件产出 (文件路径, 异常)，否则抛出异常
+def map_acmi_dir(directory: str, func: Callable, workers: Optional[int] = None, load_kwargs: Optional[dict] = None,
+                 return_exceptions: bool = False) -> Iterator[tuple]:
+    paths = find_acmi_files(directory)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = { executor.submit(_map_task, path, func, load_kwargs or { }): path for path in paths }
+        for future in as_completed(futures):
+            error = future.exception()
+            if error is not None and not return_exceptions:
+                raise error
+            yield futures[future], future.result() if error is None else error
+
+
+class AcmiCatalog:
+    """SQLite catalog of recording summaries, refreshed incrementally from directory trees."""
+
+    def __init__(self, path: str = 'acmi_catalog.sqlite'):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(ACMI_CATALOG_SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    # 扫描目录，摘要新增和变化的文件，返回各类文件的数量
+    # workers: 进程数，None表示CPU核数
+    # prune: 是否删除目录中已经不存在的文件的摘要
+    # progress: 是否显示进度条
+    def update(self, directory: str, workers: Optional[int] = None, prune: bool = True,
+               progress: bool = True) -> dict:
+        known = { path: (size, mtime, sha1) for path, size, mtime, sha1 in
+                  self.connection.execute('SELECT path, size, mtime, sha1 FROM recordings') }
+        stats = { 'added': 0, 'updated': 0, 'unchanged': 0, 'failed': 0, 'removed': 0 }
+        paths = find_acmi_files(directory)
+        tasks = []
+        for path in paths:
+            stat = os.stat(path)
+            size, mtime, sha1 = known.get(path, (None, None, None))
+            if size == stat.st_size and mtime == stat.st_mtime:
+                stats['unchanged'] += 1
+                continue
+            # 大小变化时内容一定变化，不需要比较sha1
+            tasks.append((path, stat, sha1 if size == stat.st_size else None))
+
+        bar = tqdm(total=len(tasks), desc=f'Cataloging {directory}', disable=not progress)
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = { executor.submit(_catalog_task, path, known_sha1): (path, stat)
+                        for path, stat, known_sha1 in tasks }
+            for future in as_completed(futures):
+                path, stat = futures[future]
+                sha1, summary, error = future.result()
+                if summary is None and error is None:
+                    self.connection.execute('UPDATE recordings SET mtime = ? WHERE path = ?', (stat.st_mtime, path))
+                    stats['unchanged'] += 1
+                else:
+                    stats['failed' if error else 'updated' if path in known else 'added'] += 1
+                    self._store(path, stat, sha1, summary, error)
+                bar.update(1)
+                self.connection.commit()
+        bar.close()
+
+        if prune:
+            root = os.path.join(os.path.abspath(directory), '')
+            existing = set(paths)
+            for path in known:
+                if path.startswith(root) and path not in existing:
+                    self.remove(path)
+                    stats['removed'] += 1
+        self.connection.commit()
+        return stats
+
+    def _store(self, path: str, stat: os.stat_result, sha1: str, summary: Optional[dict], error: Optional[str]):
+        self.remove(path)
+        row = { 'path': path, 'size': stat.st_size, 'mtime': stat.st_mtime, 'sha1': sha1, 'indexed_at': time.time(),
+                'error': error }
+        counts = { }
+        if summary is not None:
+            summary = dict(summary)
+            counts = summary.pop('counts')
+            row.update(summary)
+        columns = ', '.join(row)
+        self.connection.execute('INSERT INTO recordings ({c}) VALUES ({p})'.format(
+                c=columns, p=', '.join('?' * len(row))), list(row.values()))
+        self.connection.executemany('INSERT INTO object_counts (path, type, count) VALUES (?, ?, ?)',
+                                    [(path, _type, count) for _type, count in counts.items()])
+
+    def remove(self, path: str):
+        self.connection.execute('DELETE FROM recordings WHERE path = ?', (path,))
+        self.connection.execute('DELETE FROM object_counts WHERE path = ?', (path,))
+
+    def query(self, sql: str, params: tuple = ()) -> list:
+        return self.connection.execute(sql, params).fetchall()
+
+    # 某个录像的摘要，不存在时返回None
+    def summary(self, path: str) -> Optional[dict]:
+        cursor = self.connection.execute('SELECT * FROM recordings WHERE path = ?', (os.path.abspath(path),))
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        summary = dict(zip([column[0] for column in cursor.description], row))
+        summary['counts'] = dict(self.query('SELECT type, count FROM object_counts WHERE path = ?', (summary['path'],)))
+        return summary
+
+    # 按条件查找录像，返回路径列表
+    # category: Category中包含的文本，例如'Air-to-Air'
+    # min_counts: { AcmiType: 最少对象数 }
+    # min_duration: 最短时长（秒）
+    def find(self, category: Optional[str] = None, min_counts: Optional[dict] = None,
+             min_duration: Optional[float] = None) -> list:
+        sql = 'SELECT path FROM recordings WHERE error IS NULL'
+        params = []
+        if category is not None:
+            sql += ' AND category LIKE ?'
+            params.append('%' + category + '%')
+        if min_duration is not None:
+            sql += ' AND duration >= ?'
+            params.append(min_duration)
+        for _type, count in (min_counts or { }).items():
+            sql += ' AND path IN (SELECT path FROM object_counts WHERE type = ? AND count >= ?)'
+            params.extend([_type, count])
+        return [path for path, in self.query(sql + ' ORDER BY path', tuple(params))]
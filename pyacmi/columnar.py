@@ -0,0 +1,276 @@
+"""
+列式存储：每个属性的时间序列保存为一条排序的 float64 时间数组和一条类型化的值数组
+- 数值属性: float64 数组
+- 文本属性: int32 编码数组 + 去重后的字符串表（字典编码）
+- 其他混合类型: object 数组
+"""
+import bisect
+from array import array
+from typing import Optional, Union
+
+import numpy as np
+import sortedcontainers
+
+
+class AcmiColumn:
+    """Immutable property timeline: sorted float64 times plus a typed value array."""
+
+    __slots__ = ('times', 'values', 'categories')
+
+    def __init__(self, times: np.ndarray, values: np.ndarray, categories: Optional[list] = None):
+        self.times = times
+        # categories不为None时，values是categories的下标
+        self.values = values
+        self.categories = categories
+
+    # 从采样点构建列，时间乱序时稳定排序，同一时间的多个采样只保留最后写入的那个（和SortedDict覆盖语义一致）
+    # collapse: 每段相同值的采样只保留第一个和最后一个（get_value和linear插值的结果不变）
+    @classmethod
+    def from_samples(cls, times, values, collapse: bool = False) -> 'AcmiColumn':
+        if isinstance(times, array):
+            times = np.frombuffer(times, dtype=np.float64).copy()
+        else:
+            times = np.asarray(times, dtype=np.float64)
+
+        if isinstance(values, array):
+            values = np.frombuffer(values, dtype=np.float64).copy()
+            categories = None
+        elif isinstance(values, np.ndarray) and values.dtype != object:
+            categories = None
+        else:
+            values, categories = _encode_values(values)
+
+        if len(times) > 1:
+            diff = np.diff(times)
+            if not np.all(diff > 0):
+                order = np.argsort(times, kind='stable')
+                times = times[order]
+                values = values[order]
+                keep = np.append(times[1:] != times[:-1], True)
+                times = times[keep]
+                values = values[keep]
+        column = cls(times, values, categories)
+        if collapse and len(times) > 1:
+            keep = column.change_mask(run_ends=True)
+            if not keep.all():
+                column = cls(times[keep], values[keep], categories)
+        return column
+
+    # 按顺序拼接多段列（例如并行解析的各个分段），时间重复时保留后面的值
+    # collapse: 见from_samples，各段内已经去重时只需要处理分段的边界
+    @classmethod
+    def concat(cls, columns: list, collapse: bool = False) -> 'AcmiColumn':
+        columns = [column for column in columns if len(column)]
+        if len(columns) == 1:
+            return columns[0]
+        if not columns:
+            return cls(np.empty(0, dtype=np.float64), np.empty(0, dtype=np.float64))
+        times = np.concatenate([column.times for column in columns])
+        if all(column.categories is None and column.values.dtype == np.float64 for column in columns):
+            values = np.concatenate([column.values for column in columns])
+        else:
+            values = np.concatenate([column.decoded_values().astype(object) for column in columns])
+        return cls.from_samples(times, values, collapse=collapse)
+
+    def __len__(self):
+        return len(self.times)
+
+    # 第一条数据的时间
+    def first_time(self) -> Optional[float]:
+        return float(self.times[0]) if len(self.times) else None
+
+    def value_at(self, index: int):
+        if self.categories is not None:
+            return self.categories[self.values[index]]
+        val = self.values[index]
+        if self.values.dtype == np.float64:
+            return float(val)
+        return val
+
+    # 和AcmiObject.get_value语义一致：返回time时刻（含）之前的最后一个值，time早于第一条数据时返回第一条
+    def get_value(self, time: Optional[float] = None):
+        n = len(self.times)
+        if n == 0:
+            return None
+        if time is None:
+            return self.value_at(n - 1)
+        pos = int(np.searchsorted(self.times, time, side='right')) - 1
+        return self.value_at(pos if pos > 0 else 0)
+
+    # 每个采样的值是否与前一个采样不同（第一个采样为True），文本列的编码互不相同，可以直接比较编码
+    # run_ends: 同时保留每段相同值的最后一个采样（最后一个采样总是为True）
+    def change_mask(self, run_ends: bool = False) -> np.ndarray:
+        keep = np.ones(len(self.times), dtype=bool)
+        if len(self.times) > 1:
+            changed = self.values[1:] != self.values[:-1]
+            if run_ends:
+                keep[1:-1] = changed[:-1] | changed[1:]
+            else:
+                keep[1:] = changed
+        return keep
+
+    # 取值区间 [(值, 开始时间, 结束时间)]，相邻的相同值合并成一个区间，最后一个区间结束于end（None表示没有结束）
+    def intervals(self, end: Optional[float] = None) -> list:
+        if not len(self.times):
+            return []
+        keep = self.change_mask()
+        starts = self.times[keep].tolist()
+        values = self.values[keep]
+        if self.categories is not None:
+            values = [self.categories[code] for code in values.tolist()]
+        else:
+            values = values.tolist()
+        return list(zip(values, starts, starts[1:] + [end]))
+
+    # 解码后的值数组（文本列解码成object数组）
+    def decoded_values(self) -> np.ndarray:
+        if self.categories is not None:
+            return np.asarray(self.categories, dtype=object)[self.values]
+        return self.values
+
+    # 批量采样，times是查询时间数组
+    # method: 'previous' 取查询时刻之前的最后一个值（和get_value一致），'linear' 数值属性线性插值
+    # angle_low: 角度属性取值区间的下界（例如航向为0，横滚为-180），插值时按360度周期处理
+    def sample(self, times, method: str = 'previous', angle_low: Optional[float] = None) -> np.ndarray:
+        times = np.asarray(times, dtype=np.float64)
+        n = len(self.times)
+        if n == 0:
+            return np.full(times.shape, np.nan)
+
+        is_numeric = self.categories is None and self.values.dtype == np.float64
+        if method == 'linear' and is_numeric:
+            values = self.values
+            if angle_low is not None:
+                values = np.unwrap(values, period=360.0)
+            result = np.interp(times, self.times, values)
+            if angle_low is not None:
+                result = np.mod(result - angle_low, 360.0) + angle_low
+            return result
+        elif method not in ('previous', 'linear'):
+            raise ValueError("Unknown sample method: " + method)
+
+        pos = np.searchsorted(self.times, times, side='right') - 1
+        np.maximum(pos, 0, out=pos)
+        if is_numeric:
+            return self.values[pos]
+        return self.decoded_values()[pos]
+
+    def keys(self):
+        return self.times.tolist()
+
+    def items(self):
+        return zip(self.times.tolist(), self.decoded_values().tolist())
+
+    def to_sorted_dict(self) -> sortedcontainers.SortedDict:
+        return sortedcontainers.SortedDict(zip(self.times.tolist(), self.decoded_values().tolist()))
+
+    def builder(self, collapse: bool = False) -> 'AcmiTimelineBuilder':
+        b = AcmiTimelineBuilder(collapse)
+        b.times = array('d', self.times.tobytes())
+        if self.categories is None and self.values.dtype == np.float64:
+            b.values = array('d', self.values.tobytes())
+        else:
+            b.values = self.decoded_values().tolist()
+        if len(b.times):
+            b._last = b.times[-1]
+        b._column = self
+        return b
+
+
+class AcmiTimelineBuilder:
+    """Append-only property timeline used while loading; `build()` turns it into an AcmiColumn."""
+
+    __slots__ = ('times', 'values', 'collapse', '_last', '_sorted', '_column')
+
+    # collapse: 按时间顺序追加时，每段相同值只保留第一条和最后一条数据（get_value和linear插值的结果不变）
+    def __init__(self, collapse: bool = False):
+        self.times = array('d')
+        self.values = None
+        self.collapse = collapse
+        self._last = None
+        self._sorted = True
+        # build()的结果，写入新数据前一直有效
+        self._column = None
+
+    # 和SortedDict一样使用 timeline[time] = val 写入
+    def __setitem__(self, time: float, val: Union[int, float, str]):
+        self._column = None
+        if self.values is None:
+            self.values = array('d') if type(val) is float else []
+        elif type(self.values) is array and type(val) is not float:
+            self.values = self.values.tolist()
+
+        if self._last is not None:
+            if time == self._last and self._sorted:
+                self.values[-1] = val
+                return
+            if time < self._last:
+                self._sorted = False
+            elif self.collapse and self._sorted and self.values[-1] == val and len(self.values) > 1 and \
+                    self.values[-2] == val:
+                # 最后一条数据是这段相同值的结尾，把它移到time
+                self.times[-1] = time
+                self._last = time
+                return
+        self.times.append(time)
+        self.values.append(val)
+        self._last = time
+
+    def __len__(self):
+        return len(self.times)
+
+    def first_time(self) -> Optional[float]:
+        if not len(self.times):
+            return None
+        return self.times[0] if self._sorted else min(self.times)
+
+    # 转换成AcmiColumn，结果缓存到下一次写入（例如跟随文件时，刷新之间的多次查询只转换一次）
+    def build(self) -> AcmiColumn:
+        if self._column is None:
+            self._column = AcmiColumn.from_samples(self.times, self.values if self.values is not None else [])
+        return self._column
+
+    def get_value(self, time: Optional[float] = None):
+        n = len(self.times)
+        if n == 0:
+            return None
+        if not self._sorted:
+            return self.build().get_value(time)
+        if time is None:
+            return self.values[-1]
+        pos = bisect.bisect_right(self.times, time) - 1
+        return self.values[pos if pos > 0 else 0]
+
+    def sample(self, times, method: str = 'previous', angle_low: Optional[float] = None) -> np.ndarray:
+        return self.build().sample(times, method=method, angle_low=angle_low)
+
+    def keys(self):
+        return self.build().keys()
+
+    def items(self):
+        return self.build().items()
+
+
+ACMI_COLUMNAR_TIMELINES = (AcmiColumn, AcmiTimelineBuilder)
+
+
+# 将任意一种时间序列（SortedDict / AcmiTimelineBuilder / AcmiColumn）转换成AcmiColumn
+def as_column(timeline) -> AcmiColumn:
+    if type(timeline) is AcmiColumn:
+        return timeline
+    if type(timeline) is AcmiTimelineBuilder:
+        return timeline.build()
+    return AcmiColumn.from_samples(list(timeline.keys()), list(timeline.values()))
+
+
+# 将值列表编码成类型化数组
+def _encode_values(values: list):
+    if all(type(v) is float for v in values):
+        return np.array(values, dtype=np.float64), None
+    if all(type(v) is str for v in values):
+        index = { }
+        codes = np.fromiter((index.setdefault(v, len(index)) for v in values), dtype=np.int32, count=len(values))
+        return codes, list(index)
+    arr = np.empty(len(values), dtype=object)
+    arr[:] = values
+    return arr, None
@@ -0,0 +1,139 @@
+"""
+事件表：全局的 0,Event=... 行（Message、Bookmark、Destroyed、TakenOff、Landed、Timeout、LeftArea等）
+
+事件按时间排序保存为几列（时间、事件类型、相关对象ID、文本、参数），事件类型字符串驻留。
+按事件类型和按对象的索引在第一次查询时构建，追加事件后重新构建，查询不需要遍历所有事件。
+
+acmi.events.select('Destroyed')
+acmi.events.select('Timeout', obj_id=shooter_id, position=0)
+"""
+import sys
+from typing import NamedTuple, Optional, Callable
+
+import numpy as np
+
+
+# 事件 0,Event=EventType|ObjectId|...|EventText
+# obj_ids: 相关的对象ID，Timeout事件为 [SourceId, TargetId]
+# params: Timeout事件的 key:value 参数，其他事件为空字典
+class AcmiEvent(NamedTuple):
+    time: float
+    name: str
+    obj_ids: list
+    text: str
+    params: dict
+
+
+class AcmiEventLog:
+    """Time-sorted event table with lazily built indexes by event type and by object."""
+
+    def __init__(self):
+        self.times = []
+        self.names = []
+        self.obj_ids = []
+        self.texts = []
+        self.params = []
+        self._sorted = True
+        # 事件类型 -> 事件序号数组 / 对象ID -> 事件序号数组（第一次查询时构建）
+        self._by_name = None
+        self._by_object = None
+
+    def __len__(self):
+        return len(self.times)
+
+    def __iter__(self):
+        for i in range(len(self.times)):
+            yield self[i]
+
+    def __getitem__(self, i: int) -> AcmiEvent:
+        self._build()
+        return AcmiEvent(self.times[i], self.names[i], list(self.obj_ids[i]), self.texts[i], dict(self.params[i] or { }))
+
+    def append(self, time: float, name: str, obj_ids: Optional[list] = None, text: str = '',
+               params: Optional[dict] = None):
+        if self.times and time < self.times[-1]:
+            self._sorted = False
+        self.times.append(time)
+        self.names.append(sys.intern(name))
+        self.obj_ids.append(tuple(obj_ids or ()))
+        self.texts.append(text)
+        self.params.append(params or None)
+        self._by_name = None
+        self._by_object = None
+
+    def _build(self):
+        if not self._sorted:
+            order = sorted(range(len(self.times)), key=self.times.__getitem__)
+            for column in (self.times, self.names, self.obj_ids, self.texts, self.params):
+                column[:] = [column[i] for i in order]
+            self._sorted = True
+        if self._by_name is not None:
+            return
+        by_name = { }
+        by_object = { }
+        for i, (name, obj_ids) in enumerate(zip(self.names, self.obj_ids)):
+            by_name.setdefault(name, []).append(i)
+            for obj_id in set(obj_ids):
+                by_object.setdefault(obj_id, []).append(i)
+        self._by_name = { name: np.asarray(indices, dtype=np.int64) for name, indices in by_name.items() }
+        self._by_object = { obj_id: np.asarray(indices, dtype=np.int64) for obj_id, indices in by_object.items() }
+
+    # 出现过的事件类型
+    def event_names(self) -> list:
+        self._build()
+        return list(self._by_name)
+
+    # 满足条件的事件序号（按时间排序）
+    # name: 事件类型
+    # obj_id: 相关的对象ID
+    # position: 与obj_id一起使用，obj_id必须是obj_ids中的第几个（例如Timeout事件的发射者为0，目标为1）
+    # start/end: 时间范围（含两端）
+    def indices(self, name: Optional[str] = None, obj_id=None, position: Optional[int] = None,
+                start: Optional[float] = None, end: Optional[float] = None) -> np.ndarray:
+        self._build()
+        empty = np.empty(0, dtype=np.int64)
+        indices = None
+        if name is not None:
+            indices = self._by_name.get(name, empty)
+        if obj_id is not None:
+            of_object = self._by_object.get(obj_id, empty)
+            indices = of_object if indices is None else np.intersect1d(indices, of_object, assume_unique=True)
+            if position is not None:
+                indices = np.asarray([i for i in indices.tolist()
+                                      if len(self.obj_ids[i]) > position and self.obj_ids[i][position] == obj_id],
+                                     dtype=np.int64)
+        if start is not None or end is not None:
+            times = np.asarray(self.times, dtype=np.float64)
+            lo = 0 if start is None else int(np.searchsorted(times, start, side='left'))
+            hi = len(times) if end is None else int(np.searchsorted(times, end, side='right'))
+            if indices is None:
+                return np.arange(lo, hi, dtype=np.int64)
+            indices = indices[(indices >= lo) & (indices < hi)]
+        if indices is None:
+            return np.arange(len(self.times), dtype=np.int64)
+        return indices
+
+    # 满足条件的事件列表（按时间排序），参数同indices
+    # filter: filter(AcmiEvent) -> bool，只保留返回True的事件
+    def select(self, name: Optional[str] = None, obj_id=None, position: Optional[int] = None,
+               start: Optional[float] = None, end: Optional[float] = None,
+               filter: Optional[Callable] = None) -> list:
+        events = [self[i] for i in self.indices(name, obj_id, position, start, end).tolist()]
+        if filter is not None:
+            events = [event for event in events if filter(event)]
+        return events
+
+    def json(self) -> dict:
+        self._build()
+        return {
+            'times'  : self.times,
+            'names'  : self.names,
+            'obj_ids': [list(obj_ids) for obj_ids in self.obj_ids],
+            'texts'  : self.texts,
+            'params' : self.params,
+        }
+
+    def load_json(self, data: dict):
+        for time, name, obj_ids, text, params in zip(data['times'], data['names'], data['obj_ids'], data['texts'],
+                                                     data['params']):
+            self.append(time, name, obj_ids, text, params)
@@ -0,0 +1,400 @@
+"""
+导出Acmi到其他格式
+
+CSV按对象逐个导出：每个对象只取其存活期间（出现之后、移除之前）的时间帧，
+每个属性用一次searchsorted在时间序列上查出这些时间帧的取值（语义与AcmiObject.get_value一致），
+整块写入文件，不再对每个时间帧、每个对象、每个属性做二分查找。
+
+Arrow/Parquet导出为长格式（每个对象每个数据时间点一行），对象ID和元数据使用字典编码，pyarrow为可选依赖。
+pandas.DataFrame同样按对象整块构建：每个属性用一次searchsorted得到各时间点在列中的下标，文本属性直接合并编码，
+转换成categorical，不对每个单元格调用get_value。pandas为可选依赖。
+"""
+import csv
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from typing import Optional
+
+import numpy as np
+from tqdm import tqdm
+
+from .acmi import Acmi, ACMI_EXPORT_CSV_HEADERS, ACMI_OBJECT_ID_PROPERTIES, format_obj_id
+from .columnar import as_column
+from .parallel import pack_columns, unpack_columns
+
+# 每次写入文件的对象数
+ACMI_EXPORT_CSV_CHUNK_OBJECTS = 64
+
+
+# CSV的表头，remove_empty为True时移除没有数据的列
+def csv_headers(acmi: Acmi, remove_empty: bool = True) -> list:
+    if not remove_empty:
+        return list(ACMI_EXPORT_CSV_HEADERS)
+    headers = []
+    for field in ACMI_EXPORT_CSV_HEADERS:
+        if field == 'ReferenceTime':
+            if not acmi.reference_time:
+                continue
+        elif field == 'Category':
+            if not acmi.category:
+                continue
+        elif field == 'Time' or field == 'ID' or field == 'Name':
+            headers.append(field)
+            continue
+        else:
+            if field not in acmi.object_fields:
+                continue
+        headers.append(field)
+    return headers
+
+
+# 导出CSV，行按对象、时间排序
+# remove_empty: 是否移除空列，默认移除
+# export_obj_ids: 选择导出的object ID None表示导出全部ID
+# workers: 大于1时按对象分组，使用多进程生成CSV文本，按对象顺序写入
+def export_csv(acmi: Acmi, filepath: str, remove_empty: bool = True, export_obj_ids: Optional[list] = None,
+               workers: Optional[int] = None):
+    # 如果目录不存在，则创建目录
+    dirname = os.path.dirname(filepath)
+    if dirname and not os.path.exists(dirname):
+        os.makedirs(dirname)
+
+    headers = csv_headers(acmi, remove_empty)
+    constants = { 'ReferenceTime': acmi.reference_time, 'Category': acmi.category }
+    timeframes = np.asarray(acmi.timeframes, dtype=np.float64)
+    if export_obj_ids is not None:
+        export_obj_ids = set(export_obj_ids)
+    objects = [obj for obj_id, obj in acmi.objects.items() if export_obj_ids is None or obj_id in export_obj_ids]
+    chunks = [objects[i:i + ACMI_EXPORT_CSV_CHUNK_OBJECTS]
+              for i in range(0, len(objects), ACMI_EXPORT_CSV_CHUNK_OBJECTS)]
+
+    with open(filepath, 'w', newline='') as f:
+        csv.writer(f).writerow(headers)
+        progress = tqdm(total=len(objects), desc=f'Exporting {acmi.title} to {filepath}')
+        if workers is not None and workers > 1 and len(chunks) > 1:
+            with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as executor:
+                tasks = (_pack_chunk(chunk, headers) for chunk in chunks)
+                for chunk, text in zip(chunks, executor.map(_csv_chunk_task, tasks,
+                                                            repeat((headers, timeframes, constants)))):
+                    f.write(text)
+                    progress.update(len(chunk))
+        else:
+            for chunk in chunks:
+                f.write(_csv_chunk(_chunk_objects(chunk, headers), headers, timeframes, constants))
+                progress.update(len(chunk))
+        progress.close()
+
+
+# (obj_id, created_at, removed_at, {属性: AcmiColumn})
+def _chunk_objects(chunk: list, headers: list) -> list:
+    result = []
+    for obj in chunk:
+        columns = { }
+        for field in headers:
+            timeline = obj.data.get(field)
+            if timeline is not None and len(timeline):
+                columns[field] = as_column(timeline)
+        result.append((obj.id, obj.created_at, obj.removed_at, columns))
+    return result
+
+
+# 把一组对象打包成适合进程间传输的格式
+def _pack_chunk(chunk: list, headers: list) -> tuple:
+    objects = _chunk_objects(chunk, headers)
+    meta = [(obj_id, created_at, removed_at, list(columns.keys())) for obj_id, created_at, removed_at, columns in objects]
+    return meta, pack_columns([column for _, _, _, columns in objects for column in columns.values()])
+
+
+def _csv_chunk_task(packed: tuple, args: tuple) -> str:
+    meta, packed_columns = packed
+    columns = iter(unpack_columns(packed_columns))
+    objects = [(obj_id, created_at, removed_at, { field: next(columns) for field in fields })
+               for obj_id, created_at, removed_at, fields in meta]
+    return _csv_chunk(objects, *args)
+
+
+def _csv_chunk(objects: list, headers: list, timeframes: np.ndarray, constants: dict) -> str:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for obj_id, created_at, removed_at, columns in objects:
+        if created_at is None:
+            continue
+        start = np.searchsorted(timeframes, created_at, side='left')
+        end = len(timeframes) if removed_at is None else np.searchsorted(timeframes, removed_at, side='left')
+        times = timeframes[start:end]
+        if not len(times):
+            continue
+
+        rows = []
+        for field in headers:
+            if field == 'Time':
+                rows.append(times.tolist())
+            elif field == 'ID':
+                rows.append([format_obj_id(obj_id)] * len(times))
+            elif field in constants:
+                rows.append([constants[field]] * len(times))
+            elif field in ACMI_OBJECT_ID_PROPERTIES and field in columns:
+                rows.append([format_obj_id(val) for val in columns[field].sample(times).tolist()])
+            elif field in columns:
+                rows.append(columns[field].sample(times).tolist())
+            else:
+                rows.append([None] * len(times))
+        writer.writerows(zip(*rows))
+    return buffer.getvalue()
+
+
+# 作为字典编码列导出的对象元数据 列名 -> AcmiObject的属性
+ACMI_ARROW_METADATA_COLUMNS = { 'Type': 'type', 'Tags': 'tags', 'Country': 'country', 'Name': 'name' }
+
+
+# 按对象和类型筛选对象
+# obj_ids: 对象ID列表，None表示全部
+# types: AcmiType列表，对象匹配其中任意一个类型即保留，None表示全部
+def select_objects(acmi: Acmi, obj_ids: Optional[list] = None, types: Optional[list] = None) -> list:
+    if obj_ids is not None:
+        obj_ids = set(obj_ids)
+    objects = []
+    for obj_id, obj in acmi.objects.items():
+        if obj_ids is not None and obj_id not in obj_ids:
+            continue
+        if types is not None and not any(obj.is_type(_type) for _type in types):
+            continue
+        objects.append(obj)
+    return objects
+
+
+# 转换成长格式的pyarrow.Table，需要安装pyarrow
+# 每个对象在其存活期间、任意一个所选属性有数据的时间点为一行，属性取该时间点（含）之前的最后一个值，第一条数据之前为空
+# 列: ID, Time, Type, Tags, Country, Name（字典编码），以及fields中的每个属性（数值属性为float64，文本属性为字典编码）
+# fields: 导出的属性，None表示全部属性
+def to_arrow(acmi: Acmi, fields: Optional[list] = None, obj_ids: Optional[list] = None,
+             types: Optional[list] = None):
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    objects = select_objects(acmi, obj_ids=obj_ids, types=types)
+    if fields is None:
+        fields = sorted(acmi.object_fields)
+    fields = [field for field in fields
+              if field != 'ID' and field != 'Time' and field not in ACMI_ARROW_METADATA_COLUMNS]
+
+    counts = np.zeros(len(objects), dtype=np.int64)
+    times = []
+    # 每个属性在各对象上的 (取值, 是否在第一条数据之前)，对象没有该属性时为None
+    samples = { field: [] for field in fields }
+    for i, obj in enumerate(objects):
+        columns = { }
+        for field in fields:
+            timeline = obj.data.get(field)
+            if timeline is not None and len(timeline):
+                columns[field] = as_column(timeline)
+        if not columns:
+            continue
+        obj_times = np.unique(np.concatenate([column.times for column in columns.values()]))
+        if obj.removed_at is not None:
+            obj_times = obj_times[obj_times < obj.removed_at]
+        counts[i] = len(obj_times)
+        times.append(obj_times)
+        for field in fields:
+            column = columns.get(field)
+            if column is None:
+                samples[field].append((None, np.ones(len(obj_times), dtype=bool)))
+            else:
+                samples[field].append((column.sample(obj_times), obj_times < column.times[0]))
+
+    rows = np.repeat(np.arange(len(objects)), counts)
+    arrays = { }
+    ids = pa.array([format_obj_id(obj.id) for obj in objects], type=pa.string()).dictionary_encode()
+    arrays['ID'] = pa.DictionaryArray.from_arrays(pc.take(ids.indices, rows), ids.dictionary)
+    arrays['Time'] = pa.array(np.concatenate(times) if times else np.empty(0), type=pa.float64())
+    for column_name, attr in ACMI_ARROW_METADATA_COLUMNS.items():
+        encoded = pa.array([getattr(obj, attr) or None for obj in objects], type=pa.string()).dictionary_encode()
+        arrays[column_name] = pa.DictionaryArray.from_arrays(pc.take(encoded.indices, rows), encoded.dictionary)
+    for field in fields:
+        arrays[field] = _arrow_field(samples[field], field in ACMI_OBJECT_ID_PROPERTIES)
+    return pa.table(arrays)
+
+
+# 把一个属性在各对象上的取值拼接成一列，全部为数值时为float64，否则为字典编码的字符串
+# is_obj_id: 属性值为对象ID（compact模式下的整数ID输出为十六进制）
+def _arrow_field(samples: list, is_obj_id: bool = False):
+    import pyarrow as pa
+
+    masks = [mask for _, mask in samples]
+    mask = np.concatenate(masks) if masks else np.empty(0, dtype=bool)
+    if not is_obj_id and all(values is None or values.dtype == np.float64 for values, _ in samples):
+        data = np.concatenate([np.full(len(m), np.nan) if values is None else values for values, m in samples]) \
+            if samples else np.empty(0)
+        return pa.array(data, mask=mask, type=pa.float64())
+
+    data = np.empty(len(mask), dtype=object)
+    start = 0
+    for values, m in samples:
+        if values is not None:
+            data[start:start + len(m)] = values
+        start += len(m)
+    data[mask] = None
+    format_text = format_obj_id if is_obj_id else str
+    strings = [None if val is None else format_text(val) for val in data.tolist()]
+    return pa.array(strings, type=pa.string()).dictionary_encode()
+
+
+# 导出parquet，需要安装pyarrow，表结构见to_arrow
+# partition_by: 分区列，例如['Type']或['Coalition']，指定时path为目录，按hive风格（Type=.../part-0.parquet）写入
+# compression: parquet压缩算法
+def export_parquet(acmi: Acmi, path: str, fields: Optional[list] = None, obj_ids: Optional[list] = None,
+                   types: Optional[list] = None, partition_by: Optional[list] = None, compression: str = 'zstd'):
+    import pyarrow.parquet as pq
+
+    if partition_by and fields is not None:
+        fields = list(fields) + [field for field in partition_by if field not in fields]
+    table = to_arrow(acmi, fields=fields, obj_ids=obj_ids, types=types)
+
+    if not partition_by:
+        dirname = os.path.dirname(path)
+        if dirname and not os.path.exists(dirname):
+            os.makedirs(dirname)
+        pq.write_table(table, path, compression=compression)
+        return
+    pq.write_to_dataset(table, path, partition_cols=list(partition_by), compression=compression,
+                        existing_data_behavior='overwrite_or_ignore')
+
+
+# 转换成pandas.DataFrame，需要安装pandas
+# layout: 'long' 每个对象的每个时间点为一行，列: ID, Time, Name, Type，以及fields中的每个属性
+#         'wide' 以时间为索引，列为 (属性, 对象ID) 两级索引
+# freq: 时间点。None表示对象任意一个所选属性有数据的时间点（wide时同'timeframes'），
+#       'timeframes'表示acmi.timeframes，数值表示从第一个时间帧开始、间隔为freq秒的规则时间网格
+# 属性取时间点（含）之前的最后一个值（前向填充），第一条数据之前为空，每个对象只保留其存活期间（出现之后、移除之前）的时间点
+# ID、Name、Type以及文本属性（例如Coalition）为categorical，数值属性为float64
+def to_dataframe(acmi: Acmi, layout: str = 'long', fields: Optional[list] = None, obj_ids: Optional[list] = None,
+                 types: Optional[list] = None, freq=None):
+    import pandas as pd
+
+    if layout not in ('long', 'wide'):
+        raise ValueError("Unknown layout: " + layout)
+    objects = select_objects(acmi, obj_ids=obj_ids, types=types)
+    if fields is None:
+        fields = sorted(acmi.object_fields)
+    fields = [field for field in fields
+              if field != 'ID' and field != 'Time' and field not in ACMI_ARROW_METADATA_COLUMNS]
+    grid = dataframe_grid(acmi, freq) if freq is not None or layout == 'wide' else None
+
+    kept = []
+    times = []
+    # 每个属性在各对象上的 (AcmiColumn, 各时间点在列中的下标)，下标为-1表示没有值，对象没有该属性时列为None
+    positions = { field: [] for field in fields }
+    for obj in objects:
+        columns = { }
+        for field in fields:
+            timeline = obj.data.get(field)
+            if timeline is not None and len(timeline):
+                columns[field] = as_column(timeline)
+        if not columns:
+            continue
+        if grid is None:
+            obj_times = np.unique(np.concatenate([column.times for column in columns.values()]))
+            if obj.removed_at is not None:
+                obj_times = obj_times[obj_times < obj.removed_at]
+            alive = slice(None)
+        else:
+            obj_times = grid
+            start = np.searchsorted(grid, obj.created_at, side='left')
+            end = len(grid) if obj.removed_at is None else np.searchsorted(grid, obj.removed_at, side='left')
+            if layout == 'long':
+                obj_times = grid[start:end]
+            alive = slice(start, end)
+        kept.append(obj)
+        times.append(obj_times)
+        for field in fields:
+            column = columns.get(field)
+            if column is None:
+                positions[field].append((None, np.full(len(obj_times), -1, dtype=np.int64)))
+                continue
+            pos = np.searchsorted(column.times, obj_times, side='right') - 1
+            if layout == 'wide':
+                # wide的每一列覆盖整个时间网格，存活期间之外为空
+                pos[:alive.start] = -1
+                pos[alive.stop:] = -1
+            positions[field].append((column, pos))
+
+    if layout == 'wide':
+        ids = [format_obj_id(obj.id) for obj in kept]
+        frames = []
+        for field in fields:
+            data = _dataframe_field(positions[field], field in ACMI_OBJECT_ID_PROPERTIES)
+            if isinstance(data, np.ndarray):
+                frames.append(pd.DataFrame(data.reshape(len(kept), len(grid)).T, index=grid, columns=ids))
+            else:
+                frames.append(pd.DataFrame({ obj_id: data[i * len(grid):(i + 1) * len(grid)]
+                                             for i, obj_id in enumerate(ids) }, index=grid))
+        if not frames:
+            return pd.DataFrame(index=pd.Index(grid, name='Time'))
+        df = pd.concat(frames, axis=1, keys=fields, names=[None, 'ID'])
+        df.index.name = 'Time'
+        return df
+
+    counts = np.asarray([len(obj_times) for obj_times in times], dtype=np.int64)
+    rows = np.repeat(np.arange(len(kept)), counts)
+    data = { 'ID': pd.Categorical.from_codes(rows, [format_obj_id(obj.id) for obj in kept]),
+             'Time': np.concatenate(times) if times else np.empty(0) }
+    for column_name in ('Name', 'Type'):
+        attr = ACMI_ARROW_METADATA_COLUMNS[column_name]
+        codes, labels = pd.factorize(np.asarray([getattr(obj, attr) or None for obj in kept], dtype=object))
+        data[column_name] = pd.Categorical.from_codes(codes[rows], labels)
+    for field in fields:
+        data[field] = _dataframe_field(positions[field], field in ACMI_OBJECT_ID_PROPERTIES)
+    return pd.DataFrame(data)
+
+
+# to_dataframe的时间网格
+def dataframe_grid(acmi: Acmi, freq=None) -> np.ndarray:
+    timeframes = np.asarray(acmi.timeframes, dtype=np.float64)
+    if freq is None or freq == 'timeframes':
+        return np.unique(timeframes)
+    if freq <= 0:
+        raise ValueError("freq must be positive: {f}".format(f=freq))
+    if not len(timeframes):
+        return np.empty(0)
+    start, end = timeframes.min(), timeframes.max()
+    return start + np.arange(int(np.floor((end - start) / freq + 1e-9)) + 1) * freq
+
+
+# 把一个属性在各对象上的取值拼接成一列，全部为数值时为float64数组，否则为pandas.Categorical
+# parts: [(AcmiColumn或None, 下标数组)]，下标为-1的位置为空
+# is_obj_id: 属性值为对象ID（compact模式下的整数ID输出为十六进制）
+def _dataframe_field(parts: list, is_obj_id: bool = False):
+    import pandas as pd
+
+    total = sum(len(pos) for _, pos in parts)
+    if not is_obj_id and all(column is None or (column.categories is None and column.values.dtype == np.float64)
+                             for column, _ in parts):
+        data = np.full(total, np.nan)
+        start = 0
+        for column, pos in parts:
+            if column is not None:
+                values = column.values[np.maximum(pos, 0)]
+                values[pos < 0] = np.nan
+                data[start:start + len(pos)] = values
+            start += len(pos)
+        return data
+
+    # 各对象的字符串表合并成一个，局部编码通过remap转换成全局编码
+    categories = { }
+    codes = np.full(total, -1, dtype=np.int32)
+    format_text = format_obj_id if is_obj_id else str
+    start = 0
+    for column, pos in parts:
+        if column is not None:
+            if column.categories is not None:
+                local, labels = column.values, column.categories
+            else:
+                local, labels = pd.factorize(column.values)
+            remap = np.asarray([categories.setdefault(format_text(label), len(categories)) for label in labels],
+                               dtype=np.int32)
+            part = remap[local[np.maximum(pos, 0)]] if len(remap) else np.full(len(pos), -1, dtype=np.int32)
+            part[pos < 0] = -1
+            codes[start:start + len(pos)] = part
+        start += len(pos)
+    return pd.Categorical.from_codes(codes, list(categories))
@@ -0,0 +1,113 @@
+"""
+跟随正在写入的acmi文件，每次刷新只解析新追加的数据
+
+记录已经完整解析的字节偏移和当前时间帧。文件末尾没有换行的半行、以及以反斜杠结尾还在等待下一行的续行
+都留到下一次刷新，不会被错误地拼接。
+
+acmi = Acmi()
+acmi.follow('recording.txt.acmi')
+while True:
+    changes = acmi.refresh()
+    print(changes.time, changes.updated, changes.removed)
+    time.sleep(60)
+"""
+import io
+import os
+import zipfile
+from typing import NamedTuple, Optional, Callable
+
+from .acmi import Acmi, AcmiFileReader, ACMI_FILE_ENCODING
+
+
+# 一次刷新的结果
+# time: 刷新后的当前时间帧
+# frames: 新读到的时间帧
+# updated: 有新数据的对象ID
+# removed: 被移除的对象ID
+class AcmiRefresh(NamedTuple):
+    time: float
+    frames: list
+    updated: set
+    removed: set
+
+
+# data中最后一个完整的逻辑行的结束位置：以换行结尾，并且不是等待下一行的续行（以未转义的反斜杠结尾）
+def complete_length(data: bytes) -> int:
+    end = data.rfind(b'\n') + 1
+    while end > 0:
+        start = data.rfind(b'\n', 0, end - 1) + 1
+        line = data[start:end].rstrip()
+        if (len(line) - len(line.rstrip(b'\\'))) % 2 == 0:
+            break
+        end = start
+    return end
+
+
+class AcmiFollower:
+    """Incrementally parses the data appended to a growing plain-text recording."""
+
+    # callback: 有变化时调用callback(acmi, AcmiRefresh)
+    def __init__(self, acmi: Acmi, filepath: str, callback: Optional[Callable] = None):
+        if zipfile.is_zipfile(filepath):
+            raise RuntimeError("Can't follow a zip compressed recording: " + filepath)
+        self.acmi = acmi
+        self.filepath = filepath
+        self.callback = callback
+        self.offset = 0
+        self.cur_reftime = 0.0
+        self.has_header = False
+
+    def refresh(self) -> AcmiRefresh:
+        with open(self.filepath, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < self.offset:
+                raise RuntimeError("{f} was truncated while following it.".format(f=self.filepath))
+            f.seek(self.offset)
+            data = f.read()
+        end = complete_length(data)
+        lines = list(AcmiFileReader(io.StringIO(data[:end].decode(ACMI_FILE_ENCODING if self.offset == 0 else
+                                                                  'utf-8'))))
+        if not self.has_header:
+            if len(lines) < 2:
+                # 文件头还没有写完
+                return AcmiRefresh(self.cur_reftime, [], set(), set())
+            self.acmi._parse_header(iter(lines[:2]))
+            lines = lines[2:]
+            self.has_header = True
+        self.offset += end
+        self.acmi.stats.lines += len(lines)
+        self.acmi.stats.bytes += end
+
+        acmi = self.acmi
+        frames = []
+        updated = set()
+        removed = set()
+        for rawline in lines:
+            line = rawline.strip()
+            if line.startswith('#'):
+                try:
+                    frames.append(float(line[1:]))
+                except ValueError:
+                    pass
+            elif line.startswith('-'):
+                removed.add(acmi.parse_obj_id(line[1:]))
+            elif line and not line.startswith('//'):
+                comma = line.find(',')
+                obj_id = acmi.parse_obj_id(line if comma == -1 else line[:comma])
+                if obj_id != '0' and obj_id != 0:
+                    updated.add(obj_id)
+        self.cur_reftime = acmi._parse_lines(lines, self.cur_reftime)
+
+        if updated or removed:
+            # 列式模式下属性保持为可追加的AcmiTimelineBuilder，查询时才转换成列（见build），
+            # 刷新的开销只与新追加的数据有关
+            acmi._invalidate_indexes()
+        acmi.stats.frames = len(acmi.timeframes)
+        acmi.stats.objects = len(acmi.objects)
+        acmi.stats.events = len(acmi.events)
+        acmi.stats.current_time = self.cur_reftime
+        acmi._warn_unknown_properties()
+        changes = AcmiRefresh(self.cur_reftime, frames, updated, removed)
+        if self.callback is not None and (frames or updated or removed):
+            self.callback(acmi, changes)
+        return changes
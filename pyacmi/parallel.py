@@ -0,0 +1,239 @@
+"""
+多进程并行解析单个acmi文件
+
+把解压后的文本按 #<time> 时间帧切分成多段，每段在独立的进程中解析成列式数据，最后按文件顺序合并到Acmi.objects。
+- 文件头（第一个时间帧之前的部分）在主进程解析，ReferenceLongitude/ReferenceLatitude传给每个分段
+- 对象的类型只由第一次出现的Type决定，所以Type在分段中只记录原始值，合并时按顺序重放
+- 全局属性同样在合并时按顺序重放，结果与串行加载一致
+"""
+import io
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from typing import Optional
+
+import numpy as np
+
+from .acmi import Acmi, AcmiObject, AcmiFileReader, open_acmi_streams, is_continued_line
+from .columnar import AcmiColumn, as_column
+from .stats import stream_bytes
+
+# 文件头之后再出现参考点时，各分段的坐标无法独立计算，退回串行解析
+ACMI_REFERENCE_PATTERN = re.compile(r'^0,(?:.*,)?Reference(?:Longitude|Latitude)=', re.M)
+
+
+class AcmiChunkObject(AcmiObject):
+    """Object parsed inside one chunk; Type lines are kept raw and replayed when merging."""
+
+    def __init__(self, obj_id: str, columnar: bool = True, collapse: bool = False):
+        super().__init__(obj_id, columnar=True, collapse=collapse)
+        self.type_lines = []
+
+    def set_value(self, field: str, timeframe: float, val):
+        if field == 'Type':
+            self.type_lines.append((timeframe, val))
+            # 占位，保持属性的插入顺序和串行加载一致
+            self.data.setdefault('Tags', None)
+            self.data.setdefault('Type', None)
+            return
+        super().set_value(field, timeframe, val)
+
+
+class AcmiChunkParser(Acmi):
+    """Parses one chunk of frames into columnar partial timelines."""
+
+    object_class = AcmiChunkObject
+
+    def __init__(self, reference_longitude: float = 0, reference_latitude: float = 0, compact: bool = False,
+                 strict: bool = False):
+        super().__init__(columnar=True, compact=compact, strict=strict)
+        self.reference_longitude = reference_longitude
+        self.reference_latitude = reference_latitude
+        self.global_lines = []
+        self.removals = { }
+
+    def _parse_global_property(self, fields: list, timeframe: float = 0.0):
+        self.global_lines.append((timeframe, fields))
+        for field in fields[1:]:
+            (prop, val) = field.split('=', 1)
+            if prop == 'ReferenceLongitude':
+                self.reference_longitude = float(val)
+            elif prop == 'ReferenceLatitude':
+                self.reference_latitude = float(val)
+
+    def _remove_object(self, obj_id: str, timeframe: float):
+        self.removals[obj_id] = timeframe
+
+    def result(self) -> dict:
+        objects = { }
+        columns = []
+        for obj_id, obj in self.objects.items():
+            fields = []
+            for field, timeline in obj.data.items():
+                if timeline is not None:
+                    fields.append(field)
+                    columns.append(timeline.build())
+            objects[obj_id] = (obj.type_lines, obj.name, obj.country, list(obj.data.keys()), fields)
+        return {
+            'timeframes'   : self.timeframes,
+            'object_fields': self.object_fields,
+            'global_lines' : self.global_lines,
+            'removals'     : self.removals,
+            'lines'        : self.stats.lines,
+            'unknown'      : self.stats.unknown_object_properties,
+            'objects'      : objects,
+            'columns'      : pack_columns(columns),
+        }
+
+
+# 把大量小列打包成几个大数组，减少进程间传输（pickle）的开销
+def pack_columns(columns: list) -> tuple:
+    bounds = np.zeros(len(columns) + 1, dtype=np.int64)
+    np.cumsum([len(column) for column in columns], out=bounds[1:])
+    times = np.empty(bounds[-1], dtype=np.float64)
+    numbers = np.zeros(bounds[-1], dtype=np.float64)
+    codes = np.zeros(bounds[-1], dtype=np.int32)
+    extras = { }
+    for i, column in enumerate(columns):
+        start, end = bounds[i], bounds[i + 1]
+        times[start:end] = column.times
+        if column.categories is not None:
+            codes[start:end] = column.values
+            extras[i] = column.categories
+        elif column.values.dtype == np.float64:
+            numbers[start:end] = column.values
+        else:
+            extras[i] = column.values
+    return bounds, times, numbers, codes, extras
+
+
+def unpack_columns(packed: tuple) -> list:
+    bounds, times, numbers, codes, extras = packed
+    columns = []
+    for i in range(len(bounds) - 1):
+        start, end = bounds[i], bounds[i + 1]
+        extra = extras.get(i)
+        if extra is None:
+            columns.append(AcmiColumn(times[start:end].copy(), numbers[start:end].copy()))
+        elif type(extra) is list:
+            columns.append(AcmiColumn(times[start:end].copy(), codes[start:end].copy(), extra))
+        else:
+            columns.append(AcmiColumn(times[start:end].copy(), extra))
+    return columns
+
+
+def _parse_chunk(text: str, reference_longitude: float, reference_latitude: float, compact: bool,
+                 strict: bool) -> dict:
+    parser = AcmiChunkParser(reference_longitude, reference_latitude, compact=compact, strict=strict)
+    parser._parse_lines(AcmiFileReader(io.StringIO(text), parser.stats))
+    return parser.result()
+
+
+# 查找pos之后下一个时间帧所在行的换行符位置，续行（上一行以未转义的反斜杠结尾）中的#不算
+def _find_frame(text: str, pos: int) -> int:
+    idx = text.find('\n#', pos)
+    while idx > 0 and is_continued_line(text[text.rfind('\n', 0, idx) + 1:idx]):
+        idx = text.find('\n#', idx + 1)
+    return idx
+
+
+# 在时间帧边界把[start, len(text))切分成大约chunks段，每段都以#<time>行开头
+def _split_frames(text: str, start: int, chunks: int) -> list:
+    size = max((len(text) - start) // chunks, 1)
+    pieces = []
+    while start < len(text):
+        idx = _find_frame(text, start + size)
+        end = len(text) if idx == -1 else idx + 1
+        pieces.append(text[start:end])
+        start = end
+    return pieces
+
+
+# 并行加载acmi文件
+# workers: 进程数，默认为CPU核数
+# chunks: 切分的段数，默认为workers的4倍，用于平衡各进程的负载
+def load_acmi_parallel(acmi: Acmi, filepath: str, workers: Optional[int] = None, chunks: Optional[int] = None):
+    workers = workers or os.cpu_count() or 1
+    chunks = chunks or workers * 4
+    for f in open_acmi_streams(filepath):
+        _load_text_parallel(acmi, f.read(), workers, chunks)
+        acmi.stats.bytes += stream_bytes(f)
+
+
+def _load_text_parallel(acmi: Acmi, text: str, workers: int, chunks: int):
+    first = _find_frame(text, 0)
+    if first != -1 and ACMI_REFERENCE_PATTERN.search(text, first):
+        acmi._parse_stream(io.StringIO(text))
+        return
+
+    ar = AcmiFileReader(io.StringIO(text if first == -1 else text[:first + 1]), acmi.stats)
+    acmi._parse_header(ar)
+    header = AcmiChunkParser(compact=acmi.compact, strict=acmi.strict)
+    header._parse_lines(ar)
+    results = [header.result()]
+
+    if first != -1:
+        pieces = _split_frames(text, first + 1, chunks)
+        with ProcessPoolExecutor(max_workers=min(workers, len(pieces))) as executor:
+            results.extend(executor.map(_parse_chunk, pieces,
+                                        repeat(header.reference_longitude), repeat(header.reference_latitude),
+                                        repeat(acmi.compact), repeat(acmi.strict)))
+    _merge_results(acmi, results)
+
+
+# 按文件顺序合并各分段的结果
+def _merge_results(acmi: Acmi, results: list):
+    # obj_id -> 属性插入顺序 / {属性: [各分段的列]}
+    orders = { }
+    parts = { }
+    for result in results:
+        for timeframe, fields in result['global_lines']:
+            acmi._parse_global_property(fields, timeframe)
+        acmi.timeframes.extend(result['timeframes'])
+        acmi.object_fields.update(result['object_fields'])
+        acmi.stats.lines += result['lines']
+        unknown = acmi.stats.unknown_object_properties
+        for prop, count in result['unknown'].items():
+            unknown[prop] = unknown.get(prop, 0) + count
+
+        columns = iter(unpack_columns(result['columns']))
+        for obj_id, (type_lines, name, country, order, fields) in result['objects'].items():
+            obj = acmi.objects.get(obj_id)
+            if obj is None:
+                obj = acmi.objects[obj_id] = acmi.object_class(obj_id, columnar=acmi.columnar,
+                                                               collapse=not acmi.strict)
+            if obj_id not in orders:
+                orders[obj_id] = list(obj.data.keys())
+                parts[obj_id] = { }
+            orders[obj_id].extend(order)
+            for timeframe, val in type_lines:
+                obj.set_value('Type', timeframe, val)
+            if name is not None:
+                obj.name = name
+            if country is not None:
+                obj.country = country
+            for field in fields:
+                parts[obj_id].setdefault(field, []).append(next(columns))
+
+        for obj_id, timeframe in result['removals'].items():
+            acmi._remove_object(obj_id, timeframe)
+
+    for obj_id, fields in parts.items():
+        obj = acmi.objects[obj_id]
+        data = { }
+        for field in orders[obj_id]:
+            if field in data:
+                continue
+            columns = fields.get(field)
+            if columns is None:
+                data[field] = obj.data[field]
+                continue
+            if field in obj.data:
+                columns = [as_column(obj.data[field])] + columns
+            column = AcmiColumn.concat(columns, collapse=not acmi.strict)
+            if acmi.columnar:
+                data[field] = column
+            else:
+                data[field] = column.to_sorted_dict()
+        obj.data = data
@@ -0,0 +1,257 @@
+"""
+Tacview实时遥测（Real-Time Telemetry）协议的asyncio客户端和回放服务端
+
+握手：服务端和客户端各自发送
+    XtraLib.Stream.0\\n
+    Tacview.RealTimeTelemetry.0\\n
+    <名称>\\n
+    <密码>\\0          （服务端发送的握手没有密码行）
+之后服务端持续发送acmi文本（FileType/FileVersion文件头和各行数据）。
+
+客户端把收到的每一行交给Acmi._parse_lines，实时更新一个Acmi；读取和解析之间通过有界的asyncio.Queue衔接，
+解析跟不上时停止从socket读取，由TCP向发送端施加背压。每个时间帧结束（收到下一个#<time>）时通知订阅者。
+
+client = AcmiTelemetryClient('127.0.0.1', 42674)
+client.subscribe(lambda acmi, time: print(time, len(acmi.objects)))
+await client.run()
+"""
+import asyncio
+import inspect
+from typing import Optional, Callable
+
+from .acmi import Acmi, open_acmi_streams, is_continued_line
+
+ACMI_TELEMETRY_STREAM_PROTOCOL = 'XtraLib.Stream.0'
+ACMI_TELEMETRY_PROTOCOL = 'Tacview.RealTimeTelemetry.0'
+ACMI_TELEMETRY_PORT = 42674
+
+
+# 握手消息，password为None时不包含密码行（服务端）
+def handshake_message(name: str, password: Optional[str] = None) -> bytes:
+    lines = [ACMI_TELEMETRY_STREAM_PROTOCOL, ACMI_TELEMETRY_PROTOCOL, name]
+    if password is not None:
+        lines.append(password)
+    return ('\n'.join(lines) + '\0').encode('utf-8')
+
+
+# 解析握手消息，返回 (名称, 密码)，协议不匹配时抛出RuntimeError
+def parse_handshake(data: bytes) -> tuple:
+    lines = data.rstrip(b'\0').decode('utf-8').split('\n')
+    if len(lines) < 3 or lines[0] != ACMI_TELEMETRY_STREAM_PROTOCOL or lines[1] != ACMI_TELEMETRY_PROTOCOL:
+        raise RuntimeError("Invalid real-time telemetry handshake: {h!r}".format(h=data))
+    return lines[2], lines[3] if len(lines) > 3 else None
+
+
+# 读取一行（包括换行符），不受StreamReader的limit限制（例如很长的简报），连接关闭时返回剩余的数据
+async def _read_raw_line(reader: asyncio.StreamReader) -> bytes:
+    chunks = []
+    while True:
+        try:
+            chunks.append(await reader.readuntil(b'\n'))
+            break
+        except asyncio.IncompleteReadError as e:
+            chunks.append(e.partial)
+            break
+        except asyncio.LimitOverrunError as e:
+            # 行比limit长：先取出已经缓冲的部分，再继续读取这一行
+            chunks.append(await reader.readexactly(e.consumed))
+    return b''.join(chunks)
+
+
+# 逐行读取acmi文本，续行（以未转义的反斜杠结尾）与下一行合并，与AcmiFileReader一致
+async def read_acmi_line(reader: asyncio.StreamReader) -> Optional[str]:
+    line = (await _read_raw_line(reader)).decode('utf-8')
+    if not line:
+        return None
+    while is_continued_line(line):
+        more = (await _read_raw_line(reader)).decode('utf-8')
+        line = line.rstrip()[:-1] + '\n' + more
+        if not more:
+            break
+    return line
+
+
+class AcmiTelemetryClient:
+    """Receives Tacview real-time telemetry into a live Acmi."""
+
+    # acmi: 接收数据的Acmi，默认新建
+    # queue_size: 读取和解析之间缓冲的行数上限
+    # batch_size: 每次解析的最多行数，解析完一批后让出事件循环
+    def __init__(self, host: str = '127.0.0.1', port: int = ACMI_TELEMETRY_PORT, name: str = 'pyacmi',
+                 password: str = '', acmi: Optional[Acmi] = None, queue_size: int = 10000, batch_size: int = 1000):
+        self.host = host
+        self.port = port
+        self.name = name
+        self.password = password
+        self.acmi = acmi if acmi is not None else Acmi()
+        self.batch_size = batch_size
+        self.server_name = None
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.subscribers = []
+        self._reader = None
+        self._writer = None
+        self._cur_reftime = 0.0
+        self._has_frame = False
+
+    # 订阅时间帧，每个时间帧结束时调用callback(acmi, time)，callback可以是协程函数
+    def subscribe(self, callback: Callable):
+        self.subscribers.append(callback)
+
+    def unsubscribe(self, callback: Callable):
+        self.subscribers.remove(callback)
+
+    async def connect(self):
+        self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+        self.server_name, _ = parse_handshake(await self._reader.readuntil(b'\0'))
+        self._writer.write(handshake_message(self.name, self.password))
+        await self._writer.drain()
+
+    # 连接并接收数据，直到服务端关闭连接
+    async def run(self):
+        if self._reader is None:
+            await self.connect()
+        receiving = asyncio.ensure_future(self._receive())
+        try:
+            await self._consume()
+            # 读取过程中的异常（例如文件头不合法）在这里抛出
+            await receiving
+        finally:
+            receiving.cancel()
+            await self.close()
+
+    async def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            try:
+                await self._writer.wait_closed()
+            except ConnectionError:
+                pass
+            self._writer = None
+            self._reader = None
+
+    async def _receive(self):
+        header = []
+        try:
+            while True:
+                line = await read_acmi_line(self._reader)
+                if line is None:
+                    break
+                if len(header) < 2:
+                    header.append(line.lstrip('\ufeff'))
+                    if len(header) == 2:
+                        self.acmi._parse_header(iter(header))
+                    continue
+                # 队列满时在这里等待，不再读取socket
+                await self.queue.put(line)
+        finally:
+            await self.queue.put(None)
+
+    async def _consume(self):
+        while True:
+            lines = [await self.queue.get()]
+            while len(lines) < self.batch_size and not self.queue.empty():
+                lines.append(self.queue.get_nowait())
+            finished = lines[-1] is None
+            if finished:
+                lines.pop()
+            await self.apply_lines(lines)
+            if finished:
+                if self._has_frame:
+                    await self._notify(self._cur_reftime)
+                return
+            await asyncio.sleep(0)
+
+    # 把一批行应用到acmi上，遇到时间帧时通知上一个时间帧的订阅者
+    async def apply_lines(self, lines: list):
+        batch = []
+        for line in lines:
+            if line.startswith('#'):
+                if batch:
+                    self._cur_reftime = self.acmi._parse_lines(batch, self._cur_reftime)
+                    batch = []
+                if self._has_frame:
+                    await self._notify(self._cur_reftime)
+                self._cur_reftime = self.acmi._parse_lines([line], self._cur_reftime)
+                self._has_frame = True
+            else:
+                batch.append(line)
+        if batch:
+            self._cur_reftime = self.acmi._parse_lines(batch, self._cur_reftime)
+        self.acmi._invalidate_indexes()
+
+    async def _notify(self, time: float):
+        for callback in list(self.subscribers):
+            result = callback(self.acmi, time)
+            if inspect.isawaitable(result):
+                await result
+
+
+class AcmiReplayServer:
+    """Replays an ACMI file to real-time telemetry clients."""
+
+    # speed: 回放速度倍数，None表示不等待，尽快发送
+    # password: 不为None时校验客户端的密码
+    def __init__(self, filepath: str, host: str = '127.0.0.1', port: int = ACMI_TELEMETRY_PORT,
+                 name: str = 'pyacmi', speed: Optional[float] = None, password: Optional[str] = None):
+        self.filepath = filepath
+        self.host = host
+        self.port = port
+        self.name = name
+        self.speed = speed
+        self.password = password
+        self.server = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle, self.host, self.port)
+        # port为0时使用系统分配的端口
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def serve_forever(self):
+        if self.server is None:
+            await self.start()
+        await self.server.serve_forever()
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            writer.write(handshake_message(self.name))
+            await writer.drain()
+            _, password = parse_handshake(await reader.readuntil(b'\0'))
+            if self.password is not None and password != self.password:
+                return
+            await self._replay(writer)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _replay(self, writer: asyncio.StreamWriter):
+        last_time = None
+        for f in open_acmi_streams(self.filepath):
+            for line in f:
+                if self.speed and line.startswith('#'):
+                    try:
+                        time = float(line[1:])
+                    except ValueError:
+                        time = None
+                    if time is not None:
+                        if last_time is not None and time > last_time:
+                            await writer.drain()
+                            await asyncio.sleep((time - last_time) / self.speed)
+                        last_time = time
+                writer.write(line.encode('utf-8'))
+                if writer.transport.get_write_buffer_size() > 1 << 16:
+                    await writer.drain()
+        await writer.drain()
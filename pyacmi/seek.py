@@ -0,0 +1,314 @@
+"""
+帧偏移索引：随机访问录像中的某个时间段
+
+索引文件（<filepath>.acmiindex）记录解压后文本流中每个 #<time> 时间帧标记的字节偏移，
+并每隔checkpoint_interval秒记录一个检查点：检查点之前的全局属性和每个存活对象的全部属性（最后一次出现的原始文本），
+写成一段acmi文本。加载某个时间段时从t0之前最近的检查点开始，只需解析检查点文本和之后的数据。
+
+zip压缩的acmi无法按偏移定位，建立索引时把解压后的文本缓存到<filepath>.acmitext，之后直接从缓存的文本中读取。
+
+文件格式（小端）:
+    8字节  魔数 ACMI_INDEX_MAGIC
+    8字节  header长度(uint64)
+    8字节  源acmi文件的大小(int64)
+    header  utf-8 JSON：文件头、解压后文本的文件名，以及各数组在数据区中的位置
+    数据区  按64字节对齐的数组：frame_times / frame_offsets / checkpoint_* / checkpoint_text
+
+acmi = Acmi()
+acmi.load_acmi('test.acmi', time_range=(3600, 3720), index=True)
+"""
+import io
+import json
+import os
+import shutil
+import struct
+import zipfile
+from typing import Optional
+
+import numpy as np
+
+from .acmi import Acmi, AcmiFileReader, ACMI_FILE_ENCODING, ACMI_TRANSFORM_FIELDS, is_continued_line
+from .writer import escape_text
+
+ACMI_INDEX_MAGIC = b'PYACMI\x00\x02'
+ACMI_INDEX_VERSION = 1
+ACMI_INDEX_SUFFIX = '.acmiindex'
+ACMI_INDEX_TEXT_SUFFIX = '.acmitext'
+ACMI_INDEX_ALIGN = 64
+# 魔数 + header长度 + 源文件大小
+ACMI_INDEX_PREAMBLE = struct.Struct('<8sQq')
+# 默认的检查点间隔（秒）
+ACMI_INDEX_CHECKPOINT_INTERVAL = 60.0
+
+# T的各种写法中每个分量在9分量写法中的位置
+_TRANSFORM_SLOTS = {
+    n: [ACMI_TRANSFORM_FIELDS[9].index(name) for name in names] for n, names in ACMI_TRANSFORM_FIELDS.items()
+}
+
+
+# 默认的索引文件路径（与acmi文件放在一起）
+def index_path_for(filepath: str) -> str:
+    return filepath + ACMI_INDEX_SUFFIX
+
+
+# 索引是否可用：索引文件存在，比acmi文件新，并且记录的源文件大小一致
+def is_index_fresh(filepath: str, index_path: Optional[str] = None) -> bool:
+    index_path = index_path or index_path_for(filepath)
+    if not os.path.exists(index_path) or os.path.getmtime(index_path) < os.path.getmtime(filepath):
+        return False
+    with open(index_path, 'rb') as f:
+        preamble = f.read(ACMI_INDEX_PREAMBLE.size)
+    if len(preamble) < ACMI_INDEX_PREAMBLE.size:
+        return False
+    magic, _, source_size = ACMI_INDEX_PREAMBLE.unpack(preamble)
+    return magic == ACMI_INDEX_MAGIC and source_size == os.path.getsize(filepath)
+
+
+def _align(offset: int) -> int:
+    return (offset + ACMI_INDEX_ALIGN - 1) // ACMI_INDEX_ALIGN * ACMI_INDEX_ALIGN
+
+
+class AcmiSeekIndex:
+    """Byte offsets of the frame markers in a recording, plus periodic object-state checkpoints."""
+
+    # text_path: 解压后的文本（普通acmi文件就是它自身）
+    # checkpoints: [(时间, 恢复解析的偏移, 检查点的acmi文本)]
+    def __init__(self, text_path: str, file_type: str, file_version: float, frame_times: np.ndarray,
+                 frame_offsets: np.ndarray, checkpoints: list):
+        self.text_path = text_path
+        self.file_type = file_type
+        self.file_version = file_version
+        self.frame_times = frame_times
+        self.frame_offsets = frame_offsets
+        self.checkpoints = checkpoints
+        self.checkpoint_times = np.asarray([time for time, _, _ in checkpoints], dtype=np.float64)
+
+    # 扫描acmi文件建立索引，zip压缩的acmi先解压到text_path
+    @classmethod
+    def build(cls, filepath: str, checkpoint_interval: float = ACMI_INDEX_CHECKPOINT_INTERVAL,
+              text_path: Optional[str] = None) -> 'AcmiSeekIndex':
+        if zipfile.is_zipfile(filepath):
+            text_path = text_path or filepath + ACMI_INDEX_TEXT_SUFFIX
+            with zipfile.ZipFile(file=filepath) as my_zip:
+                names = my_zip.namelist()
+                if len(names) != 1:
+                    raise RuntimeError("Can't index a zip archive with {n} recordings: {f}".format(
+                            n=len(names), f=filepath))
+                with my_zip.open(names[0]) as src, open(text_path + '.tmp', 'wb') as dst:
+                    shutil.copyfileobj(src, dst, 1 << 20)
+            os.replace(text_path + '.tmp', text_path)
+        else:
+            text_path = filepath
+
+        with open(text_path, 'rb') as f:
+            return cls._scan(text_path, f, checkpoint_interval)
+
+    @classmethod
+    def _scan(cls, text_path: str, f, checkpoint_interval: float) -> 'AcmiSeekIndex':
+        header = []
+        frame_times = []
+        frame_offsets = []
+        checkpoints = []
+        global_state = { }
+        object_state = { }
+        next_checkpoint = None
+        cur_reftime = None
+        offset = 0
+        # 续行（以未转义的反斜杠结尾）与下一行合并，与AcmiFileReader一致
+        pending = None
+        for raw in f:
+            line_offset = offset
+            offset += len(raw)
+            line = raw.decode(ACMI_FILE_ENCODING if line_offset == 0 else 'utf-8')
+            if pending is not None:
+                line = pending + '\n' + line
+                pending = None
+            if is_continued_line(line):
+                pending = line.rstrip()[:-1]
+                continue
+
+            if len(header) < 2:
+                header.append(line)
+                continue
+            line = line.strip()
+            if not line or line.startswith('//'):
+                continue
+
+            if line.startswith('#'):
+                try:
+                    frame = float(line[1:])
+                except Exception:
+                    continue
+                if cur_reftime is not None and next_checkpoint is not None and frame >= next_checkpoint:
+                    checkpoints.append((cur_reftime, line_offset,
+                                        _checkpoint_text(cur_reftime, global_state, object_state)))
+                    next_checkpoint = None
+                if next_checkpoint is None:
+                    next_checkpoint = frame + checkpoint_interval
+                cur_reftime = frame
+                frame_times.append(frame)
+                frame_offsets.append(line_offset)
+                continue
+
+            if line.startswith('-'):
+                object_state.pop(line[1:], None)
+                continue
+
+            fields = Acmi.split_fields(line)
+            if fields[0] == '0':
+                for field in fields[1:]:
+                    (prop, val) = field.split('=', 1)
+                    if prop != 'Event':
+                        global_state[prop] = val
+                continue
+            state = object_state.setdefault(fields[0], { })
+            for field in fields[1:]:
+                (prop, val) = field.split('=', 1)
+                if prop == 'T':
+                    transform = state.get('T')
+                    if transform is None:
+                        transform = state['T'] = [''] * 9
+                    components = val.split('|')
+                    for slot, component in zip(_TRANSFORM_SLOTS.get(len(components), _TRANSFORM_SLOTS[3]),
+                                               components):
+                        if component:
+                            transform[slot] = component
+                else:
+                    state[prop] = val
+
+        if len(header) < 2 or not header[0].lstrip('\ufeff').startswith('FileType='):
+            raise RuntimeError("ACMI file doesn't start with FileType.")
+        if not header[1].startswith('FileVersion='):
+            raise RuntimeError("ACMI file doesn't have FileVersion.")
+        return cls(text_path, header[0].lstrip('\ufeff')[len('FileType='):].strip(),
+                   float(header[1][len('FileVersion='):].strip()),
+                   np.asarray(frame_times, dtype=np.float64), np.asarray(frame_offsets, dtype=np.int64), checkpoints)
+
+    def save(self, path: str, source_size: int):
+        texts = [text.encode('utf-8') for _, _, text in self.checkpoints]
+        lengths = np.asarray([len(text) for text in texts], dtype=np.int64)
+        arrays = [
+            ('frame_times', self.frame_times),
+            ('frame_offsets', self.frame_offsets),
+            ('checkpoint_times', self.checkpoint_times),
+            ('checkpoint_offsets', np.asarray([offset for _, offset, _ in self.checkpoints], dtype=np.int64)),
+            ('checkpoint_lengths', lengths),
+            ('checkpoint_text', np.frombuffer(b''.join(texts), dtype=np.uint8)),
+        ]
+        header = {
+            'version'     : ACMI_INDEX_VERSION,
+            'file_type'   : self.file_type,
+            'file_version': self.file_version,
+            'text_path'   : os.path.basename(self.text_path),
+            'arrays'      : { name: { 'dtype': arr.dtype.str, 'offset': 0, 'length': len(arr) } for name, arr in arrays },
+        }
+        # 先用占位的偏移计算header长度（为偏移的位数预留空间），再回填实际偏移
+        header_bytes = json.dumps(header, ensure_ascii=False).encode('utf-8')
+        offset = _align(ACMI_INDEX_PREAMBLE.size + len(header_bytes) + len(arrays) * 32)
+        for name, arr in arrays:
+            header['arrays'][name]['offset'] = offset
+            offset = _align(offset + arr.nbytes)
+        header_bytes = json.dumps(header, ensure_ascii=False).encode('utf-8')
+
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(ACMI_INDEX_PREAMBLE.pack(ACMI_INDEX_MAGIC, len(header_bytes), source_size))
+            f.write(header_bytes)
+            for name, arr in arrays:
+                f.seek(header['arrays'][name]['offset'])
+                f.write(np.ascontiguousarray(arr).tobytes())
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'AcmiSeekIndex':
+        with open(path, 'rb') as f:
+            data = f.read()
+        if len(data) < ACMI_INDEX_PREAMBLE.size or data[:len(ACMI_INDEX_MAGIC)] != ACMI_INDEX_MAGIC:
+            raise RuntimeError("Not a pyacmi index file: " + path)
+        _, header_len, _ = ACMI_INDEX_PREAMBLE.unpack_from(data)
+        header = json.loads(data[ACMI_INDEX_PREAMBLE.size:ACMI_INDEX_PREAMBLE.size + header_len].decode('utf-8'))
+        if header.get('version') != ACMI_INDEX_VERSION:
+            raise RuntimeError("Unsupported index version: {v}".format(v=header.get('version')))
+        arrays = { }
+        for name, info in header['arrays'].items():
+            if not info['length']:
+                arrays[name] = np.empty(0, dtype=np.dtype(info['dtype']))
+                continue
+            arrays[name] = np.frombuffer(data, dtype=np.dtype(info['dtype']), count=info['length'],
+                                         offset=info['offset'])
+
+        text = arrays['checkpoint_text'].tobytes()
+        checkpoints = []
+        start = 0
+        for time, offset, length in zip(arrays['checkpoint_times'].tolist(), arrays['checkpoint_offsets'].tolist(),
+                                        arrays['checkpoint_lengths'].tolist()):
+            checkpoints.append((time, offset, text[start:start + length].decode('utf-8')))
+            start += length
+        return cls(os.path.join(os.path.dirname(path), header['text_path']), header['file_type'],
+                   header['file_version'], arrays['frame_times'], arrays['frame_offsets'], checkpoints)
+
+    # 不晚于time的最后一个时间帧标记的偏移，time早于第一个时间帧时返回第一个时间帧的偏移
+    def frame_offset(self, time: float) -> int:
+        i = max(int(np.searchsorted(self.frame_times, time, side='right')) - 1, 0)
+        return int(self.frame_offsets[i])
+
+    # 时间不晚于time的最后一个检查点 (时间, 偏移, acmi文本)，没有时返回None
+    def checkpoint_before(self, time: float) -> Optional[tuple]:
+        i = int(np.searchsorted(self.checkpoint_times, time, side='right')) - 1
+        if i < 0:
+            return None
+        return self.checkpoints[i]
+
+    # 打开解压后的文本，并定位到offset
+    def open_text(self, offset: int = 0):
+        f = open(self.text_path, 'rb')
+        f.seek(offset)
+        return io.TextIOWrapper(f, encoding=ACMI_FILE_ENCODING if offset == 0 else 'utf-8')
+
+    # 按acmi的加载筛选条件（见AcmiLoadFilter）加载，从time_range的t0之前最近的检查点开始解析
+    def load_window(self, acmi: Acmi):
+        checkpoint = self.checkpoint_before(acmi._load_filter.start)
+        if checkpoint is None:
+            with open(self.text_path, 'rb') as f:
+                acmi._parse_stream(f)
+            return
+        time, offset, text = checkpoint
+        acmi.file_type = self.file_type
+        acmi.file_version = self.file_version
+        cur_reftime = acmi._parse_lines(AcmiFileReader(text.encode('utf-8')), time)
+        with open(self.text_path, 'rb') as f:
+            f.seek(offset)
+            ar = AcmiFileReader(f, acmi.stats)
+            try:
+                acmi._parse_lines(ar, cur_reftime)
+            finally:
+                ar.close()
+            acmi.stats.bytes += f.tell() - offset
+
+
+# 检查点的acmi文本：全局属性、时间帧，以及每个存活对象的全部属性
+def _checkpoint_text(time: float, global_state: dict, object_state: dict) -> str:
+    lines = ['0,{p}={v}'.format(p=prop, v=escape_text(val)) for prop, val in global_state.items()]
+    lines.append('#' + repr(time))
+    for obj_id, state in object_state.items():
+        fields = [obj_id]
+        for prop, val in state.items():
+            if prop == 'T':
+                fields.append('T=' + '|'.join(val if any(val[3:]) else val[:3]))
+            else:
+                fields.append(prop + '=' + escape_text(val))
+        if len(fields) > 1:
+            lines.append(','.join(fields))
+    return '\n'.join(lines) + '\n'
+
+
+# 读取索引，索引不存在或已过期时重新建立并保存
+def open_seek_index(filepath: str, checkpoint_interval: float = ACMI_INDEX_CHECKPOINT_INTERVAL) -> AcmiSeekIndex:
+    index_path = index_path_for(filepath)
+    if is_index_fresh(filepath, index_path):
+        index = AcmiSeekIndex.load(index_path)
+        if os.path.exists(index.text_path):
+            return index
+    index = AcmiSeekIndex.build(filepath, checkpoint_interval=checkpoint_interval)
+    index.save(index_path, os.path.getsize(filepath))
+    return index
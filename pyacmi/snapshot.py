@@ -0,0 +1,129 @@
+"""
+按时间查询全体对象状态的帧索引
+
+把每个属性在所有对象上的时间序列拼接成一条数组，按 (对象序号, 时间序号) 组合成单调递增的整数键。
+查询t时刻时，为每个存活的对象构造查询键，一次searchsorted即可得到所有对象在t时刻（含）之前的最后一个值，
+语义和AcmiObject.get_value一致。
+"""
+import functools
+from typing import Optional
+
+import numpy as np
+
+from .acmi import Acmi
+from .columnar import as_column
+
+
+class AcmiFieldIndex:
+    """Concatenated timelines of one field over all objects, keyed by (object index, time rank)."""
+
+    __slots__ = ('objects', 'starts', 'keys', 'values', 'is_numeric')
+
+    def __init__(self, objects: np.ndarray, starts: np.ndarray, keys: np.ndarray, values: np.ndarray):
+        # 拥有该属性的对象序号（升序），以及每个对象的数据在keys/values中的起始位置
+        self.objects = objects
+        self.starts = starts
+        self.keys = keys
+        self.values = values
+        self.is_numeric = values.dtype == np.float64
+
+
+class AcmiFrameIndex:
+    """Time-major index answering "state of every alive object at time t" with vectorized lookups."""
+
+    def __init__(self, acmi: Acmi, fields: Optional[list] = None, cache_size: int = 128):
+        objects = list(acmi.objects.values())
+        self.ids = np.empty(len(objects), dtype=object)
+        self.ids[:] = [obj.id for obj in objects]
+        if fields is None:
+            fields = sorted({ field for obj in objects for field in obj.data })
+        self.fields = list(fields)
+        self.timeframes = np.asarray(acmi.timeframes, dtype=np.float64)
+
+        # 对象的生命周期 [created_at, removed_at)
+        self.created_at = np.array([_nan_if_none(obj.created_at) for obj in objects], dtype=np.float64)
+        self.removed_at = np.array([_nan_if_none(obj.removed_at) for obj in objects], dtype=np.float64)
+
+        columns = { field: [] for field in self.fields }
+        for i, obj in enumerate(objects):
+            for field in self.fields:
+                timeline = obj.data.get(field)
+                if timeline is not None and len(timeline):
+                    columns[field].append((i, as_column(timeline)))
+
+        all_times = [column.times for field in self.fields for _, column in columns[field]]
+        self.times = np.unique(np.concatenate(all_times)) if all_times else np.empty(0, dtype=np.float64)
+        self._stride = len(self.times) + 1
+
+        self.field_index = { field: self._build_field(columns[field]) for field in self.fields }
+        self._state_at = functools.lru_cache(maxsize=cache_size)(self._compute_state)
+
+    def _build_field(self, columns: list) -> AcmiFieldIndex:
+        objects = np.array([i for i, _ in columns], dtype=np.int64)
+        lengths = np.array([len(column) for _, column in columns], dtype=np.int64)
+        starts = np.zeros(len(columns), dtype=np.int64)
+        if len(columns):
+            np.cumsum(lengths[:-1], out=starts[1:])
+            times = np.concatenate([column.times for _, column in columns])
+            ranks = np.searchsorted(self.times, times) + 1
+            keys = np.repeat(objects, lengths) * self._stride + ranks
+            if all(column.categories is None and column.values.dtype == np.float64 for _, column in columns):
+                values = np.concatenate([column.values for _, column in columns])
+            else:
+                values = np.concatenate([column.decoded_values().astype(object) for _, column in columns])
+        else:
+            keys = np.empty(0, dtype=np.int64)
+            values = np.empty(0, dtype=np.float64)
+        return AcmiFieldIndex(objects, starts, keys, values)
+
+    # t时刻存活的对象序号
+    def alive(self, time: float) -> np.ndarray:
+        with np.errstate(invalid='ignore'):
+            mask = (self.created_at <= time) & ~(self.removed_at <= time)
+        return np.flatnonzero(mask)
+
+    # 返回t时刻所有存活对象的状态（结构化数组，第一列为ID），结果会被缓存，不要修改
+    def state_at(self, time: float, fields: Optional[list] = None) -> np.ndarray:
+        return self._state_at(float(time), tuple(fields) if fields is not None else tuple(self.fields))
+
+    def _compute_state(self, time: float, fields: tuple) -> np.ndarray:
+        alive = self.alive(time)
+        rank = np.searchsorted(self.times, time, side='right')
+        dtype = [('ID', object)]
+        results = []
+        for field in fields:
+            index = self.field_index.get(field)
+            if index is None:
+                raise KeyError("Field is not indexed: " + field)
+            dtype.append((field, np.float64 if index.is_numeric else object))
+            results.append(self._lookup(index, alive, rank))
+
+        state = np.empty(len(alive), dtype=dtype)
+        state['ID'] = self.ids[alive]
+        for field, values in zip(fields, results):
+            state[field] = values
+        state.flags.writeable = False
+        return state
+
+    def _lookup(self, index: AcmiFieldIndex, alive: np.ndarray, rank: int) -> np.ndarray:
+        result = np.full(len(alive), np.nan) if index.is_numeric else np.full(len(alive), None, dtype=object)
+        if not len(index.objects) or not len(alive):
+            return result
+        # alive中拥有该属性的对象，以及它们在index.objects中的位置
+        pos = np.searchsorted(index.objects, alive)
+        pos[pos == len(index.objects)] = 0
+        has_field = index.objects[pos] == alive
+        pos = pos[has_field]
+        queries = alive[has_field] * self._stride + rank
+        found = np.searchsorted(index.keys, queries, side='right') - 1
+        # 查询时刻早于该对象的第一条数据时，和get_value一样取第一条
+        found = np.maximum(found, index.starts[pos])
+        result[has_field] = index.values[found]
+        return result
+
+    def cache_clear(self):
+        self._state_at.cache_clear()
+
+
+def _nan_if_none(val: Optional[float]) -> float:
+    return np.nan if val is None else val
@@ -0,0 +1,201 @@
+"""
+空间查询：邻近对象、距离内的对象对、两条轨迹的最近接近点
+
+经纬高先转换成地心地固坐标（ECEF，单位米），t时刻的位置来自帧索引（语义与AcmiObject.get_value一致）。
+每个时刻按查询半径建立均匀网格（格子边长等于半径），只需检查相邻的27个格子；网格按 (时间, 格子边长) 缓存。
+"""
+import functools
+from typing import Optional, Callable
+
+import numpy as np
+
+from .acmi import Acmi, AcmiObject
+from .columnar import as_column
+from .snapshot import AcmiFrameIndex
+
+# WGS84椭球
+WGS84_A = 6378137.0
+WGS84_E2 = 6.69437999014e-3
+
+ACMI_POSITION_FIELDS = ('Longitude', 'Latitude', 'Altitude')
+
+# 相邻格子的偏移（含自身）
+_GRID_OFFSETS = np.array([(x, y, z) for x in (-1, 0, 1) for y in (-1, 0, 1) for z in (-1, 0, 1)], dtype=np.int64)
+
+# 格子键 (cx * ny + cy) * nz + cz 的上限，留出余量避免int64溢出
+_GRID_MAX_KEYS = float(1 << 62)
+
+
+# 经度、纬度（度）、高度（米）转换成ECEF坐标，返回形状为(n, 3)的数组
+def geodetic_to_ecef(longitude, latitude, altitude) -> np.ndarray:
+    lon = np.radians(np.asarray(longitude, dtype=np.float64))
+    lat = np.radians(np.asarray(latitude, dtype=np.float64))
+    alt = np.asarray(altitude, dtype=np.float64)
+    sin_lat = np.sin(lat)
+    cos_lat = np.cos(lat)
+    n = WGS84_A / np.sqrt(1.0 - WGS84_E2 * sin_lat * sin_lat)
+    return np.stack([
+        (n + alt) * cos_lat * np.cos(lon),
+        (n + alt) * cos_lat * np.sin(lon),
+        (n * (1.0 - WGS84_E2) + alt) * sin_lat,
+    ], axis=-1)
+
+
+class AcmiUniformGrid:
+    """Uniform hash grid over 3-D points for fixed-radius queries."""
+
+    # cell_size: 格子边长，点分布很广而格子很小、格子键会超出int64时自动加倍（格子不小于查询半径，结果不变）
+    def __init__(self, points: np.ndarray, cell_size: float):
+        self.points = points
+        if len(points):
+            extent = points.max(axis=0) - points.min(axis=0)
+            while not (cell_size > 0 and np.prod(np.floor(extent / cell_size) + 4) < _GRID_MAX_KEYS):
+                cell_size = cell_size * 2 if cell_size > 0 else 1.0
+        self.cell_size = cell_size
+        cells = np.floor(points / cell_size).astype(np.int64) if len(points) else np.empty((0, 3), dtype=np.int64)
+        self._origin = cells.min(axis=0) - 1 if len(cells) else np.zeros(3, dtype=np.int64)
+        self._shape = (cells.max(axis=0) + 2 - self._origin) if len(cells) else np.ones(3, dtype=np.int64)
+        self.cells = cells
+        keys = self._keys(cells)
+        # 按格子排序后的点序号，以及排序后的格子键
+        self.order = np.argsort(keys, kind='stable')
+        self.keys = keys[self.order]
+
+    def _keys(self, cells: np.ndarray) -> np.ndarray:
+        cells = cells - self._origin
+        return (cells[..., 0] * self._shape[1] + cells[..., 1]) * self._shape[2] + cells[..., 2]
+
+    # 距离point不超过radius的点的序号（radius不能大于cell_size）
+    def query(self, point: np.ndarray, radius: float) -> np.ndarray:
+        # 远离网格的点先在浮点数中截断，转换成整数时不会溢出
+        cell = np.clip(np.floor(point / self.cell_size), self._origin - 1, self._origin + self._shape).astype(np.int64)
+        neighbors = np.clip(cell + _GRID_OFFSETS, self._origin, self._origin + self._shape - 1)
+        keys = self._keys(neighbors)
+        starts = np.searchsorted(self.keys, keys, side='left')
+        ends = np.searchsorted(self.keys, keys, side='right')
+        candidates = np.concatenate([self.order[s:e] for s, e in zip(starts, ends)]) if len(self.keys) else \
+            np.empty(0, dtype=np.int64)
+        candidates = np.unique(candidates)
+        distances = np.linalg.norm(self.points[candidates] - point, axis=1)
+        return candidates[distances <= radius]
+
+    # 所有距离不超过radius的点对 (i, j, 距离)，i < j
+    def pairs(self, radius: float) -> tuple:
+        n = len(self.points)
+        if n < 2:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0)
+        firsts = []
+        seconds = []
+        for offset in _GRID_OFFSETS:
+            keys = self._keys(self.cells + offset)
+            starts = np.searchsorted(self.keys, keys, side='left')
+            counts = np.searchsorted(self.keys, keys, side='right') - starts
+            first = np.repeat(np.arange(n), counts)
+            # 每个点在相邻格子中的候选点
+            within = np.arange(len(first)) - np.repeat(np.cumsum(counts) - counts, counts)
+            second = self.order[np.repeat(starts, counts) + within]
+            keep = first < second
+            firsts.append(first[keep])
+            seconds.append(second[keep])
+        first = np.concatenate(firsts)
+        second = np.concatenate(seconds)
+        distances = np.linalg.norm(self.points[first] - self.points[second], axis=1)
+        keep = distances <= radius
+        return first[keep], second[keep], distances[keep]
+
+
+class AcmiSpatialIndex:
+    """Lazily built, cached per-time uniform grids over object positions."""
+
+    def __init__(self, acmi: Acmi, cache_size: int = 32):
+        self.acmi = acmi
+        self.frame_index = AcmiFrameIndex(acmi, fields=list(ACMI_POSITION_FIELDS), cache_size=cache_size)
+        self._grid = functools.lru_cache(maxsize=cache_size)(self._build_grid)
+
+    # t时刻有位置的存活对象，返回 (ID数组, ECEF坐标)
+    def positions(self, time: float) -> tuple:
+        state = self.frame_index.state_at(time)
+        altitude = np.nan_to_num(state['Altitude'], nan=0.0)
+        valid = ~(np.isnan(state['Longitude']) | np.isnan(state['Latitude']))
+        return state['ID'][valid], geodetic_to_ecef(state['Longitude'][valid], state['Latitude'][valid],
+                                                    altitude[valid])
+
+    def grid(self, time: float, cell_size: float) -> tuple:
+        return self._grid(float(time), float(cell_size))
+
+    def _build_grid(self, time: float, cell_size: float) -> tuple:
+        ids, points = self.positions(time)
+        return ids, AcmiUniformGrid(points, cell_size)
+
+    # t时刻距离obj_id不超过radius（米）的对象，返回按距离排序的[(obj_id, 距离)]，不含obj_id自身
+    def neighbors(self, obj_id: str, time: float, radius: float) -> list:
+        ids, grid = self.grid(time, radius)
+        found = np.flatnonzero(ids == obj_id)
+        if not len(found):
+            return []
+        point = grid.points[found[0]]
+        indices = grid.query(point, radius)
+        indices = indices[indices != found[0]]
+        distances = np.linalg.norm(grid.points[indices] - point, axis=1)
+        order = np.argsort(distances, kind='stable')
+        return list(zip(ids[indices[order]].tolist(), distances[order].tolist()))
+
+    # t时刻距离不超过radius（米）的所有对象对，返回按距离排序的[(obj_id, obj_id, 距离)]
+    # filter: filter(AcmiObject) -> bool，只考虑返回True的对象
+    def pairs_within(self, time: float, radius: float, filter: Optional[Callable] = None) -> list:
+        ids, grid = self.grid(time, radius)
+        if filter is not None:
+            selected = np.array([bool(filter(self.acmi.objects[obj_id])) for obj_id in ids.tolist()], dtype=bool)
+            ids = ids[selected]
+            grid = AcmiUniformGrid(grid.points[selected], radius)
+        first, second, distances = grid.pairs(radius)
+        order = np.argsort(distances, kind='stable')
+        return list(zip(ids[first[order]].tolist(), ids[second[order]].tolist(), distances[order].tolist()))
+
+    def cache_clear(self):
+        self.frame_index.cache_clear()
+        self._grid.cache_clear()
+
+
+# 两个对象的最近接近点（CPA），返回 (时刻, 距离（米）)，两者没有共同存在的时间时返回None
+# 在两者共同存在的时间内，取两者所有位置数据的时间点，对位置线性插值，相邻时间点之间按匀速直线运动求精确的最近距离
+# start/end: 限制计算的时间范围
+def closest_approach(a: AcmiObject, b: AcmiObject, start: Optional[float] = None,
+                     end: Optional[float] = None) -> Optional[tuple]:
+    bounds = []
+    for obj in (a, b):
+        if 'Longitude' not in obj.data or 'Latitude' not in obj.data:
+            return None
+        created_at = obj.created_at
+        removed_at = obj.removed_at if obj.removed_at is not None else np.inf
+        bounds.append((created_at, removed_at))
+    t0 = max(bounds[0][0], bounds[1][0], -np.inf if start is None else start)
+    t1 = min(bounds[0][1], bounds[1][1], np.inf if end is None else end)
+    times = np.unique(np.concatenate([as_column(obj.data[field]).times
+                                      for obj in (a, b) for field in ACMI_POSITION_FIELDS if field in obj.data]))
+    times = times[(times >= t0) & (times <= t1)]
+    if np.isfinite(t0):
+        times = np.union1d(times, [t0])
+    if np.isfinite(t1):
+        times = np.union1d(times, [t1])
+    if t0 > t1 or not len(times):
+        return None
+
+    positions = []
+    for obj in (a, b):
+        sampled = obj.sample(list(ACMI_POSITION_FIELDS), times, method='linear')
+        positions.append(geodetic_to_ecef(sampled[:, 0], sampled[:, 1], np.nan_to_num(sampled[:, 2], nan=0.0)))
+    relative = positions[1] - positions[0]
+    if len(times) == 1:
+        return float(times[0]), float(np.linalg.norm(relative[0]))
+
+    # 每段 d(s) = d0 + s * (d1 - d0)，s∈[0, 1]
+    d0 = relative[:-1]
+    v = relative[1:] - relative[:-1]
+    vv = np.einsum('ij,ij->i', v, v)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        s = np.where(vv > 0, -np.einsum('ij,ij->i', d0, v) / vv, 0.0)
+    s = np.clip(s, 0.0, 1.0)
+    distances = np.linalg.norm(d0 + s[:, None] * v, axis=1)
+    i = int(np.argmin(distances))
+    return float(times[i] + s[i] * (times[i + 1] - times[i])), float(distances[i])
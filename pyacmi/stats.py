@@ -0,0 +1,176 @@
+"""
+加载统计：各阶段耗时、行数、时间帧数、对象数、事件数，以及未知属性的出现次数
+
+每次load_acmi都会重新统计，结果保存在acmi.stats。默认只记录整体阶段（parse/store/cache）的耗时，
+profile=True时把解析细分为 read（读取和解压）、tokenize（切分字段）、convert（转换和保存属性值）三个阶段，
+并按属性名计数，这会让加载变慢，只用于分析性能。
+
+acmi.load_acmi('test.acmi', profile=True, progress=lambda stats: print(stats.lines, stats.current_time))
+print(acmi.stats)
+"""
+import io
+import time
+from contextlib import contextmanager
+from typing import Optional, Callable
+
+# 每读取这么多行调用一次progress
+ACMI_PROGRESS_LINES = 100000
+
+# profile/progress时被包装的Acmi方法（实例属性覆盖同名方法）
+ACMI_INSTRUMENTED_METHODS = ('split_fields', '_parse_object_property', '_parse_global_property', '_parse_lines')
+
+
+class AcmiLoadStats:
+    """Counters and phase timers collected while loading a recording."""
+
+    def __init__(self):
+        # 阶段 -> 耗时（秒）
+        self.timers = { }
+        # 整个加载的耗时（秒）
+        self.seconds = 0.0
+        # 读取的逻辑行数（续行合并为一行）和解压后的字节数
+        self.lines = 0
+        self.bytes = 0
+        self.frames = 0
+        self.objects = 0
+        self.events = 0
+        # 当前解析到的时间帧
+        self.current_time = 0.0
+        # 属性名 -> 出现次数（只在profile时统计）
+        self.object_properties = { }
+        self.global_properties = { }
+        # 未知的属性名 -> 出现次数
+        self.unknown_object_properties = { }
+        self.unknown_global_properties = { }
+        # 已经警告过的未知属性名
+        self._warned = set()
+
+    @contextmanager
+    def timer(self, phase: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(phase, time.perf_counter() - start)
+
+    def add_time(self, phase: str, seconds: float):
+        self.timers[phase] = self.timers.get(phase, 0.0) + seconds
+
+    # 还没有警告过的未知属性 (属性名, 出现次数, 是否为全局属性)，并标记为已警告
+    def new_unknown_properties(self) -> list:
+        unknown = []
+        for counts, is_global in ((self.unknown_global_properties, True), (self.unknown_object_properties, False)):
+            for prop, count in counts.items():
+                key = (prop, is_global)
+                if key not in self._warned:
+                    self._warned.add(key)
+                    unknown.append((prop, count, is_global))
+        return unknown
+
+    def json(self) -> dict:
+        return {
+            'seconds'                  : self.seconds,
+            'timers'                   : dict(self.timers),
+            'lines'                    : self.lines,
+            'bytes'                    : self.bytes,
+            'frames'                   : self.frames,
+            'objects'                  : self.objects,
+            'events'                   : self.events,
+            'current_time'             : self.current_time,
+            'object_properties'        : dict(self.object_properties),
+            'global_properties'        : dict(self.global_properties),
+            'unknown_object_properties': dict(self.unknown_object_properties),
+            'unknown_global_properties': dict(self.unknown_global_properties),
+        }
+
+    def __str__(self):
+        text = f'{self.lines} lines, {self.bytes / 1e6:.1f} MB, {self.frames} frames, {self.objects} objects, ' \
+               f'{self.events} events in {self.seconds:.3f}s'
+        if self.seconds > 0:
+            text += f' ({self.lines / self.seconds / 1e3:.1f} klines/s, {self.bytes / 1e6 / self.seconds:.1f} MB/s)'
+        for phase, seconds in self.timers.items():
+            text += f'\n  {phase:>8}: {seconds:8.3f}s'
+        return text
+
+
+def _count_names(counts: dict, fields: list):
+    for field in fields[1:]:
+        prop = field[:field.find('=')]
+        counts[prop] = counts.get(prop, 0) + 1
+
+
+# 逐行产出lines，profile时累计读取的耗时，每ACMI_PROGRESS_LINES行调用一次progress(stats)
+def _instrumented_lines(acmi, lines, profile: bool, progress: Optional[Callable]):
+    stats = acmi.stats
+    timers = stats.timers
+    perf_counter = time.perf_counter
+    lines = iter(lines)
+    next_report = stats.lines + ACMI_PROGRESS_LINES
+    while True:
+        start = perf_counter()
+        try:
+            line = next(lines)
+        except StopIteration:
+            break
+        if profile:
+            timers['read'] = timers.get('read', 0.0) + perf_counter() - start
+        if progress is not None and stats.lines >= next_report:
+            next_report = stats.lines + ACMI_PROGRESS_LINES
+            stats.current_time = acmi.timeframes[-1] if acmi.timeframes else 0.0
+            progress(stats)
+        yield line
+
+
+# 在acmi上安装计时、计数和进度回调的包装，加载结束后用uninstrument_acmi卸载
+def instrument_acmi(acmi, profile: bool = False, progress: Optional[Callable] = None):
+    stats = acmi.stats
+    timers = stats.timers
+    perf_counter = time.perf_counter
+
+    parse_lines = acmi._parse_lines
+
+    def instrumented_parse_lines(lines, cur_reftime: float = 0.0) -> float:
+        return parse_lines(_instrumented_lines(acmi, lines, profile, progress), cur_reftime)
+
+    acmi._parse_lines = instrumented_parse_lines
+    if not profile:
+        return
+
+    split_fields = acmi.split_fields
+    parse_object_property = acmi._parse_object_property
+    parse_global_property = acmi._parse_global_property
+
+    def timed_split_fields(line):
+        start = perf_counter()
+        fields = split_fields(line)
+        timers['tokenize'] = timers.get('tokenize', 0.0) + perf_counter() - start
+        return fields
+
+    def timed_parse_object_property(obj_id, timeframe: float, fields):
+        _count_names(stats.object_properties, fields)
+        start = perf_counter()
+        parse_object_property(obj_id, timeframe, fields)
+        timers['convert'] = timers.get('convert', 0.0) + perf_counter() - start
+
+    def timed_parse_global_property(fields: list, timeframe: float = 0.0):
+        _count_names(stats.global_properties, fields)
+        start = perf_counter()
+        parse_global_property(fields, timeframe)
+        timers['convert'] = timers.get('convert', 0.0) + perf_counter() - start
+
+    acmi.split_fields = timed_split_fields
+    acmi._parse_object_property = timed_parse_object_property
+    acmi._parse_global_property = timed_parse_global_property
+
+
+def uninstrument_acmi(acmi):
+    for name in ACMI_INSTRUMENTED_METHODS:
+        acmi.__dict__.pop(name, None)
+
+
+# 流已经读取的字节数（zip中的文件为解压后的字节数），无法获得时返回0
+def stream_bytes(f) -> int:
+    try:
+        return (f.buffer if isinstance(f, io.TextIOBase) else f).tell()
+    except (AttributeError, OSError, ValueError):
+        return 0
@@ -0,0 +1,137 @@
+"""
+流式读取acmi，逐条产出记录，不构建AcmiObject，内存占用与文件大小无关
+
+for record in iter_acmi('test.acmi'):
+    if isinstance(record, AcmiObjectUpdate) and 'Longitude' in record.transform:
+        ...
+"""
+import datetime
+from typing import NamedTuple, Union, Iterator
+
+from .acmi import (
+    Acmi, AcmiFileReader, open_acmi_streams, parse_transform, parse_event,
+    ACMI_NUMERIC_PROPERTIES, ACMI_TEXT_PROPERTIES, ACMI_OBJECT_ID_PROPERTIES,
+)
+from .events import AcmiEvent
+
+
+# 时间帧切换 #<time>
+class AcmiFrame(NamedTuple):
+    time: float
+
+
+# 对象属性更新
+# transform: T属性解析后的 {属性名: 值}（经纬度已加上参考点），没有T属性时为空字典
+# properties: 其他属性 {属性名: 值}，数值属性已转换成float
+class AcmiObjectUpdate(NamedTuple):
+    time: float
+    obj_id: str
+    transform: dict
+    properties: dict
+
+
+# 对象移除 -<id>
+class AcmiObjectRemoval(NamedTuple):
+    time: float
+    obj_id: str
+
+
+# 全局属性（对象0），包括文件头的FileType/FileVersion
+class AcmiGlobalProperty(NamedTuple):
+    time: float
+    name: str
+    value: Union[str, float, datetime.datetime]
+
+
+AcmiRecord = Union[AcmiFrame, AcmiObjectUpdate, AcmiObjectRemoval, AcmiGlobalProperty, AcmiEvent]
+
+
+# 转换对象属性值，与Acmi._parse_object_property一致
+def convert_object_property(prop: str, val: str):
+    if prop in ACMI_OBJECT_ID_PROPERTIES:
+        return Acmi.parse_obj_id(val)
+    elif prop in ACMI_TEXT_PROPERTIES:
+        return val
+    elif prop in ACMI_NUMERIC_PROPERTIES:
+        return float(val)
+    return val
+
+
+# 转换全局属性值，与Acmi._parse_global_property一致
+def convert_global_property(prop: str, val: str):
+    if prop == "ReferenceTime" or prop == "RecordingTime":
+        return Acmi.strptime(val)
+    elif prop in ("ReferenceLongitude", "ReferenceLatitude", "PlaybackDelay"):
+        return float(val)
+    return val
+
+
+# 流式读取acmi文件（支持zip压缩），逐条产出AcmiRecord
+def iter_acmi(filepath: str) -> Iterator[AcmiRecord]:
+    for f in open_acmi_streams(filepath, binary=True):
+        yield from iter_acmi_stream(f)
+
+
+# 从文本流中逐条产出AcmiRecord
+def iter_acmi_stream(fh) -> Iterator[AcmiRecord]:
+    ar = AcmiFileReader(fh)
+    rawline = next(ar)
+    if not rawline.startswith('FileType='):
+        raise RuntimeError("ACMI file doesn't start with FileType.")
+    yield AcmiGlobalProperty(0.0, 'FileType', rawline[len('FileType='):].strip())
+
+    rawline = next(ar)
+    if not rawline.startswith('FileVersion='):
+        raise RuntimeError("ACMI file missing FileVersion.")
+    file_version = float(rawline[len('FileVersion='):].strip())
+    if file_version < 2.1:
+        raise RuntimeError("Unsupported file version: {v}".format(v=file_version))
+    yield AcmiGlobalProperty(0.0, 'FileVersion', file_version)
+
+    reference_longitude = 0
+    reference_latitude = 0
+    cur_reftime = 0.0
+    split_fields = Acmi.split_fields
+    parse_obj_id = Acmi.parse_obj_id
+    for rawline in ar:
+        line = rawline.strip()
+        if not line or line.startswith('//'):
+            continue
+
+        if line.startswith('#'):
+            try:
+                cur_reftime = float(line[1:])
+            except Exception:
+                continue
+            yield AcmiFrame(cur_reftime)
+            continue
+
+        if line.startswith('-'):
+            yield AcmiObjectRemoval(cur_reftime, parse_obj_id(line[1:]))
+            continue
+
+        fields = split_fields(line)
+        obj_id = parse_obj_id(fields[0])
+        if obj_id == '0' or obj_id == 0:
+            for field in fields[1:]:
+                (prop, val) = field.split('=', 1)
+                if prop == 'Event':
+                    name, obj_ids, text, params = parse_event(val)
+                    yield AcmiEvent(cur_reftime, name, [parse_obj_id(i) for i in obj_ids], text, params)
+                    continue
+                val = convert_global_property(prop, val)
+                if prop == "ReferenceLongitude":
+                    reference_longitude = val
+                elif prop == "ReferenceLatitude":
+                    reference_latitude = val
+                yield AcmiGlobalProperty(cur_reftime, prop, val)
+        else:
+            transform = { }
+            properties = { }
+            for field in fields[1:]:
+                (prop, val) = field.split('=', 1)
+                if prop == 'T':
+                    transform.update(parse_transform(val, reference_longitude, reference_latitude))
+                else:
+                    properties[prop] = convert_object_property(prop, val)
+            yield AcmiObjectUpdate(cur_reftime, obj_id, transform, properties)
@@ -0,0 +1,422 @@
+"""
+写出acmi文件（Tacview 2.1格式），支持直接写入zip压缩的.zip.acmi
+
+AcmiWriter记录每个对象上一次写出的值，只写出变化的属性；T属性中没有变化的分量留空，并按变化的分量选择最短的写法。
+既可以逐条写入iter_acmi产出的记录，也可以用write_acmi写出整个Acmi。
+
+with AcmiWriter('out.zip.acmi') as writer:
+    for record in iter_acmi('test.acmi'):
+        writer.write_record(record)
+"""
+import datetime
+import math
+import os
+import zipfile
+from typing import Optional, Iterable
+
+import numpy as np
+
+from .acmi import Acmi, AcmiObject, ACMI_TRANSFORM_FIELDS, ACMI_OBJECT_ID_PROPERTIES, format_obj_id
+from .columnar import as_column
+from .stream import AcmiFrame, AcmiObjectUpdate, AcmiObjectRemoval, AcmiGlobalProperty, AcmiEvent
+
+ACMI_WRITER_FILE_TYPE = 'text/acmi/tacview'
+ACMI_WRITER_FILE_VERSION = '2.1'
+
+# T属性各分量，按最长写法的顺序
+ACMI_TRANSFORM_ORDER = ACMI_TRANSFORM_FIELDS[9]
+
+# 经纬度偏移依次尝试的小数位数
+ACMI_COORDINATE_DECIMALS = range(6, 16)
+
+# 写出Acmi时的全局属性 属性名 -> Acmi的属性
+ACMI_GLOBAL_PROPERTIES = {
+    'DataSource'        : 'data_source',
+    'DataRecorder'      : 'data_recorder',
+    'ReferenceTime'     : 'reference_time',
+    'RecordingTime'     : 'recording_time',
+    'Author'            : 'author',
+    'Title'             : 'title',
+    'Category'          : 'category',
+    'Briefing'          : 'briefing',
+    'Debriefing'        : 'debriefing',
+    'Comments'          : 'comments',
+    'ReferenceLongitude': 'reference_longitude',
+    'ReferenceLatitude' : 'reference_latitude',
+}
+
+
+# 数值的最短表示，整数不带小数点
+def format_number(val: float) -> str:
+    text = repr(float(val))
+    if text.endswith('.0'):
+        return text[:-2]
+    return text
+
+
+# 转义文本中的反斜杠和逗号，换行写成续行
+def escape_text(val: str) -> str:
+    if '\\' in val:
+        val = val.replace('\\', '\\\\')
+    if ',' in val:
+        val = val.replace(',', '\\,')
+    if '\n' in val:
+        val = val.replace('\n', '\\\n')
+    return val
+
+
+# 批量格式化数值，同format_number
+def format_numbers(values: np.ndarray) -> list:
+    texts = list(map(repr, values.tolist()))
+    integral = np.flatnonzero((values == np.trunc(values)) & (np.abs(values) < 1e15))
+    for i, val in zip(integral.tolist(), values[integral].astype(np.int64).tolist()):
+        texts[i] = str(val)
+    return texts
+
+
+def format_time(val: datetime.datetime) -> str:
+    if val.microsecond:
+        return val.strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+    return val.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def format_value(val) -> str:
+    if isinstance(val, datetime.datetime):
+        return format_time(val)
+    if isinstance(val, (float, int, np.floating)):
+        return format_number(val)
+    return escape_text(str(val))
+
+
+# 经纬度相对参考点的偏移，取读取时 参考点 + 偏移 能还原出原值的最短小数
+def relative_coordinate(values: np.ndarray, reference: float) -> np.ndarray:
+    exact = values - reference
+    restored = exact + reference
+    wrong = restored != values
+    if wrong.any():
+        exact[wrong] = np.nextafter(exact[wrong], np.where(restored[wrong] < values[wrong], np.inf, -np.inf))
+    offsets = exact.copy()
+    pending = np.ones(len(values), dtype=bool)
+    for decimals in ACMI_COORDINATE_DECIMALS:
+        rounded = np.round(exact[pending], decimals)
+        ok = rounded + reference == values[pending]
+        index = np.flatnonzero(pending)[ok]
+        offsets[index] = rounded[ok]
+        pending[index] = False
+        if not pending.any():
+            break
+    return offsets
+
+
+def _relative_coordinate(val: float, reference: float) -> float:
+    for decimals in ACMI_COORDINATE_DECIMALS:
+        rounded = round(val - reference, decimals)
+        if rounded + reference == val:
+            return rounded
+    offset = val - reference
+    restored = offset + reference
+    if restored != val:
+        offset = math.nextafter(offset, math.inf if restored < val else -math.inf)
+    return offset
+
+
+# 按变化的分量选择最短的T写法，返回T的值（不含T=）
+# components: { 属性名: 已格式化的值 }
+def format_transform(components: dict) -> str:
+    has_orientation = 'Roll' in components or 'Pitch' in components or 'Yaw' in components
+    has_uv = 'U' in components or 'V' in components
+    if 'Heading' in components or (has_orientation and has_uv):
+        names = ACMI_TRANSFORM_FIELDS[9]
+    elif has_orientation:
+        names = ACMI_TRANSFORM_FIELDS[6]
+    elif has_uv:
+        names = ACMI_TRANSFORM_FIELDS[5]
+    else:
+        names = ACMI_TRANSFORM_FIELDS[3]
+    return '|'.join([components.get(name, '') for name in names])
+
+
+class AcmiWriter:
+    """Streaming ACMI writer that only emits changed properties."""
+
+    # filepath: 输出文件，以.zip结尾或.zip.acmi结尾时写入zip压缩文件
+    # buffer_size: 缓冲的字符数，超过后整块写入文件
+    def __init__(self, filepath: str, buffer_size: int = 1 << 20, compress: Optional[bool] = None):
+        self.filepath = filepath
+        self.buffer_size = buffer_size
+        if compress is None:
+            compress = filepath.endswith('.zip.acmi') or filepath.endswith('.zip')
+        self.compress = compress
+
+        self.reference_longitude = 0.0
+        self.reference_latitude = 0.0
+        # obj_id -> { 属性名: 上一次写出的值（已格式化） }
+        self.last_values = { }
+        self._buffer = []
+        self._buffered = 0
+        self._zip = None
+
+        dirname = os.path.dirname(filepath)
+        if dirname and not os.path.exists(dirname):
+            os.makedirs(dirname)
+        if compress:
+            self._zip = zipfile.ZipFile(filepath, 'w', compression=zipfile.ZIP_DEFLATED)
+            self._fh = self._zip.open(self._member_name(filepath), 'w')
+        else:
+            self._fh = open(filepath, 'wb')
+        self._fh.write(b'\xef\xbb\xbf')
+        self.write_line('FileType=' + ACMI_WRITER_FILE_TYPE)
+        self.write_line('FileVersion=' + ACMI_WRITER_FILE_VERSION)
+
+    @staticmethod
+    def _member_name(filepath: str) -> str:
+        name = os.path.basename(filepath)
+        for suffix in ('.zip.acmi', '.zip', '.acmi'):
+            if name.endswith(suffix):
+                name = name[:-len(suffix)]
+                break
+        return name + '.txt.acmi'
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def write_line(self, line: str):
+        self._buffer.append(line)
+        self._buffered += len(line) + 1
+        if self._buffered >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if self._buffer:
+            self._buffer.append('')
+            self._fh.write('\n'.join(self._buffer).encode('utf-8'))
+            self._buffer = []
+            self._buffered = 0
+
+    def close(self):
+        if self._fh is None:
+            return
+        self.flush()
+        self._fh.close()
+        self._fh = None
+        if self._zip is not None:
+            self._zip.close()
+            self._zip = None
+
+    # 时间帧 #<time>
+    def write_frame(self, time: float):
+        self.write_line('#' + format_number(time))
+
+    # 全局属性，每个属性单独一行
+    def write_global(self, name: str, val):
+        if name == 'ReferenceLongitude':
+            self.reference_longitude = float(val)
+        elif name == 'ReferenceLatitude':
+            self.reference_latitude = float(val)
+        self.write_line('0,' + name + '=' + format_value(val))
+
+    # 事件 0,Event=EventType|ObjectId|...|EventText
+    def write_event(self, name: str, obj_ids: Optional[list] = None, text: str = '', params: Optional[dict] = None):
+        if params:
+            parts = [name] + [key + ':' + str(val) for key, val in params.items()]
+        else:
+            parts = [name] + [format_obj_id(obj_id) for obj_id in obj_ids or []] + [text]
+        self.write_line('0,Event=' + escape_text('|'.join(parts)))
+
+    # 对象属性更新，只写出和上一次不同的属性
+    # transform: { 属性名: 值 }，经纬度为绝对值
+    # properties: { 属性名: 值 }
+    def write_object(self, obj_id: str, transform: Optional[dict] = None, properties: Optional[dict] = None):
+        last = self.last_values.get(obj_id)
+        if last is None:
+            last = self.last_values[obj_id] = { }
+        fields = []
+        if transform:
+            components = { }
+            for name, val in transform.items():
+                if name == 'Longitude':
+                    val = _relative_coordinate(val, self.reference_longitude)
+                elif name == 'Latitude':
+                    val = _relative_coordinate(val, self.reference_latitude)
+                text = format_number(val)
+                if last.get(name) != text:
+                    last[name] = text
+                    components[name] = text
+            if components:
+                fields.append('T=' + format_transform(components))
+        if properties:
+            for name, val in properties.items():
+                text = format_obj_id(val) if name in ACMI_OBJECT_ID_PROPERTIES else format_value(val)
+                if last.get(name) != text:
+                    last[name] = text
+                    fields.append(name + '=' + text)
+        if fields:
+            self.write_line(format_obj_id(obj_id) + ',' + ','.join(fields))
+
+    # 移除对象 -<id>
+    def write_removal(self, obj_id: str):
+        self.last_values.pop(obj_id, None)
+        self.write_line('-' + format_obj_id(obj_id))
+
+    # 写入一条iter_acmi产出的记录，FileType/FileVersion已经写在文件头，忽略
+    def write_record(self, record):
+        if isinstance(record, AcmiObjectUpdate):
+            self.write_object(record.obj_id, record.transform, record.properties)
+        elif isinstance(record, AcmiFrame):
+            self.write_frame(record.time)
+        elif isinstance(record, AcmiObjectRemoval):
+            self.write_removal(record.obj_id)
+        elif isinstance(record, AcmiEvent):
+            self.write_event(record.name, record.obj_ids, record.text, record.params)
+        elif isinstance(record, AcmiGlobalProperty):
+            if record.name != 'FileType' and record.name != 'FileVersion':
+                self.write_global(record.name, record.value)
+
+    def write_records(self, records: Iterable):
+        for record in records:
+            self.write_record(record)
+
+
+# 写出整个Acmi，重新加载后得到等价的Acmi
+def write_acmi(acmi: Acmi, filepath: str, buffer_size: int = 1 << 20, compress: Optional[bool] = None):
+    with AcmiWriter(filepath, buffer_size=buffer_size, compress=compress) as writer:
+        for name, attr in ACMI_GLOBAL_PROPERTIES.items():
+            val = getattr(acmi, attr)
+            if val is not None and val != '':
+                writer.write_global(name, val)
+        if acmi.playback_delay:
+            writer.write_global('PlaybackDelay', acmi.playback_delay)
+
+        # 每个对象的 (时间, 行) 按时间、对象出现的顺序合并
+        times = []
+        orders = []
+        lines = []
+        removals = { }
+        for i, obj in enumerate(acmi.objects.values()):
+            obj_times, obj_lines = _object_lines(obj, writer.reference_longitude, writer.reference_latitude)
+            times.append(obj_times)
+            orders.append(np.full(len(obj_times), i, dtype=np.int64))
+            lines.extend(obj_lines)
+            if obj.removed_at is not None:
+                removals.setdefault(obj.removed_at, []).append(obj.id)
+        times = np.concatenate(times) if times else np.empty(0)
+        orders = np.concatenate(orders) if orders else np.empty(0, dtype=np.int64)
+        order = np.lexsort((orders, times))
+        times = times[order].tolist()
+
+        events = list(acmi.events)
+        event_pos = 0
+
+        # 第一个时间帧之前的数据（时间为0）写在文件头之后
+        timeframes = sorted(set(acmi.timeframes).union(removals))
+        pos = 0
+        if not acmi.timeframes or acmi.timeframes[0] > 0:
+            while pos < len(times) and times[pos] <= 0:
+                writer.write_line(lines[order[pos]])
+                pos += 1
+            while event_pos < len(events) and events[event_pos].time <= 0:
+                writer.write_event(*events[event_pos][1:])
+                event_pos += 1
+        for frame in timeframes:
+            # 不在timeframes中的数据写在它之前的时间帧里
+            writer.write_frame(frame)
+            while pos < len(times) and times[pos] <= frame:
+                writer.write_line(lines[order[pos]])
+                pos += 1
+            while event_pos < len(events) and events[event_pos].time <= frame:
+                writer.write_event(*events[event_pos][1:])
+                event_pos += 1
+            for obj_id in removals.get(frame, ()):
+                writer.write_line('-' + format_obj_id(obj_id))
+        while pos < len(times) or event_pos < len(events):
+            frame = min(times[pos] if pos < len(times) else np.inf,
+                        events[event_pos].time if event_pos < len(events) else np.inf)
+            writer.write_frame(frame)
+            while pos < len(times) and times[pos] == frame:
+                writer.write_line(lines[order[pos]])
+                pos += 1
+            while event_pos < len(events) and events[event_pos].time == frame:
+                writer.write_event(*events[event_pos][1:])
+                event_pos += 1
+
+
+# 一个对象的所有数据行，返回 (时间数组, 行列表)，只写出变化的属性
+def _object_lines(obj: AcmiObject, reference_longitude: float, reference_latitude: float):
+    columns = { }
+    for field, timeline in obj.data.items():
+        if field != 'Tags' and field != 'Type' and timeline is not None and len(timeline):
+            columns[field] = as_column(timeline)
+    created_at = obj.created_at
+    if created_at is None:
+        return np.empty(0), []
+    times = np.unique(np.concatenate([column.times for column in columns.values()] + [np.array([created_at])]))
+
+    # 每个属性变化的时间点（在times中的位置）和已格式化的值
+    transform = { }
+    properties = { }
+    for field, column in columns.items():
+        values = column.decoded_values()
+        changed = np.ones(len(values), dtype=bool)
+        if len(values) > 1:
+            changed[1:] = values[1:] != values[:-1]
+        pos = np.searchsorted(times, column.times[changed])
+        values = values[changed]
+        if field in ACMI_TRANSFORM_ORDER:
+            values = values.astype(np.float64)
+            if field == 'Longitude':
+                values = relative_coordinate(values, reference_longitude)
+            elif field == 'Latitude':
+                values = relative_coordinate(values, reference_latitude)
+            transform[field] = (pos, format_numbers(values))
+        elif field in ACMI_OBJECT_ID_PROPERTIES:
+            properties[field] = (pos, [field + '=' + format_obj_id(val) for val in values.tolist()])
+        elif values.dtype == np.float64:
+            properties[field] = (pos, [field + '=' + text for text in format_numbers(values)])
+        else:
+            properties[field] = (pos, [field + '=' + format_value(val) for val in values.tolist()])
+
+    lines = [[] for _ in range(len(times))]
+    if transform:
+        _transform_lines(transform, lines)
+    if obj.tags:
+        lines[int(np.searchsorted(times, created_at))].append('Type=' + escape_text(obj.tags))
+    for field, (positions, texts) in properties.items():
+        for i, text in zip(positions.tolist(), texts):
+            lines[i].append(text)
+    # 属性都没有变化的时间点不写
+    keep = np.array([len(fields) > 0 for fields in lines], dtype=bool)
+    prefix = format_obj_id(obj.id) + ','
+    return times[keep], [prefix + ','.join(fields) for fields in lines if fields]
+
+
+# 按每个时间点变化的分量选择T的写法（同format_transform），把T=...加到lines中
+def _transform_lines(transform: dict, lines: list):
+    n = len(lines)
+    components = { }
+    present = { }
+    for field in ACMI_TRANSFORM_ORDER:
+        texts = np.full(n, '', dtype=object)
+        mask = np.zeros(n, dtype=bool)
+        if field in transform:
+            pos, values = transform[field]
+            texts[pos] = values
+            mask[pos] = True
+        components[field] = texts
+        present[field] = mask
+    has_any = np.logical_or.reduce([present[field] for field in ACMI_TRANSFORM_ORDER])
+    has_orientation = present['Roll'] | present['Pitch'] | present['Yaw']
+    has_uv = present['U'] | present['V']
+    layout = np.full(n, 3)
+    layout[has_uv] = 5
+    layout[has_orientation] = 6
+    layout[present['Heading'] | (has_orientation & has_uv)] = 9
+    for count, names in ACMI_TRANSFORM_FIELDS.items():
+        rows = np.flatnonzero(has_any & (layout == count))
+        if not len(rows):
+            continue
+        parts = [components[name][rows].tolist() for name in names]
+        for i, values in zip(rows.tolist(), zip(*parts)):
+            lines[i].append('T=' + '|'.join(values))
@@ -23,6 +23,7 @@ setup(
             'Programming Language :: Python :: 3 :: Only'
         ],
         keywords='acmi tacview',
-        install_requires=['sortedcontainers', 'tqdm'],
+        install_requires=['sortedcontainers', 'tqdm', 'numpy'],
+        extras_require={ 'parquet': ['pyarrow'], 'pandas': ['pandas'] },
         packages=['pyacmi'],
 )
@@ -0,0 +1,111 @@
+import os
+
+import pytest
+
+from pyacmi import Acmi
+from pyacmi.cache import cache_path_for
+
+RECORDING = """FileType=text/acmi/tacview
+FileVersion=2.1
+0,ReferenceTime=2024-03-01T08:00:00Z
+0,Title=Cache test
+0,Briefing=Line one.\\
+Line two.
+0,ReferenceLongitude=120
+#0
+101,T=0.1|0.2|1000|0|0|90,Type=Air+FixedWing,Name=F-16C_50,Coalition=Allies,Color=Blue
+102,T=0.3|0.4|2000,Type=Weapon+Missile,Name=AIM-120C,Parent=101,LockedTarget=103
+103,T=0.5|0.6|3000,Type=Air+FixedWing,Name=Su-27,Coalition=Enemies,Color=Red
+#1
+101,T=0.11|0.2|1000||5|,IAS=200,Color=Blue
+102,T=0.32|0.41|1950
+0,Event=Message|101|Fox three
+#2.5
+101,T=0.12|0.2|1100||10|,IAS=210,Color=Blue
+102,T=0.34|0.42|1900
+-102
+0,Event=Destroyed|102|
+#3
+101,T=0.13|0.2|1100,IAS=210
+103,T=0.5|0.6|3000,Color=Red
+"""
+
+MODES = [
+    dict(),
+    dict(columnar=True),
+    dict(columnar=True, compact=True),
+    dict(columnar=True, strict=True),
+    dict(compact=True, strict=True),
+]
+
+
+@pytest.fixture
+def recording(tmp_path):
+    path = tmp_path / 'cache.txt.acmi'
+    path.write_text(RECORDING, encoding='utf-8', newline='\n')
+    return str(path)
+
+
+def _state(acmi: Acmi) -> dict:
+    objects = { }
+    for obj_id, obj in acmi.objects.items():
+        data = { field: list(timeline.items()) for field, timeline in obj.data.items() }
+        objects[obj_id] = (obj.removed_at, obj.tags, obj.name, obj.type_mask, data)
+    return {
+        'timeframes': list(acmi.timeframes),
+        'globals'   : (acmi.title, acmi.briefing, acmi.reference_time, acmi.reference_longitude),
+        'fields'    : set(acmi.object_fields),
+        'events'    : [tuple(event[:2]) + (tuple(event.obj_ids), event.text) for event in acmi.events],
+        'objects'   : objects,
+    }
+
+
+def _load(filepath: str, mode: dict, **kwargs) -> Acmi:
+    acmi = Acmi(**mode)
+    acmi.load_acmi(filepath, **kwargs)
+    return acmi
+
+
+@pytest.mark.parametrize('mode', MODES)
+@pytest.mark.parametrize('mmap', [False, True])
+def test_cache_round_trip(recording, mode, mmap):
+    expected = _state(_load(recording, mode))
+    assert _state(_load(recording, mode, cache=True, mmap=mmap)) == expected
+    assert os.path.exists(cache_path_for(recording, compact=mode.get('compact', False),
+                                         strict=mode.get('strict', False)))
+
+    cached = _load(recording, mode, cache=True, mmap=mmap)
+    assert 'parse' not in cached.stats.timers
+    assert _state(cached) == expected
+
+
+def test_modes_use_separate_caches(recording):
+    for mode in MODES:
+        _load(recording, mode, cache=True)
+    for mode in MODES:
+        assert _state(_load(recording, mode, cache=True)) == _state(_load(recording, mode))
+
+
+@pytest.mark.parametrize('change', ['size', 'mtime'])
+def test_stale_cache_is_rebuilt(recording, change):
+    _load(recording, { }, cache=True)
+    cache_path = cache_path_for(recording)
+    if change == 'size':
+        with open(recording, 'a', encoding='utf-8', newline='\n') as f:
+            f.write('#4\n101,T=0.14|0.2|1200\n')
+        # 修改时间不变，只有大小变化
+        stat = os.stat(cache_path)
+        os.utime(recording, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    else:
+        with open(recording, 'r+', encoding='utf-8', newline='\n') as f:
+            text = f.read().replace('IAS=210', 'IAS=220')
+            f.seek(0)
+            f.write(text)
+        # 大小不变，缓存比acmi文件旧
+        stat = os.stat(recording)
+        os.utime(cache_path, ns=(stat.st_atime_ns, stat.st_mtime_ns - 10 ** 9))
+
+    acmi = _load(recording, { }, cache=True)
+    assert 'parse' in acmi.stats.timers
+    assert _state(acmi) == _state(_load(recording, { }))
+    assert 'parse' not in _load(recording, { }, cache=True).stats.timers
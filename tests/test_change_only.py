@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from pyacmi import Acmi
+
+RECORDING = """FileType=text/acmi/tacview
+FileVersion=2.1
+0,ReferenceTime=2024-03-01T08:00:00Z
+#0
+101,T=120|30|1000,Type=Air+FixedWing,Name=F-16C_50,Color=Blue
+#1
+101,T=120|30|1000,Color=Blue
+#2
+101,T=120|30|1000,Color=Blue
+#3
+101,T=120|30|1000,Color=Red
+#4
+101,T=120.1|30|2000,Color=Red
+#5
+101,T=120.1|30|2000
+"""
+
+
+@pytest.fixture
+def recording(tmp_path):
+    path = tmp_path / 'runs.txt.acmi'
+    path.write_text(RECORDING, encoding='utf-8')
+    return str(path)
+
+
+def _load(filepath: str, **kwargs) -> Acmi:
+    acmi = Acmi(**kwargs)
+    acmi.load_acmi(filepath, cache=False)
+    return acmi
+
+
+@pytest.mark.parametrize('columnar', [False, True])
+def test_linear_sample_matches_strict(recording, columnar):
+    times = np.arange(0.0, 5.5, 0.25)
+    fields = ['Altitude', 'Longitude']
+    default = _load(recording, columnar=columnar).objects['101'].sample(fields, times, method='linear')
+    strict = _load(recording, columnar=columnar, strict=True).objects['101'].sample(fields, times, method='linear')
+    np.testing.assert_array_equal(default, strict)
+    assert default[times.tolist().index(2.5), 0] == 1000.0
+    assert default[times.tolist().index(3.5), 0] == 1500.0
+
+
+@pytest.mark.parametrize('columnar', [False, True])
+def test_runs_keep_first_and_last_sample(recording, columnar):
+    obj = _load(recording, columnar=columnar).objects['101']
+    assert [t for t, _ in obj.data['Altitude'].items()] == [0.0, 3.0, 4.0, 5.0]
+    assert obj.intervals('Color') == [('Blue', 0.0, 3.0), ('Red', 3.0, None)]
+    assert obj.intervals('Altitude') == [(1000.0, 0.0, 4.0), (2000.0, 4.0, None)]
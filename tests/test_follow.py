@@ -0,0 +1,95 @@
+import numpy as np
+import pytest
+
+from pyacmi import Acmi
+
+HEADER = """FileType=text/acmi/tacview
+FileVersion=2.1
+0,ReferenceTime=2024-03-01T08:00:00Z
+"""
+
+
+def _append(path, text: str):
+    with open(path, 'a', encoding='utf-8', newline='\n') as f:
+        f.write(text)
+
+
+@pytest.fixture
+def recording(tmp_path):
+    path = tmp_path / 'growing.txt.acmi'
+    path.write_text('\ufeff' + HEADER, encoding='utf-8', newline='\n')
+    return path
+
+
+@pytest.mark.parametrize('columnar', [False, True])
+def test_refresh_reports_updates_and_removals(recording, columnar):
+    acmi = Acmi(columnar=columnar)
+    changes = acmi.follow(str(recording))
+    assert changes.frames == [] and changes.updated == set()
+
+    _append(recording, '#0\n101,T=120|30|1000,Type=Air+FixedWing,Name=F-16C_50\n102,T=121|31|2000,Name=Su-27\n')
+    changes = acmi.refresh()
+    assert changes.frames == [0.0]
+    assert changes.updated == { '101', '102' }
+    assert changes.removed == set()
+
+    _append(recording, '#1\n101,T=120.1|30|1100\n-102\n')
+    changes = acmi.refresh()
+    assert changes.time == 1.0
+    assert changes.updated == { '101' }
+    assert changes.removed == { '102' }
+    assert acmi.objects['101'].get_value('Altitude') == 1100.0
+    assert acmi.objects['102'].removed_at == 1.0
+
+
+def test_partial_trailing_line(recording):
+    acmi = Acmi()
+    acmi.follow(str(recording))
+    _append(recording, '#0\n101,T=120|30|1000,Name=F-16C_50\n101,T=120|30|10')
+    changes = acmi.refresh()
+    assert changes.updated == { '101' }
+    assert acmi.objects['101'].get_value('Altitude') == 1000.0
+
+    _append(recording, '50\n')
+    changes = acmi.refresh()
+    assert changes.updated == { '101' }
+    assert acmi.objects['101'].get_value('Altitude') == 1050.0
+
+
+def test_continuation_line_at_eof(recording):
+    acmi = Acmi()
+    acmi.follow(str(recording))
+    _append(recording, '#0\n0,Briefing=Line one.\\\n')
+    acmi.refresh()
+    assert acmi.briefing is None
+
+    _append(recording, 'Line two.\n0,Comments=C:\\\\dir\\\\\n')
+    acmi.refresh()
+    assert acmi.briefing == 'Line one.\nLine two.'
+    assert acmi.comments == 'C:\\dir\\'
+
+
+@pytest.mark.parametrize('columnar', [False, True])
+def test_follow_matches_load(recording, columnar):
+    frames = []
+    for frame in range(20):
+        lines = ['#{t}'.format(t=frame * 0.5)]
+        for obj_id in (0x101, 0x102):
+            lines.append('{i:x},T={lon}|30|{alt},Throttle={thr}'.format(i=obj_id, lon=120 + frame * 0.01,
+                                                                       alt=1000 + (frame // 4) * 100,
+                                                                       thr=0.5 if frame < 10 else 1.0))
+        frames.append('\n'.join(lines) + '\n')
+    acmi = Acmi(columnar=columnar)
+    acmi.follow(str(recording))
+    for text in frames:
+        _append(recording, text)
+        acmi.refresh()
+    loaded = Acmi(columnar=columnar)
+    loaded.load_acmi(str(recording))
+
+    times = np.arange(0, 10.25, 0.25)
+    fields = ['Longitude', 'Altitude', 'Throttle']
+    assert acmi.timeframes == loaded.timeframes
+    for obj_id in ('101', '102'):
+        np.testing.assert_array_equal(acmi.objects[obj_id].sample(fields, times, method='linear'),
+                                      loaded.objects[obj_id].sample(fields, times, method='linear'))
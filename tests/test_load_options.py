@@ -0,0 +1,49 @@
+import pytest
+
+from pyacmi import Acmi
+
+RECORDING = """FileType=text/acmi/tacview
+FileVersion=2.1
+0,ReferenceTime=2024-03-01T08:00:00Z
+#0
+101,T=120|30|1000,Type=Air+FixedWing,Name=F-16C_50
+#1
+101,T=120|30|2000
+"""
+
+
+@pytest.fixture
+def recording(tmp_path):
+    path = tmp_path / 'options.txt.acmi'
+    path.write_text(RECORDING, encoding='utf-8')
+    return str(path)
+
+
+@pytest.mark.parametrize('kwargs', [
+    dict(mmap=True),
+    dict(index=True),
+    dict(workers=2, fields=['T']),
+    dict(workers=2, time_range=(0, 1)),
+    dict(cache=True, object_ids=['101']),
+])
+def test_unsupported_combinations(recording, kwargs):
+    with pytest.raises(RuntimeError):
+        Acmi(columnar=True).load_acmi(recording, **kwargs)
+
+
+def test_filters_with_single_worker(recording):
+    acmi = Acmi()
+    acmi.load_acmi(recording, workers=1, fields=['T'])
+    assert acmi.objects['101'].get_value('Altitude', 1) == 2000.0
+
+
+@pytest.mark.parametrize('compact, object_ids', [
+    (False, ['101']),
+    (False, [0x101]),
+    (True, ['101']),
+    (True, [0x101]),
+])
+def test_object_ids_filter(recording, compact, object_ids):
+    acmi = Acmi(compact=compact)
+    acmi.load_acmi(recording, object_ids=object_ids)
+    assert list(acmi.objects) == [0x101 if compact else '101']
@@ -0,0 +1,82 @@
+import pytest
+
+from pyacmi import Acmi
+import pyacmi.parallel
+
+
+def _recording_text(late_reference: bool = False, frames: int = 200) -> str:
+    lines = ['FileType=text/acmi/tacview', 'FileVersion=2.1', '0,ReferenceTime=2024-03-01T08:00:00Z',
+             '0,ReferenceLongitude=120', '0,ReferenceLatitude=30']
+    for t in range(frames):
+        lines.append('#{t}'.format(t=t))
+        if t == 0:
+            # Type/Name只出现在第一个分段
+            lines.append('101,T=0.1|0.2|1000,Type=Air+FixedWing,Name=F-16C_50,Coalition=Allies')
+            lines.append('102,T=0.3|0.4|2000,Type=Air+FixedWing,Name=Su-27,Coalition=Enemies')
+        lines.append('101,T={lon:.3f}|0.2|{alt},IAS={ias}'.format(lon=0.1 + t * 0.001, alt=1000 + (t // 9) * 10,
+                                                                 ias=200 + t % 5))
+        lines.append('102,T=0.3|{lat:.3f}|2000,Throttle={thr}'.format(lat=0.4 + t * 0.001, thr=0.5 if t < 120 else 1))
+        if t % 40 == 5:
+            lines.append('{i:x},T=0.2|0.3|1500,Type=Weapon+Missile,Name=AIM-120C,Parent=101'.format(i=0x200 + t))
+        if t % 40 == 25:
+            lines.append('-{i:x}'.format(i=0x200 + t - 20))
+            lines.append('0,Event=Destroyed|{i:x}|'.format(i=0x200 + t - 20))
+        if late_reference and t == 100:
+            lines.append('0,ReferenceLongitude=121')
+    return '\n'.join(lines) + '\n'
+
+
+def _state(acmi: Acmi) -> dict:
+    objects = { }
+    for obj_id, obj in acmi.objects.items():
+        data = { field: list(timeline.items()) for field, timeline in obj.data.items() }
+        objects[obj_id] = (obj.removed_at, obj.tags, obj.name, obj.type_mask, data)
+    return {
+        'timeframes': list(acmi.timeframes),
+        'globals'   : (acmi.reference_longitude, acmi.reference_latitude),
+        'events'    : [(event.time, event.name, tuple(event.obj_ids)) for event in acmi.events],
+        'objects'   : objects,
+    }
+
+
+def _load(filepath: str, workers=None, **kwargs) -> Acmi:
+    acmi = Acmi(**kwargs)
+    acmi.load_acmi(filepath, workers=workers)
+    return acmi
+
+
+@pytest.mark.parametrize('mode', [dict(), dict(columnar=True), dict(columnar=True, strict=True),
+                                  dict(columnar=True, compact=True)])
+def test_parallel_matches_serial(tmp_path, monkeypatch, mode):
+    path = tmp_path / 'parallel.txt.acmi'
+    path.write_text(_recording_text(), encoding='utf-8', newline='\n')
+    pieces = []
+    split_frames = pyacmi.parallel._split_frames
+
+    def recording_split_frames(*args):
+        pieces.extend(split_frames(*args))
+        return pieces
+
+    monkeypatch.setattr(pyacmi.parallel, '_split_frames', recording_split_frames)
+    parallel = _load(str(path), workers=2, **mode)
+    # 后面的分段中没有Type/Name
+    assert len(pieces) > 1 and 'Name=F-16C_50' not in pieces[-1]
+    serial = _load(str(path), **mode)
+    assert _state(parallel) == _state(serial)
+    obj = parallel.objects[0x101 if parallel.compact else '101']
+    assert obj.name == 'F-16C_50'
+    assert obj.get_value('Altitude') == serial.objects[0x101 if serial.compact else '101'].get_value('Altitude')
+
+
+def test_late_reference_falls_back_to_serial(tmp_path, monkeypatch):
+    path = tmp_path / 'late_reference.txt.acmi'
+    path.write_text(_recording_text(late_reference=True), encoding='utf-8', newline='\n')
+    serial = _load(str(path), columnar=True)
+
+    def no_pool(*args, **kwargs):
+        raise AssertionError('a late Reference* global must not be parsed in parallel')
+
+    monkeypatch.setattr(pyacmi.parallel, 'ProcessPoolExecutor', no_pool)
+    parallel = _load(str(path), workers=2, columnar=True)
+    assert parallel.reference_longitude == 121
+    assert _state(parallel) == _state(serial)
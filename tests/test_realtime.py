@@ -0,0 +1,21 @@
+import asyncio
+
+from pyacmi.realtime import read_acmi_line
+
+
+def test_read_acmi_line_longer_than_limit():
+    briefing = 'Long briefing\\, ' * 8000
+
+    async def read_all():
+        reader = asyncio.StreamReader(limit=1024)
+        reader.feed_data(('0,Briefing=' + briefing + '\\\nsecond line\n#0\n').encode('utf-8'))
+        reader.feed_eof()
+        lines = []
+        while True:
+            line = await read_acmi_line(reader)
+            if line is None:
+                return lines
+            lines.append(line)
+
+    lines = asyncio.run(read_all())
+    assert lines == ['0,Briefing=' + briefing + '\nsecond line\n', '#0\n']
@@ -0,0 +1,68 @@
+import os
+import zipfile
+
+import pytest
+
+from pyacmi import Acmi
+from pyacmi.seek import ACMI_INDEX_SUFFIX, ACMI_INDEX_TEXT_SUFFIX
+
+
+def _recording_text(duration: int = 400) -> str:
+    lines = ['FileType=text/acmi/tacview', 'FileVersion=2.1', '0,ReferenceTime=2024-03-01T08:00:00Z',
+             '0,ReferenceLongitude=120', '0,ReferenceLatitude=30', '0,Briefing=First line.\\', 'Second line.']
+    for t in range(duration):
+        lines.append('#{t}'.format(t=t))
+        if t == 0:
+            lines.append('101,T=0.1|0.2|1000|0|0|90,Type=Air+FixedWing,Name=F-16C_50,Coalition=Allies')
+        else:
+            lines.append('101,T={lon:.3f}|0.2|{alt}||{roll}|,IAS={ias}'.format(
+                lon=0.1 + t * 0.001, alt=1000 + (t // 7) * 50, roll=t % 30, ias=200 + t % 13))
+        if t % 50 == 10:
+            lines.append('{i:x},T=0.1|0.2|1000,Type=Weapon+Missile,Name=AIM-120C,Parent=101'.format(i=0x200 + t))
+        if t % 50 == 40:
+            lines.append('{i:x},T=0.15|0.25|900'.format(i=0x200 + t - 30))
+            lines.append('-{i:x}'.format(i=0x200 + t - 30))
+        if t % 90 == 0:
+            lines.append('0,Event=Bookmark|Minute {m}'.format(m=t // 60))
+    return '\n'.join(lines) + '\n'
+
+
+@pytest.fixture(params=['plain', 'zip'])
+def recording(request, tmp_path):
+    text = _recording_text()
+    if request.param == 'zip':
+        path = tmp_path / 'seek.zip.acmi'
+        with zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_DEFLATED) as f:
+            f.writestr('seek.txt.acmi', '\ufeff' + text)
+    else:
+        path = tmp_path / 'seek.txt.acmi'
+        path.write_text('\ufeff' + text, encoding='utf-8', newline='\n')
+    return str(path)
+
+
+def _state(acmi: Acmi) -> dict:
+    objects = { }
+    for obj_id, obj in acmi.objects.items():
+        objects[obj_id] = (obj.removed_at, { field: list(timeline.items()) for field, timeline in obj.data.items() })
+    return {
+        'timeframes': list(acmi.timeframes),
+        'globals'   : (acmi.reference_longitude, acmi.reference_latitude, acmi.briefing),
+        'objects'   : objects,
+    }
+
+
+@pytest.mark.parametrize('time_range', [(0, 30), (125.5, 190), (300, 1000)])
+def test_index_matches_filtered_load(recording, time_range):
+    expected = Acmi()
+    expected.load_acmi(recording, time_range=time_range)
+    assert expected.objects and expected.timeframes
+    index_mtime = None
+    for _ in range(2):
+        # 第一次建立索引，第二次使用保存的索引
+        acmi = Acmi()
+        acmi.load_acmi(recording, time_range=time_range, index=True)
+        assert _state(acmi) == _state(expected)
+        mtime = os.stat(recording + ACMI_INDEX_SUFFIX).st_mtime_ns
+        assert index_mtime is None or mtime == index_mtime
+        index_mtime = mtime
+    assert os.path.exists(recording + ACMI_INDEX_TEXT_SUFFIX) == recording.endswith('.zip.acmi')
@@ -0,0 +1,17 @@
+import numpy as np
+import pytest
+
+from pyacmi.spatial import AcmiUniformGrid
+
+
+@pytest.mark.parametrize('radius', [1e-3, 1e-9, 1e-13, 0.0])
+def test_tiny_cells_over_ecef_extent(radius):
+    points = np.random.RandomState(0).uniform(-6.4e6, 6.4e6, (200, 3))
+    points[1] = points[0] + radius / 2
+    grid = AcmiUniformGrid(points, radius)
+    first, second, _ = grid.pairs(radius)
+    distances = np.linalg.norm(points[:, None] - points[None], axis=2)
+    expected = np.nonzero(np.triu(distances <= radius, 1))
+    assert sorted(zip(first.tolist(), second.tolist())) == sorted(zip(*(i.tolist() for i in expected)))
+    for k in (0, 1, 50):
+        assert sorted(grid.query(points[k], radius).tolist()) == np.nonzero(distances[k] <= radius)[0].tolist()